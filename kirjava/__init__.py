@@ -1,5 +1,13 @@
 __version__ = "0.4.0"
 __author__ = "Sam Ireland"
 
-from .client import Client
-from .utilities import execute
\ No newline at end of file
+from .client import Client, AsyncClient
+from .utilities import execute, close_clients
+from .cache import MemoryCache, DiskCache
+from .codec import JsonCodec, OrjsonCodec, UjsonCodec
+from .retries import RetryPolicy, RetryBudget, RetryError
+from .limits import RateLimiter, ConcurrencyLimiter
+from .instrumentation import Hooks, Metrics, OpenTelemetryHooks
+from .transports import Transport, RequestsTransport, HTTP2Transport
+from .parser import parse, minify, GraphQLSyntaxError
+from .prepared import PreparedOperation, AsyncPreparedOperation
\ No newline at end of file
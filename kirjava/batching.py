@@ -0,0 +1,200 @@
+"""Tools for combining many queries into a single HTTP request."""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+class Batch:
+    """A queue of queries which will be sent to the GraphQL server together, as
+    one HTTP request containing an array of operations. Not all GraphQL servers
+    accept batched requests like this, so check that yours does first.
+
+    Queries are added with ``execute``, which returns a
+    ``concurrent.futures.Future`` that will hold that query's result once the
+    batch has been sent. The queue is sent when ``flush`` is called, when the
+    batch is used as a context manager and the block exits, when it reaches a
+    maximum size, or after a time window has passed since the first query was
+    queued.
+
+    :param Client client: The client to send the batch with.
+    :param int max_size: If given, the batch is sent as soon as it has this\
+    many queries.
+    :param float window: If given, the batch is sent this many seconds after\
+    the first query is added.
+    :param kwargs: Any other arguments to pass to ``execute_batch``."""
+
+    def __init__(self, client, max_size=None, window=None, **kwargs):
+        self._client = client
+        self._max_size = max_size
+        self._window = window
+        self._kwargs = kwargs
+        self._queue = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return f"<Batch ({len(self._queue)} queued)>"
+
+
+    def __len__(self):
+        return len(self._queue)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+    def execute(self, message, variables=None):
+        """Adds a query to the batch. If this fills the batch, the batch will be
+        sent before this method returns.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables can be passed here.
+        :rtype: ``concurrent.futures.Future``"""
+
+        future, queue = Future(), None
+        with self._lock:
+            self._queue.append((message, variables, future))
+            if self._max_size and len(self._queue) >= self._max_size:
+                queue = self._take()
+            elif self._window and self._timer is None:
+                self._timer = threading.Timer(self._window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if queue: self._send(queue)
+        return future
+
+
+    def flush(self):
+        """Sends every query currently in the batch."""
+
+        with self._lock:
+            queue = self._take()
+        if queue: self._send(queue)
+
+
+    def _take(self):
+        queue, self._queue = self._queue, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return queue
+
+
+    def _send(self, queue):
+        try:
+            results = self._client.execute_batch(
+                [(message, variables) for message, variables, _ in queue],
+                **self._kwargs
+            )
+        except Exception as e:
+            for *_, future in queue: future.set_exception(e)
+        else:
+            for (*_, future), result in zip(queue, results):
+                future.set_result(result)
+
+
+
+class AsyncBatch:
+    """The asynchronous version of :py:class:`.Batch`, for use with an
+    :py:class:`.AsyncClient`. Queries are added with ``execute``, which returns
+    an ``asyncio.Future``, and ``flush`` is a coroutine. It must be used from
+    within a running event loop.
+
+    A batch which fills up, or whose time window passes, is sent in a task of
+    its own. Using the batch as an asynchronous context manager flushes it on
+    exit, and waits for any batches still being sent.
+
+    :param AsyncClient client: The client to send the batch with.
+    :param int max_size: If given, the batch is sent as soon as it has this\
+    many queries.
+    :param float window: If given, the batch is sent this many seconds after\
+    the first query is added.
+    :param kwargs: Any other arguments to pass to ``execute_batch``."""
+
+    def __init__(self, client, max_size=None, window=None, **kwargs):
+        self._client = client
+        self._max_size = max_size
+        self._window = window
+        self._kwargs = kwargs
+        self._queue = []
+        self._timer = None
+        self._tasks = set()
+
+
+    def __repr__(self):
+        return f"<AsyncBatch ({len(self._queue)} queued)>"
+
+
+    def __len__(self):
+        return len(self._queue)
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *args):
+        await self.flush()
+
+
+    def execute(self, message, variables=None):
+        """Adds a query to the batch. If this fills the batch, it starts being
+        sent straight away.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables can be passed here.
+        :rtype: ``asyncio.Future``"""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((message, variables, future))
+        if self._max_size and len(self._queue) >= self._max_size:
+            self._start(self._take())
+        elif self._window and self._timer is None:
+            self._timer = loop.call_later(
+                self._window, lambda: self._start(self._take())
+            )
+        return future
+
+
+    async def flush(self):
+        """Sends every query currently in the batch, and waits for any batches
+        which are already being sent."""
+
+        queue = self._take()
+        if queue: await self._send(queue)
+        if self._tasks: await asyncio.wait(self._tasks)
+
+
+    def _take(self):
+        queue, self._queue = self._queue, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return queue
+
+
+    def _start(self, queue):
+        task = asyncio.ensure_future(self._send(queue))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+    async def _send(self, queue):
+        try:
+            results = await self._client.execute_batch(
+                [(message, variables) for message, variables, _ in queue],
+                **self._kwargs
+            )
+        except Exception as e:
+            for *_, future in queue:
+                if not future.done(): future.set_exception(e)
+        else:
+            for (*_, future), result in zip(queue, results):
+                if not future.done(): future.set_result(result)
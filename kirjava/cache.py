@@ -0,0 +1,288 @@
+"""Response caches which clients can use to avoid repeating queries."""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class Cache:
+    """The base class for response caches. A cache stores query results (as
+    the bytes of the server's JSON response) against a key, and evicts the
+    least recently used results once it holds too many entries or too many
+    bytes. Results can also expire after a set number of seconds.
+
+    Subclasses provide the actual storage by implementing ``_get``, ``_set``,
+    ``_delete``, ``_evict`` and ``clear``.
+
+    :param float ttl: How many seconds results are kept for (forever by\
+    default).
+    :param int max_entries: The most results that will be kept at once.
+    :param int max_bytes: The most bytes of results that will be kept at once."""
+
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} ({len(self)} entries)>"
+
+
+    @property
+    def stats(self):
+        """The cache's hit, miss and eviction counts, and its current size.
+
+        :rtype: ``dict``"""
+
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self),
+                "bytes": self.size
+            }
+
+
+    def get(self, key):
+        """Gets a stored result, if there is one which hasn't expired.
+
+        :param str key: The key the result was stored under.
+        :rtype: ``bytes``"""
+
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                self._delete(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+
+    def set(self, key, value):
+        """Stores a result, evicting older results if this makes the cache too
+        big. Results larger than the whole cache are not stored.
+
+        :param str key: The key to store the result under.
+        :param bytes value: The result to store."""
+
+        if self._max_bytes is not None and len(value) > self._max_bytes: return
+        expires = None if self._ttl is None else time.time() + self._ttl
+        with self._lock:
+            self._set(key, value, expires)
+            self.evictions += self._evict(self._max_entries, self._max_bytes)
+
+
+    def clear(self):
+        """Removes every result from the cache."""
+
+        raise NotImplementedError
+
+
+
+class MemoryCache(Cache):
+    """A cache which keeps results in memory, in the current process.
+
+    :param float ttl: How many seconds results are kept for (forever by\
+    default).
+    :param int max_entries: The most results that will be kept at once.
+    :param int max_bytes: The most bytes of results that will be kept at once."""
+
+    def __init__(self, *args, **kwargs):
+        Cache.__init__(self, *args, **kwargs)
+        self._entries = OrderedDict()
+        self._size = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    @property
+    def size(self):
+        """The number of bytes of results currently stored.
+
+        :rtype: ``int``"""
+
+        return self._size
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None: self._entries.move_to_end(key)
+        return entry
+
+
+    def _set(self, key, value, expires):
+        self._delete(key)
+        self._entries[key] = (value, expires)
+        self._size += len(value)
+
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None: self._size -= len(entry[0])
+
+
+    def _evict(self, max_entries, max_bytes):
+        evicted = 0
+        while self._entries and (
+            (max_entries is not None and len(self._entries) > max_entries) or
+            (max_bytes is not None and self._size > max_bytes)
+        ):
+            self._delete(next(iter(self._entries)))
+            evicted += 1
+        return evicted
+
+
+
+class DiskCache(Cache):
+    """A cache which keeps results in a SQLite database on disk, so that they
+    persist between processes and can be shared by several of them.
+
+    The number of results and their total size are kept up to date in the
+    database as results are stored and removed, so that checking them doesn't
+    mean reading the whole table. Getting a result doesn't write to the
+    database - the time it was used is remembered, and written along with the
+    next result to be stored.
+
+    :param str path: The location of the database file.
+    :param float ttl: How many seconds results are kept for (forever by\
+    default).
+    :param int max_entries: The most results that will be kept at once.
+    :param int max_bytes: The most bytes of results that will be kept at once."""
+
+    def __init__(self, path, *args, **kwargs):
+        Cache.__init__(self, *args, **kwargs)
+        self._path = path
+        self._used = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT entries FROM totals").fetchone()[0]
+
+
+    @property
+    def size(self):
+        """The number of bytes of results currently stored.
+
+        :rtype: ``int``"""
+
+        with self._lock:
+            return self._db.execute("SELECT bytes FROM totals").fetchone()[0]
+
+
+    def clear(self):
+        with self._lock:
+            self._used.clear()
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+
+    def close(self):
+        """Writes when any results were last used, and closes the connection
+        to the database file."""
+
+        with self._lock:
+            if self._write_used(): self._db.commit()
+            self._db.close()
+
+
+    def _get(self, key):
+        entry = self._db.execute(
+            "SELECT value, expires FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if entry is not None:
+            self._used[key] = time.time()
+            if len(self._used) >= MAX_UNWRITTEN_USES:
+                self._write_used()
+                self._db.commit()
+        return entry
+
+
+    def _set(self, key, value, expires):
+        self._write_used()
+        self._db.execute(
+            "INSERT INTO entries VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE "
+            "SET value = excluded.value, expires = excluded.expires, "
+            "used = excluded.used", (key, value, expires, time.time())
+        )
+        self._db.commit()
+
+
+    def _delete(self, key):
+        self._used.pop(key, None)
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._db.commit()
+
+
+    def _evict(self, max_entries, max_bytes):
+        if max_entries is None and max_bytes is None: return 0
+        evicted = 0
+        while True:
+            entries, size = self._db.execute(
+                "SELECT entries, bytes FROM totals"
+            ).fetchone()
+            if not entries: break
+            if (max_entries is None or entries <= max_entries) and (
+                max_bytes is None or size <= max_bytes
+            ): break
+            key = self._db.execute(
+                "SELECT key FROM entries ORDER BY used LIMIT 1"
+            ).fetchone()[0]
+            self._used.pop(key, None)
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            evicted += 1
+        if evicted: self._db.commit()
+        return evicted
+
+
+    def _write_used(self):
+        if not self._used: return False
+        self._db.executemany(
+            "UPDATE entries SET used = ? WHERE key = ?",
+            [(used, key) for key, used in self._used.items()]
+        )
+        self._used.clear()
+        return True
+
+
+
+MAX_UNWRITTEN_USES = 1000
+
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, value BLOB, expires REAL, used REAL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER, bytes INTEGER
+);
+INSERT OR IGNORE INTO totals
+    SELECT 0, COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries;
+CREATE TRIGGER IF NOT EXISTS entries_inserted AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + LENGTH(new.value);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_updated AFTER UPDATE OF value ON entries
+BEGIN
+    UPDATE totals SET bytes = bytes + LENGTH(new.value) - LENGTH(old.value);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_deleted AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - LENGTH(old.value);
+END;
+COMMIT;
+"""
\ No newline at end of file
@@ -1,9 +1,29 @@
 """Contains the Client class itself."""
 
+import asyncio
+import hashlib
 import json
 import requests
+import threading
 import time
-from .utilities import files_to_map, get_files_from_variables, create_response_error_message, pack_files
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from .batching import Batch, AsyncBatch
+from .codec import get_default_codec
+from .compression import compress, get_accept_encoding, get_wire_size
+from .instrumentation import Instrument, Metrics, RequestEvent, current_event, get_body_size
+from .multipart import MultipartEncoder
+from .parser import GraphQLSyntaxError, parse
+from .prepared import PreparedOperation, AsyncPreparedOperation
+from .retries import RetryPolicy, RetryError, parse_retry_after
+from .streaming import JsonStream, AsyncJsonStream
+from .transports import RequestsTransport, HTTP2Transport
+from .utilities import BUFFER_TYPES, files_to_map, get_files_from_variables, has_files, create_response_error_message, pack_files, get_operation_type, get_operation_name, get_query_hash, is_persisted_query_error, get_persisted_query_error
+
+aiohttp = None
+
+NOTHING = nullcontext()
 
 class Client:
     """A GraphQL client. This is the object which sends requests to the GraphQL
@@ -11,20 +31,128 @@ class Client:
 
     The URL that serves the GraphQL content is given on creating the Client.
 
+    By default the client keeps every query it sends, along with its variables
+    and result, in its history. Long-running clients can limit this to the most
+    recent queries, keep only the query strings, or turn history off entirely
+    with a size of 0.
+
     :param str url: The URL of the GraphQL server to interact with.
-    :param dict headers: Any additional HTTP headers."""
+    :param int history_size: The number of queries to remember (unlimited by\
+    default).
+    :param bool history_results: If ``False``, only the query strings will be\
+    kept in the history, not the variables and results.
+    :param bool stream_uploads: If ``True``, uploaded files are read in chunks\
+    as the request is sent, rather than being read into memory first.
+    :param Cache cache: A cache to store query results in, so that repeated\
+    queries don't need to go to the server.
+    :param bool persisted_queries: If ``True``, queries the server has already\
+    seen are sent as a hash rather than in full (Automatic Persisted Queries).
+    :param JsonCodec codec: The codec used to encode requests and decode\
+    responses (the fastest one installed by default).
+    :param RetryPolicy retry_policy: The policy for retrying failed requests\
+    (no retries by default).
+    :param timeout: The number of seconds to wait for the server to connect\
+    and to send data, or a ``(connect, read)`` tuple (no timeout by default).
+    :param int pool_connections: The number of hosts to keep connection pools\
+    for.
+    :param int pool_maxsize: The most connections to keep open to each host.\
+    This should be at least the number of threads sending requests at once.
+    :param bool pool_block: If ``True``, requests wait for a pooled connection\
+    to be free rather than opening extra connections which are then thrown\
+    away.
+    :param bool keep_alive: If ``False``, connections are closed after each\
+    request rather than being reused.
+    :param requests.adapters.HTTPAdapter adapter: An adapter to use instead\
+    of one built from the pool settings.
+    :param requests.Session session: A session to send requests through, so\
+    that several clients can share one pool of connections. The client will\
+    not close a session it was given.
+    :param Transport transport: A transport to send requests through instead\
+    of a ``requests`` session. Like a session, it can be shared between\
+    clients, and the client will not close a transport it was given.
+    :param bool http2: If ``True``, requests are sent over HTTP/2 (using an\
+    :py:class:`.HTTP2Transport` built from the pool settings), so that many\
+    can be in flight over one connection. This can't be combined with a\
+    ``session``.
+    :param RateLimiter rate_limiter: A limit on how many requests are sent\
+    per second.
+    :param RateLimiter cost_limiter: A limit on the total cost of queries\
+    sent per second, which is kept in line with the cost information the\
+    server returns in ``extensions.cost``.
+    :param ConcurrencyLimiter concurrency_limiter: A limit on how many\
+    requests can be in flight at once.
+    :param bool single_flight: If ``True``, a query which is identical to one\
+    already in flight (including its variables) waits for that request's\
+    result instead of sending its own, for as long as its timeout allows.
+    :param list hooks: :py:class:`.Hooks` to call as requests are made.
+    :param bool metrics: If ``True``, the client keeps :py:class:`.Metrics`\
+    on its requests.
+    :param bool compression: If ``False``, the server is asked not to\
+    compress responses.
+    :param int compression_threshold: If given, request bodies of at least\
+    this many bytes are gzipped before being sent. The server must accept\
+    gzipped requests. Files being uploaded are never compressed.
+    :param bool minify: If ``True``, insignificant whitespace, commas and\
+    comments are removed from queries before they are sent.
+    :param int upload_workers: If given, uploads are streamed, and the next\
+    files in the body are read ahead from this many threads while the\
+    earlier ones are sent, rather than each file being read only when the\
+    body reaches it. This helps when there are many files on slow storage."""
 
-    def __init__(self, url):
+    def __init__(self, url, history_size=None, history_results=True, stream_uploads=False, cache=None, persisted_queries=False, codec=None, retry_policy=None, timeout=None, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True, adapter=None, session=None, transport=None, http2=False, rate_limiter=None, cost_limiter=None, concurrency_limiter=None, single_flight=False, hooks=None, metrics=False, compression=True, compression_threshold=None, minify=False, upload_workers=None):
         self._url = url
         self._headers = {
             "Accept": "application/json", "Content-Type": "application/json"
         }
-        self._history = []
-        self.session = requests.Session() 
+        self._history = deque(maxlen=history_size)
+        self._history_results = history_results
+        self._stream_uploads = stream_uploads
+        self._upload_workers = upload_workers
+        self._cache = cache
+        self._persisted_queries = persisted_queries
+        self._persisted_hashes = set()
+        self._codec = codec or get_default_codec()
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._generation = 0
+        self._cancellation = threading.Condition()
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._pool_block = pool_block
+        self._keep_alive = keep_alive
+        self._adapter = adapter
+        self._rate_limiter = rate_limiter
+        self._cost_limiter = cost_limiter
+        self._concurrency_limiter = concurrency_limiter
+        self._single_flight = single_flight
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._hooks = list(hooks or [])
+        self._metrics = Metrics() if metrics else None
+        if self._metrics: self._hooks.append(self._metrics)
+        self._compression = compression
+        self._compression_threshold = compression_threshold
+        self._minify = minify
+        if http2 and session is not None:
+            raise ValueError(
+                "A session can't be used with http2=True - give an "
+                "HTTP2Transport as the transport instead"
+            )
+        self._http2 = http2
+        self._owns_session = session is None and transport is None
+        self.transport = transport or self.create_transport(session)
 
 
     def __repr__(self):
-        return f"<Client (URL: {self._url})>"
+        return f"<{self.__class__.__name__} (URL: {self._url})>"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
 
 
     @property
@@ -54,7 +182,299 @@ class Client:
         return tuple(self._history)
 
 
-    def execute(self, message, method="POST", variables=None, retries=0, retry_statuses=None):
+    @property
+    def codec(self):
+        """The codec used to encode requests and decode responses.
+
+        :rtype: ``JsonCodec``"""
+
+        return self._codec
+
+
+    @property
+    def retry_policy(self):
+        """The policy used to decide when failed requests are retried.
+
+        :rtype: ``RetryPolicy``"""
+
+        return self._retry_policy
+
+
+    @property
+    def timeout(self):
+        """The timeout used for requests which don't give their own.
+
+        :rtype: ``float``"""
+
+        return self._timeout
+
+
+    @property
+    def hooks(self):
+        """The hooks called as requests are made.
+
+        :rtype: ``list``"""
+
+        return self._hooks
+
+
+    @property
+    def metrics(self):
+        """The metrics kept on the client's requests, if any.
+
+        :rtype: ``Metrics``"""
+
+        return self._metrics
+
+
+    @property
+    def session(self):
+        """The object holding the connections requests are sent through -
+        usually a ``requests.Session``, which can be used to see any cookies
+        the server has set.
+
+        :rtype: ``requests.Session``"""
+
+        return self.transport.session
+
+
+    @session.setter
+    def session(self, session):
+        self.transport.session = session
+
+
+    @property
+    def cache(self):
+        """The cache that query results are stored in, if any.
+
+        :rtype: ``Cache``"""
+
+        return self._cache
+
+
+    def create_transport(self, session=None):
+        """Creates the transport that requests will be sent through - an
+        :py:class:`.HTTP2Transport` if the client uses HTTP/2, and otherwise a
+        :py:class:`.RequestsTransport` around the given session, or a new one.
+
+        :param requests.Session session: The session to use.
+        :rtype: ``Transport``"""
+
+        if self._http2:
+            return HTTP2Transport(
+                max_connections=self._pool_maxsize, keep_alive=self._keep_alive,
+                compression=self._compression
+            )
+        return RequestsTransport(
+            self.create_session() if session is None else session
+        )
+
+
+    def create_session(self):
+        """Creates the HTTP session that requests will be sent through, with
+        an adapter that pools connections using the client's settings. The
+        session asks for responses to be compressed in any way that can be
+        decoded, unless compression is turned off.
+
+        :rtype: ``requests.Session``"""
+
+        session = requests.Session()
+        adapter = self._adapter or requests.adapters.HTTPAdapter(
+            pool_connections=self._pool_connections,
+            pool_maxsize=self._pool_maxsize, pool_block=self._pool_block
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not self._keep_alive: session.headers["Connection"] = "close"
+        session.headers["Accept-Encoding"] = get_accept_encoding(self._compression)
+        return session
+
+
+    def close(self):
+        """Closes the client's transport and all its pooled connections,
+        unless the session or transport was given to the client to share."""
+
+        if self._owns_session: self.transport.close()
+
+
+    def instrument(self, message, method, name=None):
+        """Creates the context manager which passes a request's events to the
+        client's hooks. If there are no hooks, this does nothing.
+
+        :param str message: The query being made.
+        :param str method: The HTTP method used.
+        :param str name: The name to record, if not the operation's name.
+        :rtype: ``Instrument``"""
+
+        if not self._hooks: return NOTHING
+        event = RequestEvent(
+            self._url, method, name or get_operation_name(message),
+            get_operation_type(message) if message else None
+        )
+        return Instrument(self._hooks, event)
+
+
+    def prepare_message(self, message):
+        """Gets the text of a query to send - minified, if the client minifies
+        queries. Queries which can't be parsed are sent as they are, so that
+        the server can say what is wrong with them.
+
+        :param str message: The query to make.
+        :rtype: ``str``"""
+
+        if not self._minify or message is None: return message
+        try:
+            return parse(message).minified
+        except GraphQLSyntaxError:
+            return message
+
+
+    def build_request(self, message, variables=None, extensions=None):
+        """Works out what needs to be sent to the server for a given query -
+        the HTTP headers, the body, and any files to be uploaded separately.
+
+        Uploads are sent as a streamed multipart body if the client streams
+        uploads, or if any of them are bytes-like objects - these are then
+        sent from where they are, rather than being copied into a body.
+
+        :param str message: The query to make, or ``None`` if the query is to\
+        be identified by the extensions instead.
+        :param dict variables: Any GraphQL variables.
+        :param dict extensions: Any GraphQL extensions to send.
+        :returns: ``(variables, headers, operation, files)``"""
+
+        event = current_event.get()
+        if event: started = time.perf_counter()
+        headers = {key: value for key, value in self._headers.items()}
+        variables, files = get_files_from_variables(variables)
+        operation = {"variables": variables}
+        if message is not None: operation["query"] = self.prepare_message(message)
+        if extensions: operation["extensions"] = extensions
+        operation = self._codec.dumps(operation)
+        if files:
+            del headers["Content-Type"]
+            operation = {
+                "operations": operation, "map": self._codec.dumps(files_to_map(files))
+            }
+            if event: started = event.time("encode", started)
+            stream = self._stream_uploads or bool(self._upload_workers)
+            in_memory = any(isinstance(f, BUFFER_TYPES) for f in files.values())
+            files = pack_files(files, stream=stream)
+            if stream or in_memory:
+                operation = MultipartEncoder(
+                    operation, files, workers=self._upload_workers
+                )
+                headers["Content-Type"] = operation.content_type
+                files = None
+            if event: event.time("pack", started)
+        elif event:
+            event.time("encode", started)
+        return variables, headers, operation, files
+
+
+    def build_batch_request(self, operations):
+        """Works out the HTTP headers and body needed to send several queries
+        in one request.
+
+        :param list operations: ``(message, variables)`` pairs to send.
+        :returns: ``(headers, operation)``"""
+
+        for message, variables in operations:
+            if has_files(variables):
+                raise ValueError("Files cannot be uploaded as part of a batch")
+        headers = {key: value for key, value in self._headers.items()}
+        operation = self._codec.dumps([
+            {"variables": variables, "query": self.prepare_message(message)}
+            for message, variables in operations
+        ])
+        return headers, operation
+
+
+    def compress_request(self, operation, headers, files=None):
+        """Gzips a request body if it is over the client's compression
+        threshold, adding a ``Content-Encoding`` header to say so. Bodies with
+        files, and bodies sent when there is no threshold, are left alone.
+
+        :param operation: The body to send.
+        :param dict headers: The HTTP headers to send.
+        :param dict files: Any files being sent.
+        :returns: ``(operation, headers)``"""
+
+        if self._compression_threshold is None or files: return operation, headers
+        if not isinstance(operation, (str, bytes)): return operation, headers
+        operation, compressed = compress(operation, self._compression_threshold)
+        if compressed: headers = {**headers, "Content-Encoding": "gzip"}
+        return operation, headers
+
+
+    def get_cache_key(self, message, variables=None):
+        """Works out the key that a query's result would be cached under. Only
+        queries can be cached - if the client has no cache, or the message is a
+        mutation or subscription, or files are being uploaded, ``None`` is
+        returned instead.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :rtype: ``str``"""
+
+        if self._cache is None: return None
+        return self.get_operation_key(message, variables)
+
+
+    def get_flight_key(self, message, variables=None):
+        """Works out the key that identical in-flight queries share, if the
+        client uses single-flight requests. Only queries are shared - if the
+        message is a mutation or subscription, or files are being uploaded,
+        ``None`` is returned instead.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :rtype: ``str``"""
+
+        if not self._single_flight: return None
+        return self.get_operation_key(message, variables)
+
+
+    def get_operation_key(self, message, variables=None):
+        """Works out a key which identifies a query, its variables and the
+        client's headers, or ``None`` if the message is not a read-only query
+        or files are being uploaded. The query is minified first, so queries
+        which differ only in whitespace, commas or comments share a key.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :rtype: ``str``"""
+
+        try:
+            document = parse(message)
+        except GraphQLSyntaxError:
+            return None
+        if document.operation_type != "query": return None
+        if has_files(variables): return None
+        key = json.dumps(
+            [document.minified, variables, self._headers], sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+
+    def record(self, message, variables, result):
+        """Adds a completed query to the client's history.
+
+        :param str message: The query that was made.
+        :param dict variables: The variables sent with it.
+        :param dict result: The server's response."""
+
+        if self._history.maxlen == 0: return
+        if self._history_results:
+            self._history.appendleft((
+                {"query": message, "variables": variables or {}}, result
+            ))
+        else:
+            self._history.appendleft(({"query": message}, None))
+
+
+    def execute(self, message, method="POST", variables=None, retries=0, retry_statuses=None, timeout=None):
         """Sends a request to the GraphQL server.
 
         :param str message: The query to make.
@@ -63,57 +483,1349 @@ class Client:
         :param dict variables: Any GraphQL variables can be passed here.
         :param int retries: The number of times to retry on failure.
         :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :raises CancelledError: if the client's requests are cancelled.
+        :raises TimeoutError: if an identical request already in flight takes\
+        longer than the timeout allows.
         :rtype: ``dict``"""
 
-        headers = {key: value for key, value in self._headers.items()}
-        variables, files = get_files_from_variables(variables)
-        operation = json.dumps({"variables": variables, "query": message})
-        if files:
-            del headers["Content-Type"]
-            data = {"operations": operation, "map": json.dumps(files_to_map(files))}
-            files = pack_files(files)
-            response = self.request_with_retries(
-                operation=data, headers=headers, method=method,
-                retries=retries, retry_statuses=retry_statuses, files=files
-            )
+        return self.run_plan(self.plan_execute(
+            message, method, variables, retries, retry_statuses, timeout
+        ))
+
+
+    def join_flight(self, key):
+        """Gets the in-flight request for a query, or starts one if there
+        isn't one already. The request's future will hold the raw response
+        body, so that each caller can decode its own copy of the result.
+
+        :param str key: The query's flight key.
+        :returns: The future, and whether the caller is the one who must send\
+        the request."""
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is not None: return flight, False
+            flight = self._flights[key] = self.create_flight()
+            return flight, True
+
+
+    def create_flight(self):
+        """Creates the future that an in-flight request's result is shared
+        through.
+
+        :rtype: ``concurrent.futures.Future``"""
+
+        return Future()
+
+
+    def land_flight(self, key, content=None, error=None):
+        """Finishes an in-flight request, passing its response body (or the
+        exception it raised) to every caller waiting for it.
+
+        :param str key: The query's flight key.
+        :param bytes content: The response body.
+        :param Exception error: The exception raised, if the request failed."""
+
+        with self._flights_lock:
+            flight = self._flights.pop(key)
+        if error is None:
+            flight.set_result(content)
         else:
-            response = self.request_with_retries(
-                operation=operation, headers=headers, method=method,
-                retries=retries, retry_statuses=retry_statuses
-            )
+            flight.set_exception(error)
+            flight.exception()
+
+
+    def execute_stream(self, message, path, method="POST", variables=None, retries=0, retry_statuses=None, chunk_size=65536, timeout=None):
+        """Sends a request to the GraphQL server, and returns an iterator over
+        the items of one list in the response, which are decoded one at a
+        time as the response arrives. This allows very large lists to be
+        processed without the whole response being held in memory.
+
+        The list is given as a dot-separated path of keys from the top of the
+        response, such as ``"data.users.edges"``. Once the iterator is
+        exhausted, any errors the server returned are available from its
+        ``errors`` attribute. Streamed queries are not cached or added to the
+        client's history.
+
+        The response's connection is held until the iterator is exhausted or
+        closed, so if it might not be read to the end, use it as a context
+        manager (or call its ``close`` method).
+
+        :param str message: The query to make.
+        :param str path: The location of the list in the response.
+        :param str method: By default, POST requests are sent, but this can be\
+        overriden here.
+        :param dict variables: Any GraphQL variables can be passed here.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param int chunk_size: The number of bytes to read from the response at\
+        a time.
+        :param timeout: The timeout for this request, overriding the client's.\
+        The read timeout applies to each chunk.
+        :rtype: ``JsonStream``"""
+
+        variables, headers, operation, files = self.build_request(message, variables)
+        kwargs = {"files": files} if files else {}
+        if timeout is not None: kwargs["timeout"] = timeout
+        response = self.request_with_retries(
+            operation=operation, headers=headers, method=method,
+            retries=retries, retry_statuses=retry_statuses, stream=True, **kwargs
+        )
+        return JsonStream(
+            response.iter_content(chunk_size), path.split("."),
+            on_close=response.close
+        )
+
+
+    def paginate(self, message, path, variables=None, page_size=None, prefetch=False, **kwargs):
+        """Iterates over every node of a Relay-style connection, fetching pages
+        of it as needed.
+
+        The query must take ``$first`` and ``$after`` variables and pass them
+        to the connection, which must return ``edges { node }`` and
+        ``pageInfo { hasNextPage endCursor }``. The connection's location in
+        the response is given as a dot-separated path such as
+        ``"data.users"``.
+
+        If ``prefetch`` is ``True``, each page is requested in the background
+        while the nodes of the previous page are being used.
+
+        :param str message: The query to make.
+        :param str path: The location of the connection in the response.
+        :param dict variables: Any other GraphQL variables.
+        :param int page_size: If given, this is sent as ``$first``.
+        :param bool prefetch: Whether to fetch the next page in advance.
+        :param kwargs: Any other arguments to pass to ``execute``.
+        :raises ValueError: if a response has no connection at the path."""
+
+        variables = dict(variables or {})
+        if page_size is not None: variables["first"] = page_size
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
         try:
-            result = response.json()
-        except json.decoder.JSONDecodeError:
-            raise ValueError(create_response_error_message(response))
-        self._history.insert(0, (
-            {"query": message, "variables": variables or {}}, result
+            connection = self.get_page(message, path, variables, **kwargs)
+            while True:
+                cursor = get_next_cursor(connection)
+                if executor and cursor:
+                    next_page = executor.submit(
+                        self.get_page, message, path,
+                        {**variables, "after": cursor}, **kwargs
+                    )
+                for edge in connection.get("edges") or []:
+                    yield edge["node"]
+                if not cursor: return
+                connection = next_page.result() if executor else self.get_page(
+                    message, path, {**variables, "after": cursor}, **kwargs
+                )
+        finally:
+            if executor: executor.shutdown(wait=False)
+
+
+    def get_page(self, message, path, variables, **kwargs):
+        """Gets one page of a Relay-style connection.
+
+        :param str message: The query to make.
+        :param str path: The location of the connection in the response.
+        :param dict variables: The GraphQL variables.
+        :param kwargs: Any other arguments to pass to ``execute``.
+        :raises ValueError: if the response has no connection at the path.
+        :rtype: ``dict``"""
+
+        result = self.execute(message, variables=variables, **kwargs)
+        return get_connection(result, path)
+
+
+    def send(self, message, variables=None, method="POST", retries=0, retry_statuses=None, extensions=None, timeout=None):
+        """Sends a single query to the server and decodes the response, without
+        touching the cache or history.
+
+        If extensions are sent with a GET request, the operation is sent as
+        URL parameters rather than in the body, so that HTTP caches can see it.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :param str method: The HTTP method to use.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param dict extensions: Any GraphQL extensions to send.
+        :param timeout: The timeout for this request, overriding the client's.
+        :returns: ``(variables, response, result)``"""
+
+        return self.run_plan(self.plan_send(
+            message, variables, method, retries, retry_statuses, extensions,
+            timeout
         ))
+
+
+    def decode(self, response, content=None):
+        """Decodes the body of a response to a single query, keeping the
+        client's cost limiter (if it has one) up to date.
+
+        :param response: The HTTP response.
+        :param bytes content: The response body, if it isn't available as\
+        ``response.content``.
+        :raises ValueError: if the response isn't JSON.
+        :rtype: ``dict``"""
+
+        event = current_event.get()
+        if event: started = time.perf_counter()
+        try:
+            result = self._codec.loads(
+                response.content if content is None else content
+            )
+        except ValueError:
+            raise ValueError(create_response_error_message(response, content))
+        if event: event.time("decode", started)
+        if self._cost_limiter: self._cost_limiter.sync(result)
         return result
 
 
-    def request_with_retries(self, operation, headers, files=None, method="POST", retries=0, retry_statuses=None):
+    def send_persisted(self, message, variables=None, method="POST", retries=0, retry_statuses=None, timeout=None):
+        """Sends a query using Automatic Persisted Queries. If the server is
+        known to have the query already, only its hash is sent - otherwise (or
+        if the server turns out not to have it after all) the full query is
+        sent along with the hash, so that the server can store it.
+
+        The full query is always sent with POST, even if GET is being used for
+        hash-only requests. If the server says it doesn't support persisted
+        queries at all, the query is sent again without them, and the client
+        stops using them.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :param str method: The HTTP method to use.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :returns: ``(variables, response, result)``"""
+
+        return self.run_plan(self.plan_persisted(
+            message, variables, method, retries, retry_statuses, timeout
+        ))
+
+
+    def record_batch(self, operations, results):
+        """Checks that a batched request got a result for every query sent, and
+        adds them all to the client's history.
+
+        :param list operations: The ``(message, variables)`` pairs sent.
+        :param list results: The server's response."""
+
+        if not isinstance(results, list) or len(results) != len(operations):
+            raise ValueError(
+                f"Server did not return a result for each operation: {results}"
+            )
+        for (message, variables), result in zip(operations, results):
+            self.record(message, variables, result)
+
+
+    def execute_many(self, operations, max_workers=10, max_in_flight=None, **kwargs):
+        """Sends many requests to the GraphQL server at once, using a pool of
+        threads which share the client's session (and so its connections).
+
+        The results are returned in the same order as the operations. If any
+        operation fails, the exception it raised is put in its place in the
+        results rather than stopping the others.
+
+        :param list operations: ``(message, variables)`` pairs to send.
+        :param int max_workers: The number of requests to send at once.
+        :param int max_in_flight: If given, operations will not be queued up\
+        for sending faster than this many at a time.
+        :param kwargs: Any other arguments to pass to ``execute``.
+        :rtype: ``list``"""
+
+        operations = list(operations)
+        results = [None] * len(operations)
+        slots = threading.BoundedSemaphore(max_in_flight or len(operations) or 1)
+
+        def run(index, message, variables):
+            try:
+                results[index] = self.execute(message, variables=variables, **kwargs)
+            except Exception as e:
+                results[index] = e
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index, (message, variables) in enumerate(operations):
+                slots.acquire()
+                executor.submit(run, index, message, variables)
+        return results
+
+
+    def execute_batch(self, operations, method="POST", retries=0, retry_statuses=None, timeout=None):
+        """Sends many queries to the GraphQL server in a single HTTP request, as
+        a JSON array of operations. The server must support batching for this
+        to work. Files cannot be uploaded as part of a batch.
+
+        :param list operations: ``(message, variables)`` pairs to send.
+        :param str method: By default, POST requests are sent, but this can be\
+        overriden here.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :rtype: ``list``"""
+
+        return self.run_plan(self.plan_batch(
+            operations, method, retries, retry_statuses, timeout
+        ))
+
+
+    def prepare(self, message, method="POST"):
+        """Prepares a query which will be sent many times with different
+        variables, so that as little work as possible is done each time. The
+        :py:class:`.PreparedOperation` returned is called with the variables,
+        and returns the result.
+
+        :param str message: The query to make.
+        :param str method: The HTTP method to use.
+        :rtype: ``PreparedOperation``"""
+
+        return PreparedOperation(self, message, method, direct=not (
+            self._cache is not None or self._single_flight or
+            self._persisted_queries
+        ))
+
+
+    def batch(self, max_size=None, window=None, **kwargs):
+        """Creates a :py:class:`.Batch` for queueing up queries to be sent to
+        the server in a single request.
+
+        :param int max_size: If given, the batch is sent as soon as it has this\
+        many queries.
+        :param float window: If given, the batch is sent this many seconds\
+        after the first query is added.
+        :param kwargs: Any other arguments to pass to ``execute_batch``.
+        :rtype: ``Batch``"""
+
+        return Batch(self, max_size=max_size, window=window, **kwargs)
+
+
+    def request_with_retries(self, operation, headers, files=None, method="POST", retries=0, retry_statuses=None, timeout=None, **kwargs):
         """Sends a GraphQL request, retrying if necessary the specified number
         of times.
+
+        If the retry policy has a deadline, each attempt's timeout is cut short
+        so that it can't run past it. Responses which are going to be retried
+        are closed, so that their connections can be reused. Streamed
+        responses are never checked for GraphQL error codes, as that would
+        mean reading their whole body.
         
         :param str operation: The GraphQL operation to send.
         :param dict headers: The HTTP headers to send.
         :param dict files: The files to send.
         :param str method: The HTTP method to use.
-        :param int retries: The number of times to retry.
-        :param list retry_statuses: The HTTP statuses to retry on.
+        :param int retries: The number of times to retry, overriding the\
+        client's retry policy.
+        :param list retry_statuses: The HTTP statuses to retry on, overriding\
+        the client's retry policy.
+        :param timeout: The timeout for each attempt, overriding the client's.
+        :param kwargs: Any other arguments to pass to the transport's request.
+        :raises RetryError: if retries run out on a retryable status.
+        :raises CancelledError: if the client's requests are cancelled.
         :rtype: ``requests.Response``"""
 
-        attempts = 0
-        while True:
+        return self.run_plan(self.plan_request(
+            operation, headers, files, method, retries, retry_statuses, timeout,
+            kwargs
+        ))
+
+
+    def report_retry(self, event, error, delay):
+        """Tells the client's hooks that a request is about to be retried.
+
+        :param RequestEvent event: The request's event.
+        :param Exception error: The exception the last attempt raised, if any.
+        :param float delay: The seconds that will be waited before the retry."""
+
+        event.error = error
+        for hook in self._hooks: hook.on_retry(event)
+        event.error = None
+        event.timings["wait"] = event.timings.get("wait", 0) + delay
+
+
+    def reserve_limits(self):
+        """Takes what an attempt needs from the client's rate and cost limits.
+
+        :returns: The number of seconds to wait before sending the attempt."""
+
+        wait = 0
+        if self._rate_limiter: wait = self._rate_limiter.reserve()
+        if self._cost_limiter: wait = max(wait, self._cost_limiter.reserve())
+        return wait
+
+
+    def pause_limits(self, headers):
+        """Pauses the client's rate and cost limits for as long as a 429
+        response's ``Retry-After`` header asks, so that no requests are sent
+        until then.
+
+        :param headers: The response's headers."""
+
+        delay = parse_retry_after(headers.get("Retry-After"))
+        if delay is None: return
+        for limiter in (self._rate_limiter, self._cost_limiter):
+            if limiter: limiter.pause(delay)
+
+
+    def cancel(self):
+        """Cancels every request the client is currently making, from any
+        thread. Each one raises ``concurrent.futures.CancelledError`` as soon
+        as it reaches a point where it can stop - immediately if it is waiting
+        to retry, or otherwise when its current attempt finishes, which its
+        timeout limits. Requests made after this are not affected."""
+
+        with self._cancellation:
+            self._generation += 1
+            self._cancellation.notify_all()
+
+
+    def check_cancelled(self, generation):
+        """Raises an exception if the client's requests have been cancelled
+        since a request started.
+
+        :param int generation: The number of cancellations when it started.
+        :raises CancelledError: if there has been a cancellation since."""
+
+        if generation != self._generation:
+            raise CancelledError("Request was cancelled")
+
+
+    def wait(self, delay, generation):
+        """Waits before retrying a request, stopping early if the client's
+        requests are cancelled.
+
+        :param float delay: The number of seconds to wait.
+        :param int generation: The number of cancellations when the request\
+        started.
+        :raises CancelledError: if there is a cancellation while waiting."""
+
+        with self._cancellation:
+            self._cancellation.wait_for(
+                lambda: generation != self._generation, timeout=delay
+            )
+        self.check_cancelled(generation)
+
+
+    def run_plan(self, plan):
+        """Carries out a plan - the steps of a request, which are shared by the
+        sync and async clients. A plan is a generator which yields a
+        :py:func:`.step` for each call it needs to make to one of the client's
+        methods that does I/O, and is sent back the result (or has the
+        exception thrown into it). Only these methods differ between the two
+        kinds of client, which carry out the same plans in their own way.
+
+        :param plan: The plan to carry out.
+        :returns: Whatever the plan returns."""
+
+        try:
+            function, args, kwargs = next(plan)
+            while True:
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException as e:
+                    function, args, kwargs = plan.throw(e)
+                else:
+                    function, args, kwargs = plan.send(result)
+        except StopIteration as e:
+            return e.value
+
+
+    def plan_execute(self, message, method, variables, retries, retry_statuses, timeout):
+        """The plan for :py:meth:`.execute`, which uses the cache and in-flight
+        requests where it can.
+
+        :returns: A plan which returns the result."""
+
+        with self.instrument(message, method) as event:
+            cache_key = self.get_cache_key(message, variables)
+            if cache_key:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    if event: event.cached = True
+                    result = self._codec.loads(cached)
+                    self.record(message, variables, result)
+                    return result
+            flight_key = self.get_flight_key(message, variables)
+            if flight_key:
+                flight, leading = self.join_flight(flight_key)
+                if not leading:
+                    content = yield step(
+                        self.wait_for_flight, flight,
+                        self.get_flight_timeout(timeout)
+                    )
+                    result = self._codec.loads(content)
+                    self.record(message, variables, result)
+                    return result
             try:
-                response = self.session.request(
-                    method, self._url, headers=headers, data=operation, files=files
-                )
-                if retry_statuses and response.status_code in retry_statuses:
-                    raise Exception(f"Status code {response.status_code}")
-                return response
+                if self._persisted_queries and not has_files(variables):
+                    variables, response, result = yield step(
+                        self.send_persisted, message, variables, method,
+                        retries, retry_statuses, timeout
+                    )
+                else:
+                    variables, response, result = yield step(
+                        self.send, message, variables, method, retries,
+                        retry_statuses, timeout=timeout
+                    )
+                if flight_key or cache_key:
+                    content = yield step(self.read_content, response)
+            except BaseException as e:
+                if flight_key: self.land_flight(flight_key, error=e)
+                raise
+            if flight_key: self.land_flight(flight_key, content)
+            if cache_key and "errors" not in result:
+                self._cache.set(cache_key, content)
+            self.record(message, variables, result)
+            return result
+
+
+    def plan_send(self, message, variables, method, retries, retry_statuses, extensions, timeout):
+        """The plan for :py:meth:`.send`.
+
+        :returns: A plan which returns ``(variables, response, result)``."""
+
+        variables, headers, operation, files = self.build_request(
+            message, variables, extensions
+        )
+        kwargs = {}
+        if files:
+            kwargs["files"] = files
+        elif method == "GET" and extensions:
+            kwargs["params"] = create_url_parameters(
+                self.prepare_message(message), variables, extensions
+            )
+            operation = None
+        if timeout is not None: kwargs["timeout"] = timeout
+        response = yield step(
+            self.request_with_retries, operation=operation, headers=headers,
+            method=method, retries=retries, retry_statuses=retry_statuses,
+            **kwargs
+        )
+        content = yield step(self.read_content, response)
+        return variables, response, self.decode(response, content)
+
+
+    def plan_persisted(self, message, variables, method, retries, retry_statuses, timeout):
+        """The plan for :py:meth:`.send_persisted`.
+
+        :returns: A plan which returns ``(variables, response, result)``."""
+
+        message = self.prepare_message(message)
+        query_hash = get_query_hash(message)
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+        if query_hash in self._persisted_hashes:
+            sent = yield step(
+                self.send, None, variables, method, retries, retry_statuses,
+                extensions, timeout
+            )
+            if not is_persisted_query_error(sent[2]): return sent
+            self._persisted_hashes.discard(query_hash)
+        sent = yield step(
+            self.send, message, variables,
+            "POST" if method == "GET" else method, retries, retry_statuses,
+            extensions, timeout
+        )
+        error = get_persisted_query_error(sent[2])
+        if error == "PERSISTED_QUERY_NOT_SUPPORTED":
+            self._persisted_queries = False
+            return (yield step(
+                self.send, message, variables, method, retries, retry_statuses,
+                timeout=timeout
+            ))
+        if not error: self._persisted_hashes.add(query_hash)
+        return sent
+
+
+    def plan_batch(self, operations, method, retries, retry_statuses, timeout):
+        """The plan for :py:meth:`.execute_batch`.
+
+        :returns: A plan which returns the list of results."""
+
+        operations = list(operations)
+        with self.instrument(None, method, name="batch"):
+            headers, operation = self.build_batch_request(operations)
+            kwargs = {} if timeout is None else {"timeout": timeout}
+            response = yield step(
+                self.request_with_retries, operation=operation, headers=headers,
+                method=method, retries=retries, retry_statuses=retry_statuses,
+                **kwargs
+            )
+            content = yield step(self.read_content, response)
+            try:
+                results = self._codec.loads(content)
+            except ValueError:
+                raise ValueError(create_response_error_message(response, content))
+            self.record_batch(operations, results)
+            if self._cost_limiter:
+                for result in results: self._cost_limiter.sync(result)
+            return results
+
+
+    def plan_request(self, operation, headers, files, method, retries, retry_statuses, timeout, kwargs):
+        """The plan for :py:meth:`.request_with_retries`, which keeps to the
+        retry policy and the client's limits, and records each attempt.
+
+        :returns: A plan which returns the response."""
+
+        policy = self._retry_policy.replace(retries, retry_statuses)
+        timeout = self._timeout if timeout is None else timeout
+        generation = self._generation
+        event = current_event.get()
+        if event: body_size = get_body_size(operation, files)
+        operation, headers = self.compress_request(operation, headers, files)
+        read = (event or policy.error_codes) and not kwargs.get("stream")
+        started, attempts = time.monotonic(), 0
+        while True:
+            self.check_cancelled(generation)
+            wait = self.reserve_limits()
+            if wait: yield step(self.wait, wait, generation)
+            if event:
+                if wait: event.timings["wait"] = event.timings.get("wait", 0) + wait
+                event.attempts += 1
+                event.request_bytes += body_size
+                event.request_wire_bytes += get_body_size(operation, files)
+                sent = time.perf_counter()
+            response, error, content = None, None, None
+            try:
+                if attempts and isinstance(operation, MultipartEncoder):
+                    operation.seek(0)
+                response = yield step(
+                    self.send_attempt, method, headers, operation, files,
+                    policy.get_timeout(timeout, started), kwargs, generation
+                )
+            except CancelledError:
+                raise
             except Exception as e:
-                attempts += 1
-                if attempts > retries: raise e
-                time.sleep(2**attempts)
-                continue
\ No newline at end of file
+                error = e
+            status = None if error else self.get_status(response)
+            if status and read:
+                content = yield step(self.read_content, response)
+            if event:
+                event.time("network", sent)
+                event.status = status
+                if content is not None:
+                    event.response_bytes += len(content)
+                    event.response_wire_bytes += get_wire_size(
+                        response.headers, content
+                    )
+            if status == 429: self.pause_limits(response.headers)
+            result = None
+            if content is not None and policy.error_codes:
+                result = decode_quietly(self._codec, content)
+            if not policy.should_retry(error, status, result):
+                if error: raise error
+                return response
+            attempts += 1
+            delay = policy.get_delay(
+                attempts, status, None if error else response.headers
+            )
+            if not policy.allows(attempts, started, delay):
+                if error: raise error
+                if status in policy.statuses:
+                    raise RetryError(response, status)
+                return response
+            if response is not None: response.close()
+            if event: self.report_retry(event, error, delay)
+            yield step(self.wait, delay, generation)
+
+
+    def send_attempt(self, method, headers, operation, files, timeout, options, generation):
+        """Makes a single attempt at sending a request, within the client's
+        concurrency limit.
+
+        :param str method: The HTTP method to use.
+        :param dict headers: The HTTP headers to send.
+        :param operation: The body to send.
+        :param dict files: The files to send.
+        :param timeout: The timeout for the attempt.
+        :param dict options: Any other arguments to pass to the transport.
+        :param int generation: The number of cancellations when the request\
+        started.
+        :raises CancelledError: if the client's requests are cancelled.
+        :rtype: ``requests.Response``"""
+
+        self.check_cancelled(generation)
+        if timeout is not None: options = {**options, "timeout": timeout}
+        limiter = self._concurrency_limiter
+        try:
+            if limiter: limiter.acquire()
+            try:
+                response = self.transport.request(
+                    method, self._url, headers=headers, data=operation,
+                    files=files, **options
+                )
+            finally:
+                if limiter: limiter.release()
+        except Exception:
+            self.check_cancelled(generation)
+            raise
+        if generation != self._generation: response.close()
+        self.check_cancelled(generation)
+        return response
+
+
+    def read_content(self, response):
+        """Gets the body of a response.
+
+        :param response: The HTTP response.
+        :rtype: ``bytes``"""
+
+        return response.content
+
+
+    def get_status(self, response):
+        """Gets the HTTP status of a response.
+
+        :param response: The HTTP response.
+        :rtype: ``int``"""
+
+        return response.status_code
+
+
+    def get_flight_timeout(self, timeout):
+        """Works out how long a caller can wait for an identical request which
+        is already in flight - no longer than a request of its own could take
+        under its timeout, or than its retry policy's deadline allows.
+
+        :param timeout: The caller's timeout, overriding the client's.
+        :returns: The number of seconds, or ``None`` for no limit."""
+
+        timeout = self._retry_policy.get_timeout(
+            self._timeout if timeout is None else timeout, time.monotonic()
+        )
+        if isinstance(timeout, tuple):
+            return None if None in timeout else sum(timeout)
+        return timeout
+
+
+    def wait_for_flight(self, flight, timeout):
+        """Waits for another caller's identical request to finish. If it takes
+        too long, the caller stops waiting, but the request carries on for any
+        other callers waiting for it.
+
+        :param flight: The request's future.
+        :param float timeout: The most seconds to wait.
+        :raises TimeoutError: if the request doesn't finish in time.
+        :returns: The raw response body."""
+
+        try:
+            flight.exception(timeout)
+        except FutureTimeoutError:
+            raise TimeoutError("Timed out waiting for identical request") from None
+        return flight.result()
+
+
+
+
+class AsyncClient(Client):
+    """An asynchronous GraphQL client, for use with asyncio. It is used in the
+    same way as :py:class:`.Client`, except that ``execute`` is a coroutine,
+    so that many queries can be in flight at once from a single event loop.
+
+    Requests are sent through a single aiohttp session whose connector keeps a
+    pool of open connections, which is created the first time a request is
+    made. The aiohttp library must be installed to use this class.
+
+    The ``pool_connections``, ``pool_maxsize``, ``pool_block``, ``adapter``,
+    ``transport`` and ``http2`` options of :py:class:`.Client` don't apply -
+    the connector is configured with ``connections`` and
+    ``connections_per_host`` instead. A shared ``aiohttp.ClientSession`` can
+    be given as ``session``.
+
+    :param str url: The URL of the GraphQL server to interact with.
+    :param int connections: The maximum number of simultaneous connections.
+    :param int connections_per_host: The maximum number of simultaneous\
+    connections to any one host (unlimited by default).
+    :param kwargs: Any other arguments accepted by :py:class:`.Client`."""
+
+    def __init__(self, url, connections=100, connections_per_host=0, **kwargs):
+        import_aiohttp()
+        self._connections = connections
+        self._connections_per_host = connections_per_host
+        self._in_flight = set()
+        self._cancelled = set()
+        Client.__init__(self, url, **kwargs)
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+    @property
+    def session(self):
+        """The aiohttp session requests are sent through, once it has been
+        created.
+
+        :rtype: ``aiohttp.ClientSession``"""
+
+        return self._session
+
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+
+    def create_transport(self, session=None):
+        """Async clients send requests through an aiohttp session rather than
+        a transport. The session must be created inside a running event loop,
+        so unless one is given, no session is created until the first request
+        is made.
+
+        :param aiohttp.ClientSession session: The session to use.
+        :rtype: ``NoneType``"""
+
+        self.session = session
+        return None
+
+
+    async def close(self):
+        """Closes the underlying aiohttp session and all its connections,
+        unless the session was given to the client to share."""
+
+        if self.session is not None and self._owns_session:
+            await self.session.close()
+            self.session = None
+
+
+    async def execute(self, message, method="POST", variables=None, retries=0, retry_statuses=None, timeout=None):
+        """Sends a request to the GraphQL server.
+
+        :param str message: The query to make.
+        :param str method: By default, POST requests are sent, but this can be\
+        overriden here.
+        :param dict variables: Any GraphQL variables can be passed here.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :raises CancelledError: if the client's requests are cancelled.
+        :raises TimeoutError: if an identical request already in flight takes\
+        longer than the timeout allows.
+        :rtype: ``dict``"""
+
+        return await self.run_plan(self.plan_execute(
+            message, method, variables, retries, retry_statuses, timeout
+        ))
+
+
+    def create_flight(self):
+        """Creates the future that an in-flight request's result is shared
+        through.
+
+        :rtype: ``asyncio.Future``"""
+
+        return asyncio.get_running_loop().create_future()
+
+
+    async def paginate(self, message, path, variables=None, page_size=None, prefetch=False, **kwargs):
+        """Iterates asynchronously over every node of a Relay-style connection,
+        fetching pages of it as needed. See :py:meth:`.Client.paginate`.
+
+        :param str message: The query to make.
+        :param str path: The location of the connection in the response.
+        :param dict variables: Any other GraphQL variables.
+        :param int page_size: If given, this is sent as ``$first``.
+        :param bool prefetch: Whether to fetch the next page in advance.
+        :param kwargs: Any other arguments to pass to ``execute``.
+        :raises ValueError: if a response has no connection at the path."""
+
+        variables = dict(variables or {})
+        if page_size is not None: variables["first"] = page_size
+        next_page = None
+        try:
+            connection = await self.get_page(message, path, variables, **kwargs)
+            while True:
+                cursor = get_next_cursor(connection)
+                if prefetch and cursor:
+                    next_page = asyncio.ensure_future(self.get_page(
+                        message, path, {**variables, "after": cursor}, **kwargs
+                    ))
+                for edge in connection.get("edges") or []:
+                    yield edge["node"]
+                if not cursor: return
+                connection = await next_page if prefetch else await self.get_page(
+                    message, path, {**variables, "after": cursor}, **kwargs
+                )
+        finally:
+            if next_page and not next_page.done(): next_page.cancel()
+
+
+    async def get_page(self, message, path, variables, **kwargs):
+        """Gets one page of a Relay-style connection.
+
+        :param str message: The query to make.
+        :param str path: The location of the connection in the response.
+        :param dict variables: The GraphQL variables.
+        :param kwargs: Any other arguments to pass to ``execute``.
+        :raises ValueError: if the response has no connection at the path.
+        :rtype: ``dict``"""
+
+        result = await self.execute(message, variables=variables, **kwargs)
+        return get_connection(result, path)
+
+
+    async def send(self, message, variables=None, method="POST", retries=0, retry_statuses=None, extensions=None, timeout=None):
+        """Sends a single query to the server and decodes the response, without
+        touching the cache or history.
+
+        If extensions are sent with a GET request, the operation is sent as
+        URL parameters rather than in the body, so that HTTP caches can see it.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :param str method: The HTTP method to use.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param dict extensions: Any GraphQL extensions to send.
+        :param timeout: The timeout for this request, overriding the client's.
+        :returns: ``(variables, response, result)``"""
+
+        return await self.run_plan(self.plan_send(
+            message, variables, method, retries, retry_statuses, extensions,
+            timeout
+        ))
+
+
+    async def send_persisted(self, message, variables=None, method="POST", retries=0, retry_statuses=None, timeout=None):
+        """Sends a query using Automatic Persisted Queries. If the server is
+        known to have the query already, only its hash is sent - otherwise (or
+        if the server turns out not to have it after all) the full query is
+        sent along with the hash, so that the server can store it.
+
+        :param str message: The query to make.
+        :param dict variables: Any GraphQL variables.
+        :param str method: The HTTP method to use.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :returns: ``(variables, response, result)``"""
+
+        return await self.run_plan(self.plan_persisted(
+            message, variables, method, retries, retry_statuses, timeout
+        ))
+
+
+    async def execute_many(self, operations, max_in_flight=None, **kwargs):
+        """Sends many requests to the GraphQL server concurrently.
+
+        The results are returned in the same order as the operations. If any
+        operation fails, the exception it raised is put in its place in the
+        results rather than stopping the others.
+
+        :param list operations: ``(message, variables)`` pairs to send.
+        :param int max_in_flight: If given, no more than this many requests\
+        will be in flight at once.
+        :param kwargs: Any other arguments to pass to ``execute``.
+        :rtype: ``list``"""
+
+        operations = list(operations)
+        slots = asyncio.Semaphore(max_in_flight or len(operations) or 1)
+
+        async def run(message, variables):
+            async with slots:
+                return await self.execute(message, variables=variables, **kwargs)
+
+        return await asyncio.gather(*[
+            run(message, variables) for message, variables in operations
+        ], return_exceptions=True)
+
+
+    async def execute_batch(self, operations, method="POST", retries=0, retry_statuses=None, timeout=None):
+        """Sends many queries to the GraphQL server in a single HTTP request, as
+        a JSON array of operations. The server must support batching for this
+        to work. Files cannot be uploaded as part of a batch.
+
+        :param list operations: ``(message, variables)`` pairs to send.
+        :param str method: By default, POST requests are sent, but this can be\
+        overriden here.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :rtype: ``list``"""
+
+        return await self.run_plan(self.plan_batch(
+            operations, method, retries, retry_statuses, timeout
+        ))
+
+
+    def prepare(self, message, method="POST"):
+        """Prepares a query which will be sent many times with different
+        variables. The :py:class:`.AsyncPreparedOperation` returned is called
+        with the variables, and returns a coroutine.
+
+        :param str message: The query to make.
+        :param str method: The HTTP method to use.
+        :rtype: ``AsyncPreparedOperation``"""
+
+        return AsyncPreparedOperation(self, message, method, direct=not (
+            self._cache is not None or self._single_flight or
+            self._persisted_queries
+        ))
+
+
+    def batch(self, max_size=None, window=None, **kwargs):
+        """Creates an :py:class:`.AsyncBatch` for queueing up queries to be
+        sent to the server in a single request.
+
+        :param int max_size: If given, the batch is sent as soon as it has this\
+        many queries.
+        :param float window: If given, the batch is sent this many seconds\
+        after the first query is added.
+        :param kwargs: Any other arguments to pass to ``execute_batch``.
+        :rtype: ``AsyncBatch``"""
+
+        return AsyncBatch(self, max_size=max_size, window=window, **kwargs)
+
+
+    async def execute_stream(self, message, path, method="POST", variables=None, retries=0, retry_statuses=None, chunk_size=65536, timeout=None):
+        """Sends a request to the GraphQL server, and returns an asynchronous
+        iterator over the items of one list in the response, which are decoded
+        as the response arrives. See :py:meth:`.Client.execute_stream`.
+
+        The response's connection is held until the iterator is exhausted or
+        closed, so if it might not be read to the end, use it as an
+        asynchronous context manager (or await its ``close`` method).
+
+        :param str message: The query to make.
+        :param str path: The location of the list in the response.
+        :param str method: By default, POST requests are sent, but this can be\
+        overriden here.
+        :param dict variables: Any GraphQL variables can be passed here.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param int chunk_size: The number of bytes to read from the response at\
+        a time.
+        :param timeout: The timeout for this request, overriding the client's.
+        :rtype: ``AsyncJsonStream``"""
+
+        variables, headers, operation, files = self.build_request(message, variables)
+        kwargs = {"files": files} if files else {}
+        if timeout is not None: kwargs["timeout"] = timeout
+        response = await self.request_with_retries(
+            operation=operation, headers=headers, method=method,
+            retries=retries, retry_statuses=retry_statuses, stream=True, **kwargs
+        )
+        return AsyncJsonStream(
+            response.content.iter_chunked(chunk_size), path.split("."),
+            on_close=response.release
+        )
+
+
+    async def request_with_retries(self, operation, headers, files=None, method="POST", retries=0, retry_statuses=None, timeout=None, **kwargs):
+        """Sends a GraphQL request, retrying if necessary the specified number
+        of times. The response body is read before it is returned, unless
+        ``stream`` is ``True``.
+
+        If the retry policy has a deadline, each attempt's timeout is cut short
+        so that it can't run past it. Responses which are going to be retried
+        are closed, so that their connections can be reused.
+        
+        :param operation: The GraphQL operation to send.
+        :param dict headers: The HTTP headers to send.
+        :param dict files: The packed files to send.
+        :param str method: The HTTP method to use.
+        :param int retries: The number of times to retry, overriding the\
+        client's retry policy.
+        :param list retry_statuses: The HTTP statuses to retry on, overriding\
+        the client's retry policy.
+        :param timeout: The timeout for each attempt, overriding the client's.
+        :param kwargs: Any other arguments to pass to the session's request.
+        :raises RetryError: if retries run out on a retryable status.
+        :raises CancelledError: if the client's requests are cancelled.
+        :rtype: ``aiohttp.ClientResponse``"""
+
+        if self.session is None:
+            aiohttp = import_aiohttp()
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._connections,
+                    limit_per_host=self._connections_per_host,
+                    force_close=not self._keep_alive
+                ),
+                headers=None if self._compression else {
+                    "Accept-Encoding": get_accept_encoding(False)
+                }
+            )
+        return await self.run_plan(self.plan_request(
+            operation, headers, files, method, retries, retry_statuses, timeout,
+            kwargs
+        ))
+
+
+    async def run_plan(self, plan):
+        """Carries out a plan, awaiting each of its steps. See
+        :py:meth:`.Client.run_plan`.
+
+        :param plan: The plan to carry out.
+        :returns: Whatever the plan returns."""
+
+        try:
+            function, args, kwargs = next(plan)
+            while True:
+                try:
+                    result = await function(*args, **kwargs)
+                except BaseException as e:
+                    function, args, kwargs = plan.throw(e)
+                else:
+                    function, args, kwargs = plan.send(result)
+        except StopIteration as e:
+            return e.value
+
+
+    async def send_attempt(self, method, headers, operation, files, timeout, options, generation):
+        """Makes a single attempt at sending a request, which can be stopped
+        by :py:meth:`.cancel`.
+
+        :param str method: The HTTP method to use.
+        :param dict headers: The HTTP headers to send.
+        :param operation: The body to send.
+        :param dict files: The packed files to send.
+        :param timeout: The timeout for the attempt.
+        :param dict options: Any other arguments to pass to the session, and\
+        ``stream`` if the body should be left to be read later.
+        :param int generation: Not used by async clients.
+        :raises CancelledError: if the client's requests are cancelled.
+        :rtype: ``aiohttp.ClientResponse``"""
+
+        options = dict(options)
+        stream = options.pop("stream", False)
+        if timeout is not None:
+            options["timeout"] = create_client_timeout(timeout)
+        if isinstance(operation, MultipartEncoder):
+            headers = {**headers, "Content-Length": str(len(operation))}
+        data = create_form_data(operation, files) if files else operation
+        return await self.run_cancellable(self.make_request(
+            method, headers, data, options, stream=stream
+        ))
+
+
+    async def make_request(self, method, headers, data, options, stream=False):
+        """Makes a single HTTP request and reads its response body, within the
+        client's concurrency limit.
+
+        :param str method: The HTTP method to use.
+        :param dict headers: The HTTP headers to send.
+        :param data: The body to send.
+        :param dict options: Any other arguments to pass to the session.
+        :param bool stream: If ``True``, the body is left to be read later.
+        :rtype: ``aiohttp.ClientResponse``"""
+
+        limiter = self._concurrency_limiter
+        if limiter: await limiter.acquire_async()
+        try:
+            response = await self.session.request(
+                method, self._url, headers=headers, data=data, **options
+            )
+            if not stream: await response.read()
+            return response
+        finally:
+            if limiter: limiter.release()
+
+
+    async def read_content(self, response):
+        """Gets the body of a response.
+
+        :param response: The HTTP response.
+        :rtype: ``bytes``"""
+
+        return await response.read()
+
+
+    def get_status(self, response):
+        """Gets the HTTP status of a response.
+
+        :param response: The HTTP response.
+        :rtype: ``int``"""
+
+        return response.status
+
+
+    async def wait(self, delay, generation):
+        """Waits before retrying a request, stopping early if the client's
+        requests are cancelled.
+
+        :param float delay: The number of seconds to wait.
+        :param int generation: Not used by async clients.
+        :raises CancelledError: if there is a cancellation while waiting."""
+
+        await self.run_cancellable(asyncio.sleep(delay))
+
+
+    async def wait_for_flight(self, flight, timeout):
+        """Waits for another caller's identical request to finish. The request
+        carries on for any other callers waiting for it if this caller is
+        cancelled or stops waiting.
+
+        :param flight: The request's future.
+        :param float timeout: The most seconds to wait.
+        :raises TimeoutError: if the request doesn't finish in time.
+        :returns: The raw response body."""
+
+        done, _ = await asyncio.wait((flight,), timeout=timeout)
+        if not done:
+            raise TimeoutError("Timed out waiting for identical request")
+        return flight.result()
+
+
+    async def run_cancellable(self, coroutine):
+        """Runs part of a request as its own task, so that it can be stopped
+        by :py:meth:`.cancel` without cancelling whatever is awaiting it.
+
+        :param coroutine: The coroutine to run.
+        :raises CancelledError: if the client's requests are cancelled."""
+
+        task = asyncio.ensure_future(coroutine)
+        self._in_flight.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task not in self._cancelled: raise
+            raise CancelledError("Request was cancelled") from None
+        finally:
+            self._in_flight.discard(task)
+            self._cancelled.discard(task)
+
+
+    def cancel(self):
+        """Cancels every request the client is currently making. This can be
+        called from any thread. Each request stops straight away, raising
+        ``concurrent.futures.CancelledError``, and requests made after this
+        are not affected."""
+
+        for task in list(self._in_flight):
+            task.get_loop().call_soon_threadsafe(self.cancel_task, task)
+
+
+    def cancel_task(self, task):
+        """Cancels one of the client's in-flight tasks, from its own event
+        loop.
+
+        :param asyncio.Task task: The task to cancel."""
+
+        if task.done(): return
+        self._cancelled.add(task)
+        task.cancel()
+
+
+
+def step(function, *args, **kwargs):
+    """Creates one step of a plan - a call to one of the client's methods
+    which the sync and async clients carry out in their own way. The method is
+    taken from the client running the plan, so an async client's own version
+    of it is the one called.
+
+    :param function: The client's bound method to call.
+    :param args: The method's positional arguments.
+    :param kwargs: The method's keyword arguments.
+    :rtype: ``tuple``"""
+
+    return function, args, kwargs
+
+
+def get_connection(result, path):
+    """Finds a Relay-style connection in a GraphQL response.
+
+    :param dict result: The server's response.
+    :param str path: The dot-separated location of the connection.
+    :raises ValueError: if there is no connection at the path.
+    :rtype: ``dict``"""
+
+    connection = result
+    for key in path.split("."):
+        connection = connection.get(key) if isinstance(connection, dict) else None
+    if not isinstance(connection, dict):
+        raise ValueError(
+            f"No connection at {path}: {result.get('errors') or result}"
+        )
+    return connection
+
+
+def get_next_cursor(connection):
+    """Gets the cursor for the page after a connection's current one, or
+    ``None`` if this is the last page.
+
+    :param dict connection: The connection.
+    :rtype: ``str``"""
+
+    page_info = connection.get("pageInfo") or {}
+    if page_info.get("hasNextPage"): return page_info.get("endCursor")
+
+
+def decode_quietly(codec, content):
+    """Decodes a response body, returning ``None`` if it isn't valid JSON.
+
+    :param JsonCodec codec: The codec to decode with.
+    :param bytes content: The response body.
+    :rtype: ``dict``"""
+
+    try:
+        return codec.loads(content)
+    except ValueError:
+        return None
+
+
+
+def create_url_parameters(message, variables, extensions):
+    """Puts a GraphQL operation into the URL parameters of a GET request.
+
+    :param str message: The query, or ``None`` if it isn't to be sent.
+    :param dict variables: Any GraphQL variables.
+    :param dict extensions: Any GraphQL extensions.
+    :rtype: ``dict``"""
+
+    params = {}
+    if message is not None: params["query"] = message
+    if variables: params["variables"] = json.dumps(variables)
+    if extensions: params["extensions"] = json.dumps(extensions)
+    return params
+
+
+def import_aiohttp():
+    """Imports aiohttp the first time it is needed. It takes a while to
+    import, and only async clients use it, so importing kirjava doesn't
+    import it.
+
+    :raises ImportError: if aiohttp isn't installed.
+    :returns: The aiohttp module."""
+
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("AsyncClient requires aiohttp to be installed")
+    return aiohttp
+
+
+def create_client_timeout(timeout):
+    """Turns a timeout, which can be a number of seconds or a
+    ``(connect, read)`` tuple, into an aiohttp timeout.
+
+    :param timeout: The timeout.
+    :rtype: ``aiohttp.ClientTimeout``"""
+
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return import_aiohttp().ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+def create_form_data(operation, files):
+    """Turns a multipart operation and its packed files into an aiohttp form.
+    A new form is needed for every attempt, as aiohttp forms can only be sent
+    once.
+
+    :param dict operation: The ``operations`` and ``map`` fields.
+    :param dict files: The packed files.
+    :rtype: ``aiohttp.FormData``"""
+
+    data = import_aiohttp().FormData()
+    for name, value in operation.items():
+        if isinstance(value, bytes): value = value.decode()
+        data.add_field(name, value)
+    for name, (filename, content, content_type) in files.items():
+        data.add_field(name, content, filename=filename, content_type=content_type)
+    return data
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""JSON codecs, which clients use to encode requests and decode responses."""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+class JsonCodec:
+    """A codec which uses the standard library's ``json`` module. This is the
+    fallback used when no faster JSON library is installed."""
+
+    name = "json"
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}>"
+
+
+    def dumps(self, obj):
+        """Encodes an object as JSON.
+
+        :param obj: The object to encode.
+        :rtype: ``str``"""
+
+        return json.dumps(obj)
+
+
+    def loads(self, data):
+        """Decodes JSON, raising ``ValueError`` if it isn't valid.
+
+        :param bytes data: The JSON to decode.
+        :rtype: ``dict``"""
+
+        return json.loads(data)
+
+
+
+class OrjsonCodec(JsonCodec):
+    """A codec which uses `orjson <https://github.com/ijl/orjson>`_, which works
+    directly with bytes and is much faster than the standard library."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires orjson to be installed")
+
+
+    def dumps(self, obj):
+        """Encodes an object as JSON. Anything orjson can't encode but the
+        standard library can, such as integers too large for 64 bits, is
+        encoded with the standard library instead.
+
+        :param obj: The object to encode.
+        :rtype: ``bytes``"""
+
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return json.dumps(obj).encode()
+
+
+    def loads(self, data):
+        """Decodes JSON, raising ``ValueError`` if it isn't valid.
+
+        :param bytes data: The JSON to decode.
+        :rtype: ``dict``"""
+
+        return orjson.loads(data)
+
+
+
+class UjsonCodec(JsonCodec):
+    """A codec which uses `ujson <https://github.com/ultrajson/ultrajson>`_."""
+
+    name = "ujson"
+
+    def __init__(self):
+        if ujson is None:
+            raise ImportError("UjsonCodec requires ujson to be installed")
+
+
+    def dumps(self, obj):
+        """Encodes an object as JSON.
+
+        :param obj: The object to encode.
+        :rtype: ``str``"""
+
+        return ujson.dumps(obj, ensure_ascii=False)
+
+
+    def loads(self, data):
+        """Decodes JSON, raising ``ValueError`` if it isn't valid.
+
+        :param bytes data: The JSON to decode.
+        :rtype: ``dict``"""
+
+        return ujson.loads(data)
+
+
+
+def get_default_codec():
+    """Gets the fastest codec available - orjson if it is installed, then
+    ujson, and otherwise the standard library.
+
+    :rtype: ``JsonCodec``"""
+
+    if orjson is not None: return OrjsonCodec()
+    if ujson is not None: return UjsonCodec()
+    return JsonCodec()
@@ -0,0 +1,49 @@
+"""Compression of request and response bodies."""
+
+import zlib
+from urllib3.util.request import ACCEPT_ENCODING as URLLIB3_ENCODINGS
+
+ACCEPT_ENCODING = ", ".join(
+    encoding.strip() for encoding in URLLIB3_ENCODINGS.split(",")
+)
+
+def get_accept_encoding(compression=True):
+    """Works out the ``Accept-Encoding`` header to send. Responses can be
+    compressed in any way that urllib3 can decode - gzip and deflate always,
+    Brotli if the brotli library is installed, and Zstandard if the zstandard
+    library is installed.
+
+    :param bool compression: If ``False``, compressed responses are refused.
+    :rtype: ``str``"""
+
+    return ACCEPT_ENCODING if compression else "identity"
+
+
+def compress(body, threshold):
+    """Gzips a request body if it is at least a certain number of bytes long.
+    Smaller bodies are returned as they are, as compressing them would save
+    little or nothing.
+
+    :param body: The body to compress.
+    :param int threshold: The smallest body to compress, in bytes.
+    :returns: ``(body, compressed)``"""
+
+    data = body.encode() if isinstance(body, str) else body
+    if len(data) < threshold: return body, False
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush(), True
+
+
+def get_wire_size(headers, content):
+    """Works out how many bytes of a response body actually came over the
+    network, which is less than its length once decoded if it was compressed.
+    If the response has no ``Content-Length``, the decoded length is used.
+
+    :param headers: The response's headers.
+    :param bytes content: The decoded response body.
+    :rtype: ``int``"""
+
+    try:
+        return int(headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        return len(content)
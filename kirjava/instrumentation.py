@@ -0,0 +1,395 @@
+"""Hooks for seeing what a client's requests are doing, and where the time
+goes."""
+
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from .multipart import MultipartEncoder
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+current_event = ContextVar("kirjava_event", default=None)
+
+BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10
+)
+
+class RequestEvent:
+    """Everything known about one call to a client's ``execute`` (or
+    ``execute_batch``), which is passed to each of the client's hooks as the
+    request goes along.
+
+    ``timings`` holds the seconds spent in each phase of the request:
+    ``encode`` (turning the query into JSON), ``pack`` (reading files to
+    upload), ``wait`` (waiting for rate limits or to retry), ``network``
+    (sending the request and receiving the response) and ``decode`` (parsing
+    the response).
+
+    ``request_bytes`` and ``response_bytes`` are the sizes of the bodies
+    before compression, and ``request_wire_bytes`` and ``response_wire_bytes``
+    the sizes actually sent over the network.
+
+    :param str url: The URL the request is sent to.
+    :param str method: The HTTP method used.
+    :param str operation_name: The name of the GraphQL operation.
+    :param str operation_type: ``query``, ``mutation`` or ``subscription``."""
+
+    __slots__ = [
+        "url", "method", "operation_name", "operation_type", "started",
+        "duration", "timings", "request_bytes", "response_bytes",
+        "request_wire_bytes", "response_wire_bytes", "attempts", "status",
+        "error", "cached", "span"
+    ]
+
+    def __init__(self, url, method, operation_name, operation_type):
+        self.url = url
+        self.method = method
+        self.operation_name = operation_name
+        self.operation_type = operation_type
+        self.started = time.perf_counter()
+        self.duration = None
+        self.timings = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.request_wire_bytes = 0
+        self.response_wire_bytes = 0
+        self.attempts = 0
+        self.status = None
+        self.error = None
+        self.cached = False
+        self.span = None
+
+
+    def __repr__(self):
+        return f"<RequestEvent ({self.operation_name or 'anonymous'})>"
+
+
+    @property
+    def retries(self):
+        """The number of times the request has been retried.
+
+        :rtype: ``int``"""
+
+        return max(self.attempts - 1, 0)
+
+
+    def time(self, phase, started):
+        """Adds the time since a given moment to one of the phase timings.
+
+        :param str phase: The phase to add to.
+        :param float started: The ``time.perf_counter()`` the phase started.
+        :returns: The current ``time.perf_counter()``, so that the next phase\
+        can be timed from it."""
+
+        now = time.perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0) + now - started
+        return now
+
+
+
+class Instrument:
+    """Sends a request's events to a client's hooks - it is used as a context
+    manager around the request. Inside it, the request's event is available
+    from ``current_event`` so that the client's internals can add timings to
+    it. If the request raises an exception, ``on_error`` is called instead of
+    ``after_response``.
+
+    :param list hooks: The hooks to call.
+    :param RequestEvent event: The request's event."""
+
+    def __init__(self, hooks, event):
+        self.hooks = hooks
+        self.event = event
+        self.token = None
+
+
+    def __enter__(self):
+        self.token = current_event.set(self.event)
+        for hook in self.hooks: hook.before_request(self.event)
+        return self.event
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        current_event.reset(self.token)
+        self.event.duration = time.perf_counter() - self.event.started
+        if exc_value is None:
+            for hook in self.hooks: hook.after_response(self.event)
+        else:
+            self.event.error = exc_value
+            for hook in self.hooks: hook.on_error(self.event)
+
+
+
+class Hooks:
+    """The base class for request hooks. Subclass it and override whichever
+    methods you need, then give instances to a client as ``hooks``. Each
+    method is passed the request's :py:class:`.RequestEvent`.
+
+    Hooks are called on the thread (or in the task) making the request, so
+    they should be quick."""
+
+    def before_request(self, event):
+        """Called before anything is done for a request."""
+
+
+    def after_response(self, event):
+        """Called once a request has succeeded, with all its timings."""
+
+
+    def on_retry(self, event):
+        """Called before a request is retried. The event's ``error`` or
+        ``status`` says what went wrong with the last attempt."""
+
+
+    def on_error(self, event):
+        """Called when a request fails with an exception, which is in the
+        event's ``error``."""
+
+
+
+class Histogram:
+    """A count of values in fixed buckets, from which percentiles can be
+    estimated, without every value having to be kept.
+
+    :param tuple buckets: The upper bounds of the buckets, in order."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+
+    def __repr__(self):
+        return f"<Histogram ({self.count} values)>"
+
+
+    def add(self, value):
+        """Adds a value to the histogram.
+
+        :param float value: The value to add."""
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min: self.min = value
+        if self.max is None or value > self.max: self.max = value
+
+
+    def percentile(self, percent):
+        """Estimates a percentile, assuming values are spread evenly within
+        each bucket.
+
+        :param float percent: The percentile, from 0 to 100.
+        :rtype: ``float``"""
+
+        if not self.count: return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets[index - 1] if index else self.min
+                high = self.buckets[index] if index < len(self.buckets) else self.max
+                low, high = max(low, self.min), min(high, self.max)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+    def snapshot(self):
+        """Summarises the histogram.
+
+        :rtype: ``dict``"""
+
+        return {
+            "count": self.count, "sum": self.sum, "min": self.min,
+            "max": self.max, "mean": self.sum / self.count if self.count else None,
+            "p50": self.percentile(50), "p90": self.percentile(90),
+            "p99": self.percentile(99)
+        }
+
+
+
+class Metrics(Hooks):
+    """Hooks which keep a latency histogram for each operation name, along
+    with counts of requests, errors, retries and bytes sent and received.
+    Operations without a name are recorded as ``"anonymous"``.
+
+    Bytes are counted both before compression and as sent over the network,
+    and the snapshot gives the ratio between the two for requests and
+    responses - a ratio of 4 means compression cut the bytes to a quarter.
+
+    :param tuple buckets: The upper bounds of the histogram buckets, in\
+    seconds."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.cached = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.wire_bytes_sent = 0
+        self.wire_bytes_received = 0
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return f"<Metrics ({self.requests} requests)>"
+
+
+    def after_response(self, event):
+        self.record(event)
+
+
+    def on_error(self, event):
+        self.record(event)
+
+
+    def record(self, event):
+        """Records a finished request.
+
+        :param RequestEvent event: The request's event."""
+
+        name = event.operation_name or "anonymous"
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.buckets)
+            histogram.add(event.duration)
+            self.requests += 1
+            if event.error is not None: self.errors += 1
+            if event.cached: self.cached += 1
+            self.retries += event.retries
+            self.bytes_sent += event.request_bytes
+            self.bytes_received += event.response_bytes
+            self.wire_bytes_sent += event.request_wire_bytes
+            self.wire_bytes_received += event.response_wire_bytes
+
+
+    def snapshot(self):
+        """Summarises everything recorded so far.
+
+        :rtype: ``dict``"""
+
+        with self._lock:
+            return {
+                "requests": self.requests, "errors": self.errors,
+                "retries": self.retries, "cached": self.cached,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "wire_bytes_sent": self.wire_bytes_sent,
+                "wire_bytes_received": self.wire_bytes_received,
+                "request_compression_ratio": get_ratio(
+                    self.bytes_sent, self.wire_bytes_sent
+                ),
+                "response_compression_ratio": get_ratio(
+                    self.bytes_received, self.wire_bytes_received
+                ),
+                "operations": {
+                    name: histogram.snapshot()
+                    for name, histogram in self.histograms.items()
+                }
+            }
+
+
+
+class OpenTelemetryHooks(Hooks):
+    """Hooks which create an OpenTelemetry span for each request, with the
+    request's phase timings, sizes and retries as attributes. The
+    opentelemetry-api library must be installed to use this class.
+
+    :param tracer: The tracer to use (the global one by default)."""
+
+    def __init__(self, tracer=None):
+        if trace is None:
+            raise ImportError(
+                "OpenTelemetryHooks requires opentelemetry-api to be installed"
+            )
+        self.tracer = tracer or trace.get_tracer("kirjava")
+
+
+    def before_request(self, event):
+        name = " ".join(filter(None, [event.operation_type, event.operation_name]))
+        event.span = self.tracer.start_span(
+            name or "graphql", kind=trace.SpanKind.CLIENT, attributes={
+                "graphql.operation.name": event.operation_name or "",
+                "graphql.operation.type": event.operation_type or "",
+                "http.request.method": event.method, "url.full": event.url
+            }
+        )
+
+
+    def on_retry(self, event):
+        event.span.add_event("retry", {
+            "attempt": event.attempts,
+            "error": repr(event.error) if event.error else "",
+            "http.response.status_code": event.status or 0
+        })
+
+
+    def after_response(self, event):
+        self.finish(event)
+
+
+    def on_error(self, event):
+        event.span.record_exception(event.error)
+        event.span.set_status(trace.Status(trace.StatusCode.ERROR))
+        self.finish(event)
+
+
+    def finish(self, event):
+        """Adds a request's final details to its span and ends it.
+
+        :param RequestEvent event: The request's event."""
+
+        attributes = {
+            f"kirjava.{phase}_seconds": seconds
+            for phase, seconds in event.timings.items()
+        }
+        attributes.update({
+            "kirjava.retries": event.retries, "kirjava.cached": event.cached,
+            "http.request.body.size": event.request_bytes,
+            "http.response.body.size": event.response_bytes
+        })
+        if event.status: attributes["http.response.status_code"] = event.status
+        event.span.set_attributes(attributes)
+        event.span.end()
+
+
+
+def get_ratio(size, wire_size):
+    """Works out how many times smaller compression made some bytes.
+
+    :param int size: The number of bytes before compression.
+    :param int wire_size: The number of bytes after compression.
+    :rtype: ``float``"""
+
+    return size / wire_size if wire_size else None
+
+
+def get_body_size(operation, files=None):
+    """Works out roughly how many bytes a request body will be. The multipart
+    boundaries of file uploads are not counted.
+
+    :param operation: The body, or the multipart fields.
+    :param dict files: Any packed files.
+    :rtype: ``int``"""
+
+    if isinstance(operation, str): return len(operation.encode())
+    if isinstance(operation, (bytes, MultipartEncoder)): return len(operation)
+    if isinstance(operation, dict):
+        size = sum(get_body_size(value) for value in operation.values())
+        for _, content, _ in (files or {}).values():
+            if isinstance(content, (bytes, bytearray, memoryview)):
+                size += len(content)
+        return size
+    return 0
@@ -0,0 +1,248 @@
+"""Limits on how quickly, and how many at once, requests can be sent."""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+class RateLimiter:
+    """A token bucket which limits how often requests can be made. Tokens are
+    added at a steady rate up to a maximum, and each request uses one (or more,
+    if it costs more). A request which finds too few tokens waits until there
+    will be enough.
+
+    Waits are reserved in advance - a request takes its tokens immediately,
+    even if that leaves the bucket in debt, and is told how long to wait before
+    it can go. This means requests go in the order they arrived, and the
+    limiter can be shared by threads and event loops alike.
+
+    If the server reports how much of a cost-based quota is left (in
+    ``extensions.cost``), a limiter can be kept in line with it using
+    :py:meth:`.sync`.
+
+    :param float rate: The number of tokens added per second.
+    :param float capacity: The most tokens that can build up, which is how\
+    many requests can be made at once after a quiet period (the rate, or 1,\
+    by default).
+    :param float cost: The number of tokens each request uses."""
+
+    def __init__(self, rate, capacity=None, cost=1):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.cost = cost
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return f"<RateLimiter ({self.rate}/s)>"
+
+
+    @property
+    def tokens(self):
+        """The number of tokens available now, which is negative if requests
+        are waiting.
+
+        :rtype: ``float``"""
+
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+    def reserve(self, cost=None):
+        """Takes tokens for a request, and works out how long the request must
+        wait before it can be sent.
+
+        :param float cost: The tokens to take (the limiter's ``cost`` by\
+        default).
+        :returns: The number of seconds to wait."""
+
+        cost = self.cost if cost is None else cost
+        with self._lock:
+            self._refill()
+            self._tokens -= cost
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+    def acquire(self, cost=None):
+        """Waits until a request can be sent.
+
+        :param float cost: The tokens to take (the limiter's ``cost`` by\
+        default)."""
+
+        delay = self.reserve(cost)
+        if delay: time.sleep(delay)
+
+
+    async def acquire_async(self, cost=None):
+        """Waits until a request can be sent, without blocking the event loop.
+
+        :param float cost: The tokens to take (the limiter's ``cost`` by\
+        default)."""
+
+        delay = self.reserve(cost)
+        if delay: await asyncio.sleep(delay)
+
+
+    def pause(self, seconds):
+        """Stops any tokens being available for a while - for example when
+        the server says it is being sent too many requests.
+
+        :param float seconds: How long to pause for."""
+
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+    def sync(self, result):
+        """Brings the limiter in line with the cost information in a GraphQL
+        response, if it has any. This understands the common
+        ``extensions.cost`` format, where ``throttleStatus`` gives the
+        ``maximumAvailable``, ``currentlyAvailable`` and ``restoreRate`` of the
+        quota, and ``requestedQueryCost`` the cost of the query. The cost is
+        used as the estimate for the next request.
+
+        :param dict result: The decoded GraphQL response."""
+
+        cost = get_cost_extension(result)
+        if not cost: return
+        status = cost.get("throttleStatus") or {}
+        with self._lock:
+            self._refill()
+            if status.get("restoreRate"): self.rate = status["restoreRate"]
+            if status.get("maximumAvailable"):
+                self.capacity = status["maximumAvailable"]
+            if status.get("currentlyAvailable") is not None:
+                self._tokens = min(self._tokens, status["currentlyAvailable"])
+            if cost.get("requestedQueryCost") is not None:
+                self.cost = cost["requestedQueryCost"]
+
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+
+class ConcurrencyLimiter:
+    """Limits how many requests can be in flight at once. Unlike a
+    ``threading.Semaphore`` or an ``asyncio.Semaphore``, the same limiter can
+    be used by threads and by coroutines on any event loop at the same time.
+    It can be used as a context manager, synchronous or asynchronous.
+
+    :param int limit: The most requests that can be in flight at once."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._active = 0
+        self._condition = threading.Condition()
+        self._waiters = deque()
+
+
+    def __repr__(self):
+        return f"<ConcurrencyLimiter ({self._active}/{self.limit} in use)>"
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, *args):
+        self.release()
+
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+
+    async def __aexit__(self, *args):
+        self.release()
+
+
+    @property
+    def active(self):
+        """The number of requests currently in flight.
+
+        :rtype: ``int``"""
+
+        return self._active
+
+
+    def acquire(self):
+        """Waits until there is room for another request, and takes it."""
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+
+    async def acquire_async(self):
+        """Waits until there is room for another request, and takes it,
+        without blocking the event loop."""
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._active < self.limit:
+                    self._active += 1
+                    return
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._condition:
+                    try:
+                        self._waiters.remove((loop, future))
+                    except ValueError:
+                        self._wake_next()
+                raise
+
+
+    def release(self):
+        """Gives up a request's place, letting a waiting request go."""
+
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+            self._wake_next()
+
+
+    def _wake_next(self):
+        while self._waiters:
+            loop, future = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(wake, future)
+                return
+            except RuntimeError:
+                continue
+
+
+
+def wake(future):
+    """Wakes a coroutine waiting on a future, unless it has stopped waiting.
+
+    :param asyncio.Future future: The future being waited on."""
+
+    if not future.done(): future.set_result(None)
+
+
+def get_cost_extension(result):
+    """Gets the query cost information from a GraphQL response, if it has any.
+
+    :param dict result: The decoded GraphQL response.
+    :rtype: ``dict``"""
+
+    if not isinstance(result, dict): return None
+    extensions = result.get("extensions")
+    if not isinstance(extensions, dict): return None
+    cost = extensions.get("cost")
+    return cost if isinstance(cost, dict) else None
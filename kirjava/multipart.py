@@ -0,0 +1,251 @@
+"""Tools for streaming multipart request bodies."""
+
+import io
+import mmap
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+READ_AHEAD = 1048576
+
+class MultipartEncoder(io.RawIOBase):
+    """A file-like object which produces a ``multipart/form-data`` request body
+    on demand, as it is read. File contents are read from their file objects
+    in chunks as the body is sent, rather than being loaded into memory first,
+    so memory use stays the same no matter how large the files are.
+
+    The total length of the body is worked out in advance (from the sizes of
+    the files) so that it can be sent with a ``Content-Length`` header. Reading
+    can be restarted from the beginning with ``seek(0)``, which rewinds each
+    file to where it was when the encoder was created.
+
+    If workers are given, the start of each of the next few files is read from
+    a pool of threads while the parts before it are being sent, so that the
+    body isn't held up waiting for slow storage. No more than ``read_ahead``
+    bytes of each of those files are read ahead, and the rest of a file is
+    read when the body reaches it.
+
+    :param dict fields: Plain form fields, as names mapped to strings.
+    :param dict files: Files to send, as names mapped to ``(filename, file,\
+    content_type)`` tuples, where ``file`` is a file object or a bytes-like\
+    object (which is sent from where it is, without being copied).
+    :param str boundary: The multipart boundary to use (random by default).
+    :param int workers: The number of files to read ahead at once (none by\
+    default).
+    :param int read_ahead: The most bytes of each file to read ahead."""
+
+    def __init__(self, fields, files, boundary=None, workers=None, read_ahead=READ_AHEAD):
+        self._boundary = boundary or uuid.uuid4().hex
+        self._workers = workers
+        self._read_ahead = read_ahead
+        self._executor = None
+        self._heads, self._head = {}, None
+        self._parts = []
+        for name, value in fields.items():
+            self._add_bytes(self._part_header(name))
+            self._add_bytes(value.encode() if isinstance(value, str) else value)
+            self._add_bytes(b"\r\n")
+        for name, (filename, f, content_type) in files.items():
+            self._add_bytes(self._part_header(name, filename, content_type))
+            if isinstance(f, BUFFER_TYPES + (mmap.mmap,)):
+                self._add_bytes(f if isinstance(f, bytes) else memoryview(f).cast("B"))
+            else:
+                if hasattr(f, "buffer"): f = get_binary_file(f)
+                size = get_file_size(f)
+                if size: self._parts.append((f, f.tell(), size))
+            self._add_bytes(b"\r\n")
+        self._add_bytes(f"--{self._boundary}--\r\n".encode())
+        self._length = sum(part[2] for part in self._parts)
+        self._position = self._part_index = self._part_position = 0
+
+
+    def __repr__(self):
+        return f"<MultipartEncoder ({self._length} bytes)>"
+
+
+    def __len__(self):
+        return self._length
+
+
+    @property
+    def content_type(self):
+        """The value of the ``Content-Type`` header to send the body with.
+
+        :rtype: ``str``"""
+
+        return f"multipart/form-data; boundary={self._boundary}"
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def tell(self):
+        return self._position
+
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Restarts the body from the beginning - no other position can be
+        sought to.
+
+        :param int offset: The position to seek to, which must be 0.
+        :rtype: ``int``"""
+
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Can only seek to the start")
+        self._discard_heads()
+        for value, start, _ in self._parts:
+            if not isinstance(value, BUFFER_TYPES): value.seek(start)
+        self._position = self._part_index = self._part_position = 0
+        return 0
+
+
+    def read(self, size=-1):
+        """Reads the next chunk of the body. Fewer bytes than asked for may be
+        returned, but an empty result is only returned at the end.
+
+        :param int size: The maximum number of bytes to read (-1 for all).
+        :rtype: ``bytes``"""
+
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(65536), b""))
+        chunk = b""
+        while not chunk and size and self._part_index < len(self._parts):
+            value, _, length = self._parts[self._part_index]
+            if self._head is None: self._head = self._take_head()
+            if isinstance(value, BUFFER_TYPES):
+                chunk = value[self._part_position:self._part_position + size]
+            else:
+                if self._part_position < len(self._head):
+                    chunk = self._head[
+                        self._part_position:self._part_position + size
+                    ]
+                else:
+                    chunk = value.read(min(size, length - self._part_position))
+                if not chunk:
+                    raise IOError("File ended before its expected size")
+            self._part_position += len(chunk)
+            if self._part_position >= length:
+                self._part_index += 1
+                self._part_position = 0
+                self._head = None
+        if self._part_index == len(self._parts): self._discard_heads()
+        self._position += len(chunk)
+        return bytes(chunk)
+
+
+    def readinto(self, buffer):
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+    def close(self):
+        """Stops any files being read ahead, and closes the encoder."""
+
+        self._discard_heads()
+        super().close()
+
+
+    def _take_head(self):
+        """Starts reading ahead the next few files after the current part, and
+        gets whatever has been read ahead of the current part itself.
+
+        :returns: The start of the current part if it is a file (empty if none\
+        was read ahead)."""
+
+        if not self._workers: return b""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        pending = 0
+        for index in range(self._part_index + 1, len(self._parts)):
+            if pending == self._workers: break
+            f, _, length = self._parts[index]
+            if isinstance(f, BUFFER_TYPES): continue
+            if index not in self._heads:
+                self._heads[index] = self._executor.submit(
+                    read_exactly, f, min(length, self._read_ahead)
+                )
+            pending += 1
+        future = self._heads.pop(self._part_index, None)
+        return b"" if future is None else future.result()
+
+
+    def _discard_heads(self):
+        """Waits for any files being read ahead, throws away what was read, and
+        shuts down the threads reading them."""
+
+        for future in self._heads.values():
+            if not future.cancel(): future.exception()
+        self._heads, self._head = {}, None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+    def _add_bytes(self, value):
+        if value: self._parts.append((value, 0, len(value)))
+
+
+    def _part_header(self, name, filename=None, content_type=None):
+        header = f'--{self._boundary}\r\nContent-Disposition: form-data; name="{name}"'
+        if filename is not None:
+            filename = filename.replace('"', "%22")
+            header += f'; filename="{filename}"'
+        header += "\r\n"
+        if content_type: header += f"Content-Type: {content_type}\r\n"
+        return (header + "\r\n").encode()
+
+
+
+def get_binary_file(f):
+    """Gets the binary file underneath a text file, at the same position. The
+    binary file is usually further ahead, as the text file reads ahead of
+    what it has returned.
+
+    :param f: The text file object.
+    :raises ValueError: if the text file's position isn't a byte offset.
+    :returns: The binary file object."""
+
+    position = f.tell()
+    if position >> 64:
+        raise ValueError(f"Can't upload {f!r} from its current position")
+    f.buffer.seek(position)
+    return f.buffer
+
+
+def read_exactly(f, size):
+    """Reads a number of bytes from a file object, unless it ends first.
+
+    :param f: The file object.
+    :param int size: The number of bytes to read.
+    :rtype: ``bytes``"""
+
+    chunks = []
+    while size > 0:
+        chunk = f.read(size)
+        if not chunk: break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def get_file_size(f):
+    """Works out how many bytes are left to read in a file object, from its
+    current position.
+
+    :param f: The file object.
+    :rtype: ``int``"""
+
+    position = f.tell()
+    try:
+        return os.fstat(f.fileno()).st_size - position
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        end = f.seek(0, io.SEEK_END)
+        f.seek(position)
+        return end - position
@@ -0,0 +1,158 @@
+"""A lightweight GraphQL lexer and parser, which finds out what the client
+needs to know about a query document without building a full syntax tree."""
+
+import re
+from functools import lru_cache
+
+TOKEN = re.compile(r"""
+    (?P<ignored>[\s,\ufeff]+|\#[^\n\r]*)
+  | (?P<block>\"\"\"(?:\\\"\"\"|(?!\"\"\")[\s\S])*\"\"\")
+  | (?P<string>"(?:[^"\\\n\r]|\\.)*")
+  | (?P<number>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+  | (?P<punctuator>\.\.\.|[!$&():=@\[\]{|}])
+""", re.VERBOSE)
+
+OPERATION_TYPES = ("query", "mutation", "subscription")
+
+BRACKETS = {"{": "}", "(": ")", "[": "]"}
+
+WORDS = ("name", "number")
+
+class GraphQLSyntaxError(ValueError):
+    """Raised when a GraphQL document can't be parsed."""
+
+
+
+class Document:
+    """What is known about a GraphQL document once it has been parsed.
+
+    :param str source: The document's original text.
+    :param str minified: The document with all insignificant whitespace,\
+    commas and comments removed. Documents which differ only in these\
+    respects have the same minified text.
+    :param list operations: The ``(type, name)`` of each operation in the\
+    document, where the name is ``None`` for anonymous operations."""
+
+    __slots__ = ["source", "minified", "operations"]
+
+    def __init__(self, source, minified, operations):
+        self.source = source
+        self.minified = minified
+        self.operations = operations
+
+
+    def __repr__(self):
+        return f"<Document ({len(self.operations)} operations)>"
+
+
+    @property
+    def operation_type(self):
+        """The type of the document's operation. This errs on the side of
+        caution - if any operation in the document is a mutation or
+        subscription, that is what it will be taken for.
+
+        :rtype: ``str``"""
+
+        for operation_type, _ in self.operations:
+            if operation_type != "query": return operation_type
+        return "query"
+
+
+    @property
+    def operation_name(self):
+        """The name of the document's first operation, or ``None`` if it is
+        anonymous.
+
+        :rtype: ``str``"""
+
+        return self.operations[0][1] if self.operations else None
+
+
+
+def tokenize(source):
+    """Splits a GraphQL document into its tokens, leaving out whitespace,
+    commas and comments.
+
+    :param str source: The document to split.
+    :raises GraphQLSyntaxError: if there is anything which isn't a token.
+    :returns: ``(kind, text)`` pairs."""
+
+    position, length = 0, len(source)
+    while position < length:
+        match = TOKEN.match(source, position)
+        if match is None:
+            character = source[position]
+            message = "Unterminated string" if character == '"' else (
+                f"Unexpected character {character!r}"
+            )
+            raise GraphQLSyntaxError(message + get_location(source, position))
+        position = match.end()
+        if match.lastgroup != "ignored":
+            yield match.lastgroup, match.group()
+
+
+@lru_cache(maxsize=1024)
+def parse(source):
+    """Parses a GraphQL document, finding its operations and its minified
+    text. Only the document's outline is checked - it must be made of
+    operations and fragments with balanced brackets - and the server still
+    validates it fully. Recently parsed documents are remembered.
+
+    :param str source: The document to parse.
+    :raises GraphQLSyntaxError: if the document is not valid GraphQL.
+    :rtype: ``Document``"""
+
+    parts, operations, stack = [], [], []
+    expecting, previous, operation = True, None, None
+    for kind, text in tokenize(source):
+        if previous in WORDS and kind in WORDS: parts.append(" ")
+        parts.append(text)
+        previous = kind
+        if operation is not None:
+            operations.append((operation, text if kind == "name" else None))
+            operation = None
+        if text in BRACKETS:
+            if expecting and not stack and text == "{":
+                operations.append(("query", None))
+            stack.append(BRACKETS[text])
+            expecting = False
+        elif kind == "punctuator" and text in BRACKETS.values():
+            if not stack or stack.pop() != text:
+                raise GraphQLSyntaxError(f"Unexpected {text!r}")
+            expecting = text == "}" and not stack
+        elif expecting:
+            if text in OPERATION_TYPES:
+                operation = text
+            elif text != "fragment":
+                raise GraphQLSyntaxError(
+                    f"Expected an operation or fragment, found {text!r}"
+                )
+            expecting = False
+    if operation is not None: operations.append((operation, None))
+    if stack: raise GraphQLSyntaxError("Unexpected end of document")
+    if not parts: raise GraphQLSyntaxError("The document is empty")
+    return Document(source, "".join(parts), operations)
+
+
+def minify(source):
+    """Removes all insignificant whitespace, commas and comments from a
+    GraphQL document.
+
+    :param str source: The document to minify.
+    :raises GraphQLSyntaxError: if the document is not valid GraphQL.
+    :rtype: ``str``"""
+
+    return parse(source).minified
+
+
+def get_location(source, position):
+    """Describes where in a document an error is, for error messages.
+
+    :param str source: The document.
+    :param int position: The offset of the error.
+    :rtype: ``str``"""
+
+    line = source.count("\n", 0, position) + 1
+    column = position - source.rfind("\n", 0, position)
+    return f" at line {line}, column {column}"
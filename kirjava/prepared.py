@@ -0,0 +1,106 @@
+"""Operations prepared in advance, for queries which are sent many times with
+different variables."""
+
+import time
+from .utilities import get_operation_name, has_files
+
+class PreparedOperation:
+    """A query which has been prepared for sending many times, with only its
+    variables changing. The query is encoded once, when the operation is
+    prepared, so each call only has to encode the variables and send them -
+    it is called with the same arguments as ``execute``, apart from the query
+    and method.
+
+    The client's headers are sent as they are at the time of each call. Calls
+    which upload files, and calls made with a client which caches results,
+    shares in-flight requests or uses persisted queries, are made with the
+    client's ``execute`` instead, so that everything works as usual.
+
+    :param Client client: The client to send the operation with.
+    :param str message: The query to make.
+    :param str method: The HTTP method to use.
+    :param bool direct: If ``False``, every call goes through ``execute``."""
+
+    def __init__(self, client, message, method="POST", direct=True):
+        self.client = client
+        self.message = client.prepare_message(message)
+        self.method = method
+        self.direct = direct
+        self.operation_name = get_operation_name(self.message)
+        query = client.codec.dumps({"query": self.message})
+        if isinstance(query, str): query = query.encode()
+        self.prefix = query[:-1] + b', "variables": '
+
+
+    def __repr__(self):
+        return f"<PreparedOperation ({self.operation_name or 'anonymous'})>"
+
+
+    def __call__(self, variables=None, retries=0, retry_statuses=None, timeout=None):
+        """Sends the operation with some variables.
+
+        :param dict variables: Any GraphQL variables.
+        :param int retries: The number of times to retry on failure.
+        :param list retry_statuses: The HTTP statuses to retry on.
+        :param timeout: The timeout for this request, overriding the client's.
+        :rtype: ``dict``"""
+
+        client = self.client
+        if not self.direct or has_files(variables):
+            return client.execute(
+                self.message, self.method, variables, retries, retry_statuses,
+                timeout
+            )
+        with client.instrument(self.message, self.method, self.operation_name) as event:
+            if event: started = time.perf_counter()
+            body = self.encode(variables)
+            if event: event.time("encode", started)
+            response = client.request_with_retries(
+                operation=body, headers=client.headers, method=self.method,
+                retries=retries, retry_statuses=retry_statuses, timeout=timeout
+            )
+            result = client.decode(response)
+            client.record(self.message, variables, result)
+            return result
+
+
+    def encode(self, variables):
+        """Creates the request body for a call, by adding the encoded
+        variables to the already encoded query.
+
+        :param dict variables: The GraphQL variables.
+        :rtype: ``bytes``"""
+
+        encoded = self.client.codec.dumps(variables)
+        if isinstance(encoded, str): encoded = encoded.encode()
+        return b"".join((self.prefix, encoded, b"}"))
+
+
+
+class AsyncPreparedOperation(PreparedOperation):
+    """A prepared operation for an :py:class:`.AsyncClient`, which is called
+    in the same way as :py:class:`.PreparedOperation` except that calling it
+    returns a coroutine."""
+
+    def __repr__(self):
+        return f"<AsyncPreparedOperation ({self.operation_name or 'anonymous'})>"
+
+
+    async def __call__(self, variables=None, retries=0, retry_statuses=None, timeout=None):
+        client = self.client
+        if not self.direct or has_files(variables):
+            return await client.execute(
+                self.message, self.method, variables, retries, retry_statuses,
+                timeout
+            )
+        with client.instrument(self.message, self.method, self.operation_name) as event:
+            if event: started = time.perf_counter()
+            body = self.encode(variables)
+            if event: event.time("encode", started)
+            response = await client.request_with_retries(
+                operation=body, headers=client.headers, method=self.method,
+                retries=retries, retry_statuses=retry_statuses, timeout=timeout
+            )
+            result = client.decode(response, await response.read())
+            client.record(self.message, variables, result)
+            return result
@@ -0,0 +1,262 @@
+"""Policies which control when and how failed requests are retried."""
+
+import asyncio
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+
+RETRYABLE_EXCEPTIONS = (
+    requests.ConnectionError, requests.Timeout, ConnectionError,
+    TimeoutError, asyncio.TimeoutError
+)
+
+OPTIONAL_EXCEPTIONS = (
+    ("aiohttp", "ClientConnectionError"), ("httpx", "TransportError")
+)
+
+class RetryError(Exception):
+    """Raised when a request keeps getting a response with a status that
+    should be retried, and no more retries are allowed.
+
+    :param response: The last response received."""
+
+    def __init__(self, response, status):
+        Exception.__init__(self, f"Status code {status}")
+        self.response = response
+
+
+
+class RetryBudget:
+    """A token bucket which limits how many retries can be made over time,
+    across every request that shares it. Each retry uses up a token, and tokens
+    are replaced at a steady rate up to a maximum. When there are no tokens
+    left, failures are not retried - so that when a server is struggling,
+    clients don't make things worse by retrying every request.
+
+    :param float capacity: The most tokens the bucket can hold.
+    :param float refill_rate: How many tokens are added per second."""
+
+    def __init__(self, capacity=10, refill_rate=1):
+        self._capacity = capacity
+        self._refill_rate = refill_rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return f"<RetryBudget ({self.tokens:.1f}/{self._capacity} tokens)>"
+
+
+    @property
+    def tokens(self):
+        """The number of tokens currently available.
+
+        :rtype: ``float``"""
+
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+    def spend(self):
+        """Uses up a token if there is one.
+
+        :returns: ``True`` if a retry can be made, ``False`` otherwise."""
+
+        with self._lock:
+            self._refill()
+            if self._tokens < 1: return False
+            self._tokens -= 1
+            return True
+
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._updated) * self._refill_rate
+        )
+        self._updated = now
+
+
+
+class RetryPolicy:
+    """Describes when failed requests should be retried, and how long to wait
+    between attempts.
+
+    Requests are retried when the connection fails or times out, when the
+    response has one of the given HTTP statuses, or when the GraphQL response
+    contains an error with one of the given error codes (in its
+    ``extensions.code``). Other exceptions are never retried.
+
+    The wait before each retry is random, between zero and an exponentially
+    increasing limit ("full jitter"), so that many clients failing at once
+    don't all retry at the same moment. If a 429 or 503 response has a
+    ``Retry-After`` header, that is waited for instead.
+
+    A deadline can be given, after which no more retries will be started, and
+    a :py:class:`.RetryBudget` can be shared to limit retries overall.
+
+    :param int retries: The most times a request will be retried.
+    :param list statuses: The HTTP statuses to retry on.
+    :param float backoff: The base wait, in seconds.
+    :param float max_backoff: The most that will be waited between attempts.
+    :param float deadline: The number of seconds after the first attempt\
+    after which no more attempts will be made.
+    :param bool retry_after: Whether to obey ``Retry-After`` headers.
+    :param list error_codes: GraphQL error codes to retry on.
+    :param RetryBudget budget: A budget which retries must be taken from.
+    :param tuple exceptions: The exceptions which count as retryable failures\
+    (connection failures and timeouts by default)."""
+
+    def __init__(self, retries=0, statuses=None, backoff=1, max_backoff=60, deadline=None, retry_after=True, error_codes=None, budget=None, exceptions=None):
+        self.retries = retries
+        self.statuses = set(statuses or ())
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self.error_codes = set(error_codes or ())
+        self.budget = budget
+        self.exceptions = exceptions
+
+
+    def __repr__(self):
+        return f"<RetryPolicy ({self.retries} retries)>"
+
+
+    def replace(self, retries=None, statuses=None):
+        """Creates a copy of the policy with a different number of retries or
+        statuses to retry on. The copy shares the original's budget. If neither
+        is given, the policy itself is returned.
+
+        :param int retries: The new number of retries.
+        :param list statuses: The new statuses to retry on.
+        :rtype: ``RetryPolicy``"""
+
+        if not retries and not statuses: return self
+        policy = RetryPolicy.__new__(RetryPolicy)
+        policy.__dict__.update(self.__dict__)
+        if retries: policy.retries = retries
+        if statuses: policy.statuses = set(statuses)
+        return policy
+
+
+    def get_timeout(self, timeout, started):
+        """Works out the timeout for an attempt, so that it can't run past the
+        policy's deadline.
+
+        :param timeout: The timeout requested, as a number of seconds or a\
+        ``(connect, read)`` tuple.
+        :param float started: The ``time.monotonic()`` of the first attempt.
+        :returns: The timeout to use."""
+
+        if self.deadline is None: return timeout
+        return bound_timeout(
+            timeout, started + self.deadline - time.monotonic()
+        )
+
+
+    def should_retry(self, error=None, status=None, result=None):
+        """Decides whether an attempt failed in a way that can be retried.
+
+        :param Exception error: The exception raised by the attempt, if any.
+        :param int status: The HTTP status of the response, if any.
+        :param dict result: The decoded GraphQL response, if any.
+        :rtype: ``bool``"""
+
+        if error is not None:
+            return isinstance(error, self.exceptions or get_retryable_exceptions())
+        if status in self.statuses: return True
+        if self.error_codes and isinstance(result, dict):
+            for error in result.get("errors") or []:
+                if not isinstance(error, dict): continue
+                code = (error.get("extensions") or {}).get("code")
+                if code in self.error_codes: return True
+        return False
+
+
+    def get_delay(self, attempt, status=None, headers=None):
+        """Works out how long to wait before a retry.
+
+        :param int attempt: The number of the retry about to be made (from 1).
+        :param int status: The HTTP status of the failed response, if any.
+        :param headers: The headers of the failed response, if any.
+        :rtype: ``float``"""
+
+        if self.retry_after and status in (429, 503) and headers:
+            delay = parse_retry_after(headers.get("Retry-After"))
+            if delay is not None: return delay
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+    def allows(self, attempt, started, delay):
+        """Checks whether another retry may be made - whether there are any
+        retries left, the deadline won't have passed by the time the retry is
+        made, and the budget has a token to spare.
+
+        :param int attempt: The number of the retry about to be made (from 1).
+        :param float started: The ``time.monotonic()`` of the first attempt.
+        :param float delay: The wait before the retry.
+        :rtype: ``bool``"""
+
+        if attempt > self.retries: return False
+        if self.deadline is not None:
+            if time.monotonic() + delay > started + self.deadline: return False
+        if self.budget is not None and not self.budget.spend(): return False
+        return True
+
+
+
+def bound_timeout(timeout, remaining):
+    """Limits a timeout so that no part of it is longer than the time
+    remaining. The timeout can be a single number, a ``(connect, read)``
+    tuple, or ``None`` for no timeout.
+
+    :param timeout: The timeout to limit.
+    :param float remaining: The seconds remaining, or ``None`` for no limit.
+    :returns: The limited timeout."""
+
+    if remaining is None: return timeout
+    remaining = max(remaining, 0)
+    if timeout is None: return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+    return min(timeout, remaining)
+
+
+def parse_retry_after(value):
+    """Parses a ``Retry-After`` header, which can be a number of seconds or a
+    HTTP date.
+
+    :param str value: The header's value.
+    :returns: The number of seconds to wait, or ``None`` if it can't be parsed."""
+
+    if not value: return None
+    try:
+        return max(0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_retryable_exceptions():
+    """Gets the exceptions which are retried by default - connection failures
+    and timeouts. Those from aiohttp and httpx are only included once the
+    library has been imported, as they can't have been raised before then,
+    and importing them just to check would be slow.
+
+    :rtype: ``tuple``"""
+
+    exceptions = RETRYABLE_EXCEPTIONS
+    for module_name, name in OPTIONAL_EXCEPTIONS:
+        module = sys.modules.get(module_name)
+        if module: exceptions += (getattr(module, name),)
+    return exceptions
@@ -0,0 +1,363 @@
+"""Tools for reading large JSON responses incrementally."""
+
+import asyncio
+import codecs
+import json
+import queue
+import re
+import threading
+from collections import deque
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+STRUCTURE = re.compile(r'["\[\]{}]')
+STRING_CONTENTS = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+SCALAR_END = re.compile(r"[,\]}\s]")
+DECODER = json.JSONDecoder()
+
+class JsonStream:
+    """An iterator over the items of one array inside a JSON document, which
+    reads the document in chunks as it goes. Only one item at a time is held
+    in memory, no matter how long the array is.
+
+    The array is located by a path of object keys from the top of the
+    document, such as ``["data", "users", "edges"]``. If the path doesn't lead
+    to an array (because the server returned ``null`` there, for example),
+    there are no items. Any top-level ``errors`` in the document are available
+    from the ``errors`` attribute once iteration has finished.
+
+    A stream can be used as a context manager, which closes it on exit - so
+    that the response's connection is released even if not every item is
+    read.
+
+    :param chunks: An iterable of ``bytes`` making up the document.
+    :param list path: The object keys leading to the array.
+    :param on_close: A function to call once the document has been read, or\
+    the stream is closed early. It is only ever called once."""
+
+    def __init__(self, chunks, path, on_close=None):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._path = list(path)
+        self._on_close = on_close
+        self._buffer, self._position = "", 0
+        self._items = self._read()
+        self.errors = None
+
+
+    def __repr__(self):
+        return f"<JsonStream ({'.'.join(self._path)})>"
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        return next(self._items)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def close(self):
+        """Stops reading the document. This can be done before any items have
+        been read."""
+
+        self._items.close()
+        self._finish()
+
+
+    def _finish(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close: on_close()
+
+
+    def _read(self):
+        try:
+            if self._peek() != "{":
+                raise ValueError(f"Expected a JSON object, got {self._peek()!r}")
+            yield from self._object(self._path, top=True)
+        finally:
+            self._finish()
+
+
+    def _object(self, path, top=False):
+        self._position += 1
+        while True:
+            char = self._peek()
+            if char == "}":
+                self._position += 1
+                return
+            if char == ",":
+                self._position += 1
+                continue
+            key = json.loads(self._raw_value())
+            if self._peek() != ":": raise ValueError("Expected ':' in JSON object")
+            self._position += 1
+            if path and key == path[0]:
+                yield from self._target(path[1:])
+            elif top and key == "errors":
+                self.errors = json.loads(self._raw_value())
+            else:
+                self._skip_value()
+
+
+    def _target(self, path):
+        char = self._peek()
+        if path and char == "{":
+            yield from self._object(path)
+        elif not path and char == "[":
+            yield from self._array()
+        else:
+            self._skip_value()
+
+
+    def _array(self):
+        self._position += 1
+        while True:
+            char = self._peek()
+            if char == "]":
+                self._position += 1
+                return
+            if char == ",":
+                self._position += 1
+                continue
+            yield self._item()
+            if self._position > 65536:
+                self._buffer = self._buffer[self._position:]
+                self._position = 0
+
+
+    def _item(self):
+        """Decodes the array item at the current position. Most items fit in
+        the buffer already, so decoding is attempted straight away, and only
+        if the item turns out to be incomplete is more of the document read -
+        enough to at least double the buffer, so that very large items don't
+        get decoded over and over again.
+
+        A number can be cut short by the end of the buffer and still be valid
+        JSON, so numbers are only decoded once the character after them has
+        been read."""
+
+        if self._buffer[self._position] in "-0123456789":
+            self._value_end(self._position)
+        while True:
+            try:
+                item, end = DECODER.raw_decode(self._buffer, self._position)
+                if end < len(self._buffer): break
+            except ValueError:
+                pass
+            length = len(self._buffer) - self._position
+            while len(self._buffer) - self._position < length * 2:
+                if not self._more():
+                    item, end = DECODER.raw_decode(self._buffer, self._position)
+                    self._position = end
+                    return item
+        self._position = end
+        return item
+
+
+    def _more(self):
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buffer += text
+                return True
+        return False
+
+
+    def _peek(self):
+        while True:
+            self._position = WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._more(): raise ValueError("JSON document ended early")
+
+
+    def _raw_value(self):
+        self._peek()
+        start = self._position
+        self._position = self._value_end(self._position)
+        return self._buffer[start:self._position]
+
+
+    def _skip_value(self):
+        self._peek()
+        self._position = self._value_end(self._position, keep=False)
+
+
+    def _value_end(self, index, keep=True):
+        """Finds where the JSON value starting at an index in the buffer ends,
+        reading more of the document as needed. If the value's contents don't
+        need to be kept, the buffer is trimmed as it goes."""
+
+        if self._buffer[index] not in '{["':
+            while True:
+                match = SCALAR_END.search(self._buffer, index)
+                if match: return match.start()
+                if not self._more(): return len(self._buffer)
+        depth = 0
+        while True:
+            match = STRUCTURE.search(self._buffer, index)
+            if match is None:
+                if not keep:
+                    self._buffer, index = self._buffer[index:], 0
+                if not self._more(): raise ValueError("JSON document ended early")
+                continue
+            char, index = match.group(), match.end()
+            if char == '"':
+                index = STRING_CONTENTS.match(self._buffer, index).end()
+                while index == len(self._buffer) or self._buffer[index] != '"':
+                    if not keep:
+                        self._buffer, index = self._buffer[index:], 0
+                    if not self._more(): raise ValueError("JSON document ended early")
+                    index = STRING_CONTENTS.match(self._buffer, index).end()
+                index += 1
+                if depth == 0: return index
+            elif char in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0: return index
+
+
+
+class AsyncJsonStream:
+    """The asynchronous version of :py:class:`.JsonStream`, which reads the
+    document from an asynchronous iterable of chunks, and is iterated over with
+    ``async for``.
+
+    The document is parsed by a :py:class:`.JsonStream` in a thread of its own,
+    so that the event loop is never blocked waiting for it. Each chunk is
+    handed to the thread as it arrives, and all the items it completes are
+    handed back together - so only the items from one chunk are held at once,
+    and the thread waits for the next chunk until they have been read.
+
+    A stream can be used as an asynchronous context manager, which closes it
+    on exit.
+
+    :param chunks: An asynchronous iterable of ``bytes`` making up the\
+    document.
+    :param list path: The object keys leading to the array.
+    :param on_close: A function to call once the document has been read, or\
+    the stream is closed early. It is only ever called once."""
+
+    def __init__(self, chunks, path, on_close=None):
+        self._chunks = chunks.__aiter__()
+        self._path = list(path)
+        self._on_close = on_close
+        self._items = deque()
+        self._requests = queue.SimpleQueue()
+        self._thread = None
+        self._finished, self._error = False, None
+        self.errors = None
+
+
+    def __repr__(self):
+        return f"<AsyncJsonStream ({'.'.join(self._path)})>"
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        while not self._items:
+            if self._finished:
+                error, self._error = self._error, None
+                if error is not None: raise error
+                raise StopAsyncIteration
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+            items, self.errors, error, finished = await self._parse(chunk)
+            self._items.extend(items)
+            if finished:
+                self._finished, self._error = True, error
+                self._finish()
+        return self._items.popleft()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+    async def close(self):
+        """Stops reading the document. This can be done before any items have
+        been read."""
+
+        if self._thread is not None and not self._finished:
+            await self._parse(None)
+        self._finished, self._error = True, None
+        self._items.clear()
+        self._finish()
+
+
+    def _finish(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close: on_close()
+
+
+    async def _parse(self, chunk):
+        """Hands a chunk to the parsing thread (starting it if needed), and
+        waits for the items it completes. Once there are no more chunks, the
+        thread is given ``None``, and finishes.
+
+        :param bytes chunk: The next chunk of the document.
+        :returns: The items, the document's errors, any exception raised while\
+        parsing it, and whether the thread has finished."""
+
+        loop = asyncio.get_running_loop()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, args=(loop,), daemon=True
+            )
+            self._thread.start()
+        future = loop.create_future()
+        self._requests.put((chunk, future))
+        return await future
+
+
+    def _run(self, loop):
+        items, future = [], None
+
+        def chunks():
+            nonlocal items, future
+            while True:
+                if future is not None:
+                    loop.call_soon_threadsafe(
+                        settle, future, (items, stream.errors, None, False)
+                    )
+                    items = []
+                chunk, future = self._requests.get()
+                if chunk is None: return
+                yield chunk
+
+        stream, error = JsonStream(chunks(), self._path), None
+        try:
+            for item in stream: items.append(item)
+        except Exception as e:
+            error = e
+        loop.call_soon_threadsafe(
+            settle, future, (items, stream.errors, error, True)
+        )
+
+
+
+def settle(future, result):
+    """Gives an asyncio future its result, unless it has been cancelled.
+
+    :param asyncio.Future future: The future to settle.
+    :param result: Its result."""
+
+    if not future.done(): future.set_result(result)
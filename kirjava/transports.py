@@ -0,0 +1,180 @@
+"""Transports, which send a client's HTTP requests over the network."""
+
+from functools import partial
+import requests
+from .multipart import MultipartEncoder
+
+httpx = None
+
+class Transport:
+    """The base class for transports. A transport sends the HTTP requests of a
+    :py:class:`.Client`, and its ``request`` method takes the same arguments
+    as ``requests.Session.request`` and returns something that looks like a
+    ``requests.Response`` - with ``status_code``, ``headers`` and ``content``,
+    and ``iter_content`` and ``close`` methods.
+
+    The object which actually holds the connections is the transport's
+    ``session``. A transport can be used as a context manager, which closes
+    it afterwards."""
+
+    session = None
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def request(self, method, url, **kwargs):
+        """Sends a HTTP request.
+
+        :param str method: The HTTP method to use.
+        :param str url: The URL to send the request to.
+        :param kwargs: ``headers``, ``data``, ``files``, ``params``,\
+        ``timeout`` and ``stream``, as for ``requests``."""
+
+        raise NotImplementedError
+
+
+    def close(self):
+        """Closes the transport's connections."""
+
+
+
+class RequestsTransport(Transport):
+    """Sends requests through a ``requests.Session``. This is the default
+    transport - it uses HTTP/1.1, so each request in flight at once needs a
+    connection of its own.
+
+    :param requests.Session session: The session to send requests through\
+    (a new one by default)."""
+
+    def __init__(self, session=None):
+        self.session = requests.Session() if session is None else session
+
+
+    def __repr__(self):
+        return "<RequestsTransport>"
+
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+
+    def close(self):
+        self.session.close()
+
+
+
+class HTTP2Transport(Transport):
+    """Sends requests over HTTP/2 using an ``httpx.Client``. Many requests -
+    from any number of threads - can be in flight over a single connection to
+    each host at once, so high fan-out doesn't need a connection per request,
+    and a slow response doesn't hold up the others. Servers which don't speak
+    HTTP/2 are sent HTTP/1.1 instead.
+
+    The httpx library must be installed, with its ``http2`` extra, to use
+    this class.
+
+    :param int max_connections: The most connections to keep open.
+    :param bool keep_alive: If ``False``, connections are closed after each\
+    request rather than being reused.
+    :param bool compression: If ``False``, the server is asked not to\
+    compress responses.
+    :param httpx.Client session: A client to send requests through instead\
+    of a new one."""
+
+    def __init__(self, max_connections=10, keep_alive=True, compression=True, session=None):
+        httpx = import_httpx()
+        if session is None:
+            session = httpx.Client(
+                http2=True, timeout=None, limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections if keep_alive else 0
+                ), headers=None if compression else {"Accept-Encoding": "identity"}
+            )
+        self.session = session
+
+
+    def __repr__(self):
+        return "<HTTP2Transport>"
+
+
+    def request(self, method, url, headers=None, data=None, files=None, params=None, timeout=None, stream=False):
+        headers = dict(headers or {})
+        options = {}
+        if files:
+            options = {"data": data, "files": files}
+        elif isinstance(data, MultipartEncoder):
+            headers["Content-Length"] = str(len(data))
+            options["content"] = iter(partial(data.read, 65536), b"")
+        elif data is not None:
+            options["content"] = data
+        request = self.session.build_request(
+            method, url, headers=headers, params=params,
+            timeout=create_timeout(timeout), **options
+        )
+        return HTTP2Response(self.session.send(request, stream=stream))
+
+
+    def close(self):
+        self.session.close()
+
+
+
+class HTTP2Response:
+    """Wraps an ``httpx.Response`` so that it can be used like a
+    ``requests.Response``. Anything not defined here is passed through.
+
+    :param httpx.Response response: The response to wrap."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+    def __repr__(self):
+        return f"<HTTP2Response [{self.response.status_code}]>"
+
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+    def iter_content(self, chunk_size=1):
+        """Iterates over the response body as it arrives.
+
+        :param int chunk_size: The number of bytes to read at a time."""
+
+        return self.response.iter_bytes(chunk_size)
+
+
+
+def create_timeout(timeout):
+    """Turns a ``requests`` timeout - a number of seconds, or a
+    ``(connect, read)`` tuple - into an httpx one.
+
+    :param timeout: The timeout in ``requests`` form.
+    :rtype: ``httpx.Timeout``"""
+
+    httpx = import_httpx()
+    if isinstance(timeout, tuple):
+        return httpx.Timeout(None, connect=timeout[0], read=timeout[1])
+    return httpx.Timeout(timeout)
+
+
+def import_httpx():
+    """Imports httpx the first time it is needed, so that importing kirjava
+    doesn't import it.
+
+    :raises ImportError: if httpx isn't installed.
+    :returns: The httpx module."""
+
+    global httpx
+    if httpx is None:
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("HTTP2Transport requires httpx to be installed")
+    return httpx
@@ -1,88 +1,311 @@
 """Useful functions."""
 
+import hashlib
 import io
 import mimetypes
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from http.cookiejar import DefaultCookiePolicy
+from .parser import GraphQLSyntaxError, parse
 
-def execute(url, *args, headers=None, **kwargs):
+CLIENT_CACHE_SIZE = 16
+CLIENT_IDLE_TIMEOUT = 300
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+FILE_TYPES = (io.IOBase,) + BUFFER_TYPES
+
+def execute(url, *args, headers=None, reuse_connections=True, **kwargs):
     """Sends a GraphQL request without the user haveing to make a dedicated
     :py:class:`.Client` object.
 
+    A client is kept for each URL used, so that later calls to the same URL
+    can reuse its open connections. Up to ``CLIENT_CACHE_SIZE`` clients are
+    kept, and those unused for ``CLIENT_IDLE_TIMEOUT`` seconds are closed.
+    The shared clients don't keep cookies, so that one call can't pass its
+    cookies on to the next, just as when every call had a client of its own.
+
     :param str url: the URL to send to.
     :param str message: The query to make.
     :param str method: By default, POST requests are sent, but this can be\
     overriden here.
     :param dict headers: Any additional HTTP headers.
     :param dict variables: Any GraphQL variables can be passed here.
+    :param bool reuse_connections: If ``False``, a new client is made for\
+    this request and closed afterwards.
     :rtype: ``dict``"""
 
     from .client import Client
-    client = Client(url)
+    if reuse_connections:
+        client = get_client(url)
+        if headers:
+            client = Client(url, history_size=0, transport=client.transport)
+    else:
+        client = Client(url, history_size=0)
     if headers: client.headers.update(headers)
-    return client.execute(*args, **kwargs)
+    try:
+        return client.execute(*args, **kwargs)
+    finally:
+        if not reuse_connections: client.close()
+
+
+def get_client(url):
+    """Gets the shared client for a URL, creating it if necessary. Clients
+    which have been idle for too long are closed, as is the least recently
+    used client if there are too many.
+
+    :param str url: The URL of the GraphQL server.
+    :rtype: ``Client``"""
+
+    from .client import Client
+    now = time.monotonic()
+    closing = []
+    with _clients_lock:
+        for key, (client, used) in list(_clients.items()):
+            if now - used > CLIENT_IDLE_TIMEOUT:
+                closing.append(_clients.pop(key)[0])
+        client = _clients.pop(url, (None, None))[0]
+        if client is None:
+            client = Client(url, history_size=0)
+            client.session.cookies.set_policy(
+                DefaultCookiePolicy(allowed_domains=[])
+            )
+        _clients[url] = (client, now)
+        while len(_clients) > CLIENT_CACHE_SIZE:
+            closing.append(_clients.popitem(last=False)[1][0])
+    for old in closing: old.close()
+    return client
+
+
+def close_clients():
+    """Closes all the clients kept by :py:func:`.execute`, along with their
+    connections."""
+
+    with _clients_lock:
+        clients = [client for client, _ in _clients.values()]
+        _clients.clear()
+    for client in clients: client.close()
+
+
+def get_operation_type(message):
+    """Works out whether a query is a query, a mutation or a subscription. This
+    errs on the side of caution - if there is any mutation or subscription in
+    the document, that is what it will be taken for.
+
+    :param str message: The query to inspect.
+    :returns: The operation type, or ``None`` if the query can't be parsed."""
+
+    try:
+        return parse(message).operation_type
+    except GraphQLSyntaxError:
+        return None
+
+
+def get_operation_name(message):
+    """Gets the name of the operation in a query, or ``None`` if it is
+    anonymous (or can't be parsed).
+
+    :param str message: The query to inspect.
+    :rtype: ``str``"""
+
+    try:
+        return parse(message).operation_name
+    except GraphQLSyntaxError:
+        return None
+
+
+@lru_cache(maxsize=1024)
+def get_query_hash(message):
+    """Gets the SHA-256 hash of a query, as used by Automatic Persisted
+    Queries. Hashes of recent queries are remembered.
+
+    :param str message: The query to hash.
+    :rtype: ``str``"""
+
+    return hashlib.sha256(message.encode()).hexdigest()
+
+
+def is_persisted_query_error(result):
+    """Checks whether a GraphQL response is the server saying that it doesn't
+    have a persisted query, or doesn't support persisted queries at all.
+
+    :param dict result: The server's response.
+    :rtype: ``bool``"""
+
+    return get_persisted_query_error(result) is not None
+
+
+def get_persisted_query_error(result):
+    """Works out which persisted query error, if any, a GraphQL response is
+    the server reporting.
+
+    :param dict result: The server's response.
+    :returns: ``"PERSISTED_QUERY_NOT_FOUND"``,\
+    ``"PERSISTED_QUERY_NOT_SUPPORTED"`` or ``None``."""
+
+    if not isinstance(result, dict): return None
+    for error in result.get("errors") or []:
+        if not isinstance(error, dict): continue
+        code = (error.get("extensions") or {}).get("code")
+        if code in ("PERSISTED_QUERY_NOT_FOUND", "PERSISTED_QUERY_NOT_SUPPORTED"):
+            return code
+        message = error.get("message")
+        if message == "PersistedQueryNotFound":
+            return "PERSISTED_QUERY_NOT_FOUND"
+        if message == "PersistedQueryNotSupported":
+            return "PERSISTED_QUERY_NOT_SUPPORTED"
+    return None
+
+
+def is_file(value):
+    """Checks whether a variable is something to be uploaded as a file - a
+    file object, or a bytes-like object such as ``bytes``, a ``memoryview`` or
+    an ``mmap``.
+
+    :param value: The variable to check.
+    :rtype: ``bool``"""
+
+    return isinstance(value, FILE_TYPES)
 
 
 def get_files_from_variables(variables):
-    """Takes a variables objects and looks to see if any of the values are file
-    objects which need to be sent separately.
+    """Takes a variables objects and looks for file objects which need to be
+    sent separately, anywhere inside it - including in lists and input
+    objects.
+
+    The files are replaced with ``None``, and are returned by their path
+    within the variables, such as ``"input.images.0"``. Only the dicts and
+    lists on the way to a file are copied - everything else is shared with
+    the original variables, which are left as they are.
 
     :param dict variables: the variables to inspect, or ``None``.
     :returns: ``(variables, files)``"""
 
     if not variables: return variables, None
-    files, new_variables = {}, {}
-    for k, v in variables.items():
-        if isinstance(v, io.IOBase):
-            files[k] = v
-            new_variables[k] = None
-        elif isinstance(v, list) and len(v) and isinstance(v[0], io.IOBase):
-            files[k] = v
-            new_variables[k] = [None] * len(v)
-        else:
-            new_variables[k] = v
-    return new_variables, files
+    files = {}
+    return extract_files(variables, None, files), files
+
+
+def extract_files(value, path, files):
+    """Finds the files in a value, adding them to a files dict by their path,
+    and returns the value with them replaced by ``None``. If there are no
+    files in the value, the value itself is returned.
+
+    :param value: The value to search.
+    :param str path: The path of the value within the variables.
+    :param dict files: The files found so far.
+    :returns: The value with the files removed."""
+
+    if is_file(value):
+        files[path] = value
+        return None
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, (list, tuple)):
+        items = enumerate(value)
+    else:
+        return value
+    new_value = None
+    for k, v in items:
+        extracted = extract_files(v, k if path is None else f"{path}.{k}", files)
+        if extracted is not v:
+            if new_value is None:
+                new_value = dict(value) if isinstance(value, dict) else list(value)
+            new_value[k] = extracted
+    return value if new_value is None else new_value
+
+
+def has_files(variables):
+    """Checks whether there are any files which need to be sent separately
+    anywhere in a query's variables, without copying the variables.
+
+    :param dict variables: the variables to inspect, or ``None``.
+    :rtype: ``bool``"""
+
+    if is_file(variables): return True
+    if isinstance(variables, dict):
+        variables = variables.values()
+    elif not isinstance(variables, (list, tuple)):
+        return False
+    return any(has_files(v) for v in variables)
 
 
 def files_to_map(files):
     """Takes a files dict and creates the map dict needed by the GraphQL file
     upload spec.
     
-    :param dict files: the files dict.
+    :param dict files: the files dict, keyed by path.
     :rtype: ``dict``"""
 
-    map = {}
-    for k, v in files.items():
-        is_list = isinstance(v, list)
-        l = v if is_list else [v]
-        for i in range(len(l)):
-            map[str(len(map))] = [f"variables.{k}.{i}" if is_list else f"variables.{k}"]
-    return map
+    return {str(i): [f"variables.{path}"] for i, path in enumerate(files)}
 
 
-def pack_files(files):
+def pack_files(files, stream=False):
     """Takes a files dict and packs them into a HTTP sendable form.
+
+    Bytes-like files are packed as they are, or as a ``memoryview`` of them,
+    so that packing them doesn't copy their contents (sending them through a
+    :py:class:`.MultipartEncoder` doesn't either). Files without a name of
+    their own, such as these, are named after the path of their variable.
     
-    :param dict files: the files dict.
+    :param dict files: the files dict, keyed by path.
+    :param bool stream: if ``True``, the file objects themselves are packed\
+    rather than their contents, so that they can be read as they are sent.
     :rtype: ``dict``"""
 
     packed_files = {}
-    for file in files.values():
-        l = file if isinstance(file, list) else [file]
-        for f in l:
-            packed_files[str(len(packed_files))] = (
-                f.name, f.read(), mimetypes.MimeTypes().guess_type(f.name)[0]
-            )
+    for path, f in files.items():
+        if isinstance(f, BUFFER_TYPES):
+            filename, content = str(path), get_buffer(f)
+        else:
+            filename = getattr(f, "name", None)
+            if not isinstance(filename, str): filename = str(path)
+            content = f if stream else f.read()
+        packed_files[str(len(packed_files))] = (
+            filename, content, get_content_type(filename)
+        )
     return packed_files
 
 
-def create_response_error_message(response):
+def get_buffer(value):
+    """Gets the contents of a bytes-like object without copying them. Objects
+    other than ``bytes`` and ``bytearray`` are turned into a flat
+    ``memoryview`` of single bytes.
+
+    :param value: The bytes-like object.
+    :rtype: ``bytes``, ``bytearray`` or ``memoryview``"""
+
+    if isinstance(value, (bytes, bytearray)): return value
+    return memoryview(value).cast("B")
+
+
+@lru_cache(maxsize=1024)
+def get_content_type(filename):
+    """Guesses the MIME type of a file from its name. Recent answers are
+    remembered, so that uploading lots of files with similar names doesn't
+    mean looking them all up.
+
+    :param str filename: The name of the file.
+    :rtype: ``str``"""
+
+    if not isinstance(filename, str): return None
+    return mimetypes.guess_type(filename)[0]
+
+
+def create_response_error_message(response, content=None):
     """Works out what to say about a response that isn't JSON.
 
     :param response: The HTTP response object.
+    :param bytes content: The response body, if it isn't available as\
+    ``response.content``.
     :rtype: ``str``"""
 
     content_type = response.headers["Content-type"]
     try:
-        content = response.content.decode()
+        content = (response.content if content is None else content).decode()
     except: content = None
     message = f"Server did not return JSON, it returned {content_type}"
     if content and len(content) < 256:
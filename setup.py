@@ -19,8 +19,6 @@ setup(
     "License :: OSI Approved :: MIT License",
     "Topic :: Internet",
     "Programming Language :: Python :: 3",
-    "Programming Language :: Python :: 3.6",
-    "Programming Language :: Python :: 3.7",
     "Programming Language :: Python :: 3.8",
     "Programming Language :: Python :: 3.9",
     "Programming Language :: Python :: 3.10",
@@ -28,5 +26,10 @@ setup(
  ],
  keywords="GraphQL",
  packages=["kirjava"],
- install_requires=["requests"]
+ python_requires=">=3.8",
+ install_requires=["requests"],
+ extras_require={
+  "async": ["aiohttp"], "fast": ["orjson"], "otel": ["opentelemetry-api"],
+  "compression": ["brotli", "zstandard"], "http2": ["httpx[http2]"]
+ }
 )
@@ -0,0 +1,451 @@
+"""Measures how quickly kirjava can make requests to the integration test
+server, and how much memory it uses doing so.
+
+Each scenario is run in its own process, so that its peak memory use isn't
+affected by the others. Results can be saved as a baseline, and later results
+compared against it - the comparison fails if anything has got worse by more
+than the threshold::
+
+    $ python -m tests.benchmarks.run --save baseline.json
+    $ python -m tests.benchmarks.run --compare baseline.json
+
+The Django test server is started in another process unless ``--url`` is
+given."""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import kirjava
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))
+
+SMALL_QUERY = "{ name }"
+
+LIST_QUERY = "{ items(count: 5000) { id name value } }"
+
+UPLOAD_MUTATION = """mutation uploadImage($image: Upload!) {
+    uploadImage(image: $image) { information }
+}"""
+
+MULTI_UPLOAD_MUTATION = """mutation uploadImages($images: [Upload]!) {
+    uploadImages(images: $images) { information }
+}"""
+
+class Scenario:
+    """A kind of request to measure. Subclasses make one request in ``run``,
+    and can set up anything they need beforehand in ``setup``.
+
+    :param str url: The URL of the test server."""
+
+    iterations = 500
+    concurrency = 1
+    options = {}
+
+    def __init__(self, url):
+        self.url = url
+        self.client = None
+
+
+    def setup(self):
+        """Creates the client the requests will be made with."""
+
+        self.client = kirjava.Client(self.url, history_size=0, **self.options)
+
+
+    def teardown(self):
+        """Closes the client, and cleans up anything else set up."""
+
+        self.client.close()
+
+
+    def run(self):
+        """Makes one request."""
+
+        raise NotImplementedError
+
+
+    def measure(self, iterations):
+        """Makes a number of requests, timing each one. If the scenario has a
+        concurrency above 1, requests are made from that many threads.
+
+        :param int iterations: The number of requests to make.
+        :returns: The latency of each request, and the total time taken."""
+
+        def timed(_):
+            started = time.perf_counter()
+            self.run()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        if self.concurrency == 1:
+            latencies = [timed(n) for n in range(iterations)]
+        else:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                latencies = list(executor.map(timed, range(iterations)))
+        return latencies, time.perf_counter() - started
+
+
+
+class SmallQuery(Scenario):
+    """A tiny query, which mostly measures kirjava's overhead."""
+
+    def run(self):
+        self.client.execute(SMALL_QUERY)
+
+
+
+class LargeList(Scenario):
+    """A query returning a list of 5000 objects, which mostly measures
+    response decoding."""
+
+    iterations = 50
+
+    def run(self):
+        self.client.execute(LIST_QUERY)
+
+
+
+class Uploads(Scenario):
+    """Uploads files through ``pack_files``, read from disk each time.
+
+    :param str url: The URL of the test server."""
+
+    iterations = 100
+    sizes = [1024 * 1024]
+
+    def setup(self):
+        super().setup()
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for index, size in enumerate(self.sizes):
+            path = os.path.join(self.directory.name, f"file{index}.bin")
+            with open(path, "wb") as f: f.write(os.urandom(size))
+            self.paths.append(path)
+
+
+    def teardown(self):
+        super().teardown()
+        self.directory.cleanup()
+
+
+    def run(self):
+        files = [open(path, "rb") for path in self.paths]
+        try:
+            if len(files) == 1:
+                self.client.execute(UPLOAD_MUTATION, variables={"image": files[0]})
+            else:
+                self.client.execute(
+                    MULTI_UPLOAD_MUTATION, variables={"images": files}
+                )
+        finally:
+            for f in files: f.close()
+
+
+
+class MultiUploads(Uploads):
+    """Uploads five files in one request."""
+
+    sizes = [256 * 1024] * 5
+
+
+
+class ManyUploads(Uploads):
+    """Uploads a hundred small files in one request."""
+
+    iterations = 20
+    sizes = [16 * 1024] * 100
+
+
+
+class ParallelUploads(ManyUploads):
+    """Uploads a hundred small files in one streamed request, reading the next
+    ones ahead from eight threads as it is sent."""
+
+    options = {"upload_workers": 8}
+
+
+
+class Retries(Scenario):
+    """Queries a server which fails every other request with a 503, so that
+    each query is retried once (without any backoff)."""
+
+    iterations = 250
+
+    def setup(self):
+        self.client = kirjava.Client(
+            self.url + "flaky/", history_size=0,
+            retry_policy=kirjava.RetryPolicy(retries=3, statuses=[503], backoff=0)
+        )
+
+
+    def run(self):
+        self.client.execute(SMALL_QUERY)
+
+
+
+class Concurrent(Scenario):
+    """Makes small queries from 16 threads sharing one client."""
+
+    iterations = 2000
+    concurrency = 16
+
+    def setup(self):
+        self.client = kirjava.Client(
+            self.url, history_size=0, pool_maxsize=self.concurrency
+        )
+
+
+    def run(self):
+        self.client.execute(SMALL_QUERY)
+
+
+
+class AsyncConcurrent(Scenario):
+    """Makes small queries from 16 coroutines sharing one async client."""
+
+    iterations = 2000
+    concurrency = 16
+
+    def setup(self):
+        """The client has to be created inside the event loop, so this just
+        checks that one can be created at all."""
+
+        kirjava.AsyncClient(self.url)
+
+
+    def teardown(self):
+        pass
+
+
+    def measure(self, iterations):
+        return asyncio.run(self.measure_async(iterations))
+
+
+    async def measure_async(self, iterations):
+        """Makes a number of requests, at most ``concurrency`` at a time,
+        timing each one.
+
+        :param int iterations: The number of requests to make.
+        :returns: The latency of each request, and the total time taken."""
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with kirjava.AsyncClient(self.url, history_size=0) as client:
+            async def timed():
+                async with semaphore:
+                    started = time.perf_counter()
+                    await client.execute(SMALL_QUERY)
+                    return time.perf_counter() - started
+
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(
+                timed() for _ in range(iterations)
+            ))
+            return latencies, time.perf_counter() - started
+
+
+
+SCENARIOS = {
+    "small_query": SmallQuery, "large_list": LargeList,
+    "single_upload": Uploads, "multi_upload": MultiUploads,
+    "many_uploads": ManyUploads, "parallel_uploads": ParallelUploads,
+    "retries": Retries, "concurrent": Concurrent,
+    "async_concurrent": AsyncConcurrent
+}
+
+METRICS = {
+    "rps": ("req/s", True), "p50_ms": ("p50 ms", False),
+    "p99_ms": ("p99 ms", False), "rss_mib": ("RSS MiB", False),
+    "alloc_kib": ("alloc KiB", False)
+}
+
+def run_scenario(name, url, scale, queue):
+    """Runs one scenario and puts its results on a queue. This is run in its
+    own process.
+
+    The requests are first timed without any tracing, and then a smaller
+    number are made again with ``tracemalloc`` on, to see the most memory
+    Python allocated at once.
+
+    :param str name: The name of the scenario.
+    :param str url: The URL of the test server.
+    :param float scale: The multiplier for the scenario's iterations.
+    :param multiprocessing.Queue queue: The queue to put the results on."""
+
+    scenario = SCENARIOS[name](url)
+    try:
+        scenario.setup()
+    except ImportError as e:
+        return queue.put({"skipped": str(e)})
+    try:
+        iterations = max(int(scenario.iterations * scale), scenario.concurrency)
+        scenario.measure(max(iterations // 10, 1))
+        latencies, seconds = scenario.measure(iterations)
+        tracemalloc.start()
+        scenario.measure(max(iterations // 10, scenario.concurrency))
+        alloc = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        scenario.teardown()
+    queue.put(summarise(latencies, seconds, alloc))
+
+
+def summarise(latencies, seconds, alloc):
+    """Works out the headline figures for a scenario.
+
+    :param list latencies: The seconds taken by each request.
+    :param float seconds: The seconds taken by all the requests.
+    :param int alloc: The most bytes Python had allocated at once.
+    :rtype: ``dict``"""
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies), "rps": len(latencies) / seconds,
+        "p50_ms": percentiles[49] * 1000, "p99_ms": percentiles[98] * 1000,
+        "rss_mib": get_peak_rss(), "alloc_kib": alloc / 1024
+    }
+
+
+def get_peak_rss():
+    """Gets the most memory the current process has used at once, in MiB, if
+    the platform can say.
+
+    :rtype: ``float``"""
+
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def start_server():
+    """Starts the test server in another process.
+
+    :returns: The server process, and its URL."""
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "tests.benchmarks.server"],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True
+    )
+    url = process.stdout.readline().strip()
+    if not url:
+        process.wait()
+        raise RuntimeError("The benchmark server could not be started")
+    return process, url
+
+
+def compare(results, baseline, threshold):
+    """Compares results with a baseline. Throughput getting lower, or latency
+    or memory getting higher, by more than the threshold is a regression.
+
+    :param dict results: The new results, by scenario.
+    :param dict baseline: The baseline results, by scenario.
+    :param float threshold: The fraction things can get worse by.
+    :returns: The change in each metric, by scenario, and a list of\
+    regressions."""
+
+    changes, regressions = {}, []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or "skipped" in result or "skipped" in old: continue
+        changes[name] = {}
+        for metric, (label, higher_is_better) in METRICS.items():
+            if not old.get(metric) or result.get(metric) is None: continue
+            change = result[metric] / old[metric] - 1
+            changes[name][metric] = change
+            worse = -change if higher_is_better else change
+            if worse > threshold: regressions.append(f"{name} {label}")
+    return changes, regressions
+
+
+def print_results(results, changes=None):
+    """Prints results as a table, with the change from the baseline after
+    each figure if there is one.
+
+    :param dict results: The results, by scenario.
+    :param dict changes: The changes from the baseline, by scenario."""
+
+    width = 20 if changes else 11
+    print(f"{'scenario':<18}" + "".join(
+        f"{label:>{width}}" for label, _ in METRICS.values()
+    ))
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<18}  skipped ({result['skipped']})")
+            continue
+        cells = []
+        for metric in METRICS:
+            value = result[metric]
+            cell = "-" if value is None else f"{value:.1f}"
+            change = (changes or {}).get(name, {}).get(metric)
+            if change is not None: cell += f" ({change:+.1%})"
+            cells.append(f"{cell:>{width}}")
+        print(f"{name:<18}" + "".join(cells))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run kirjava's benchmarks.")
+    parser.add_argument(
+        "scenarios", nargs="*", help="The scenarios to run (all by default)."
+    )
+    parser.add_argument("--url", help="An already running test server.")
+    parser.add_argument(
+        "--scale", type=float, default=1,
+        help="A multiplier for the number of requests made."
+    )
+    parser.add_argument("--save", help="Save the results to this file.")
+    parser.add_argument("--compare", help="Compare with a saved baseline.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="How much worse a figure can get before it is a regression."
+    )
+    args = parser.parse_args(args)
+    for name in args.scenarios:
+        if name not in SCENARIOS: parser.error(f"Unknown scenario: {name}")
+
+    process, url = (None, args.url) if args.url else start_server()
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    try:
+        for name in args.scenarios or SCENARIOS:
+            queue = context.Queue()
+            child = context.Process(
+                target=run_scenario, args=(name, url, args.scale, queue)
+            )
+            child.start()
+            child.join()
+            if child.exitcode:
+                raise RuntimeError(f"The {name} benchmark failed")
+            results[name] = queue.get()
+    finally:
+        if process: process.terminate()
+
+    changes, regressions = None, []
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        changes, regressions = compare(results, baseline, args.threshold)
+    print_results(results, changes)
+    if args.save:
+        with open(args.save, "w") as f: json.dump(results, f, indent=4)
+    if regressions:
+        print("\nRegressions: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
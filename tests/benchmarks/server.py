@@ -0,0 +1,36 @@
+"""Runs the integration test server on a free local port, for the benchmarks
+to make requests to. It prints its URL when it is ready, and runs until it is
+killed."""
+
+import os
+import sys
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE", "tests.integration.testserver.settings"
+)
+import django; django.setup()
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """A request handler which doesn't log every request."""
+
+    def log_message(self, *args):
+        pass
+
+
+
+def serve(host="localhost", port=0):
+    """Serves the test server's schema until the process is killed.
+
+    :param str host: The host to listen on.
+    :param int port: The port to listen on (any free port by default)."""
+
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler)
+    server.daemon_threads = True
+    server.set_app(get_wsgi_application())
+    print(f"http://{host}:{server.server_port}/", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else 0)
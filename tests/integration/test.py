@@ -74,6 +74,16 @@ class KirjavaTests(LiveServerTestCase):
             ),
             {"data": {"name": "The Republic of Heaven..."}}
         )
+
+
+
+    def test_large_list(self):
+        client = kirjava.Client(self.live_server_url)
+        result = client.execute("{ items(count: 5000) { id name value } }")
+        self.assertEqual(len(result["data"]["items"]), 5000)
+        self.assertEqual(
+            result["data"]["items"][7], {"id": 7, "name": "Item 7", "value": 1}
+        )
     
 
     def test_image_upload(self):
@@ -2,10 +2,19 @@ import json
 import graphene
 from graphene_file_upload.scalars import Upload
 
+class Item(graphene.ObjectType):
+
+    id = graphene.Int()
+    name = graphene.String()
+    value = graphene.Float()
+
+
+
 class Query(graphene.ObjectType):
 
     name = graphene.String(suffix=graphene.String())
     headers = graphene.String()
+    items = graphene.List(Item, count=graphene.Int())
 
     def resolve_name(self, info, **kwargs):
         return "The Republic of Heaven" + kwargs.get("suffix", "")
@@ -17,6 +26,12 @@ class Query(graphene.ObjectType):
         ])
 
 
+    def resolve_items(self, info, count=1000):
+        return [
+            Item(id=n, name=f"Item {n}", value=n / 7) for n in range(count)
+        ]
+
+
 class UploadImageMutation(graphene.Mutation):
 
     class Arguments:
@@ -2,6 +2,8 @@ import os
 
 SECRET_KEY = "12345"
 
+ALLOWED_HOSTS = ["localhost", "127.0.0.1"]
+
 DATABASES = {"default": {
  "ENGINE": "django.db.backends.sqlite3",
  "NAME": "tests/integration/testserver/db.sqlite3"
@@ -1,8 +1,23 @@
+import itertools
 from graphene_django.views import GraphQLView
 from graphene_file_upload.django import FileUploadGraphQLView
+from django.http import HttpResponse
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 
+class FlakyGraphQLView(FileUploadGraphQLView):
+    """Fails every other request with a 503, so that retries can be
+    measured."""
+
+    counter = itertools.count()
+
+    def dispatch(self, request, *args, **kwargs):
+        if next(self.counter) % 2 == 0: return HttpResponse(status=503)
+        return super().dispatch(request, *args, **kwargs)
+
+
+
 urlpatterns = [
     path("", FileUploadGraphQLView.as_view()),
+    path("flaky/", FlakyGraphQLView.as_view()),
 ]
@@ -0,0 +1,210 @@
+import asyncio
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import Mock
+from kirjava.batching import Batch, AsyncBatch
+
+class BatchCreationTests(TestCase):
+
+    def test_can_create_batch(self):
+        client = Mock()
+        batch = Batch(client, max_size=10, window=0.5, retries=2)
+        self.assertIs(batch._client, client)
+        self.assertEqual(batch._max_size, 10)
+        self.assertEqual(batch._window, 0.5)
+        self.assertEqual(batch._kwargs, {"retries": 2})
+        self.assertEqual(batch._queue, [])
+        self.assertIsNone(batch._timer)
+    
+
+    def test_batch_repr(self):
+        batch = Batch(Mock())
+        batch._queue = [1, 2]
+        self.assertEqual(repr(batch), "<Batch (2 queued)>")
+        self.assertEqual(len(batch), 2)
+
+
+
+class BatchExecutionTests(TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.execute_batch.side_effect = lambda ops, **kwargs: [
+            {"data": message} for message, variables in ops
+        ]
+
+
+    def test_queries_are_queued_until_flush(self):
+        batch = Batch(self.client, retries=3)
+        f1 = batch.execute("M1")
+        f2 = batch.execute("M2", variables={"a": 1})
+        self.assertFalse(f1.done())
+        self.assertFalse(self.client.execute_batch.called)
+        batch.flush()
+        self.client.execute_batch.assert_called_once_with(
+            [("M1", None), ("M2", {"a": 1})], retries=3
+        )
+        self.assertEqual(f1.result(), {"data": "M1"})
+        self.assertEqual(f2.result(), {"data": "M2"})
+        self.assertEqual(len(batch), 0)
+    
+
+    def test_empty_flush_sends_nothing(self):
+        Batch(self.client).flush()
+        self.assertFalse(self.client.execute_batch.called)
+    
+
+    def test_context_manager_flushes(self):
+        with Batch(self.client) as batch:
+            future = batch.execute("M1")
+        self.assertEqual(future.result(), {"data": "M1"})
+    
+
+    def test_batch_sends_at_max_size(self):
+        batch = Batch(self.client, max_size=2)
+        f1 = batch.execute("M1")
+        self.assertFalse(f1.done())
+        f2 = batch.execute("M2")
+        self.assertEqual(f1.result(), {"data": "M1"})
+        self.assertEqual(f2.result(), {"data": "M2"})
+        f3 = batch.execute("M3")
+        self.assertFalse(f3.done())
+        self.assertEqual(self.client.execute_batch.call_count, 1)
+    
+
+    def test_batch_sends_after_window(self):
+        batch = Batch(self.client, window=0.01)
+        f1 = batch.execute("M1")
+        f2 = batch.execute("M2")
+        self.assertEqual(f1.result(timeout=1), {"data": "M1"})
+        self.assertEqual(f2.result(timeout=1), {"data": "M2"})
+        self.client.execute_batch.assert_called_once_with([("M1", None), ("M2", None)])
+        self.assertIsNone(batch._timer)
+    
+
+    def test_flush_cancels_window_timer(self):
+        batch = Batch(self.client, window=10)
+        batch.execute("M1")
+        timer = batch._timer
+        batch.flush()
+        self.assertIsNone(batch._timer)
+        self.assertTrue(timer.finished.is_set())
+    
+
+    def test_errors_go_to_every_future(self):
+        self.client.execute_batch.side_effect = ValueError("bad")
+        batch = Batch(self.client)
+        f1, f2 = batch.execute("M1"), batch.execute("M2")
+        batch.flush()
+        with self.assertRaises(ValueError):
+            f1.result()
+        with self.assertRaises(ValueError):
+            f2.result()
+
+
+
+class AsyncBatchTests(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.calls = []
+        async def execute_batch(ops, **kwargs):
+            self.calls.append((ops, kwargs))
+            await asyncio.sleep(0)
+            return [{"data": message} for message, variables in ops]
+        self.client.execute_batch = execute_batch
+
+
+    def test_can_create_async_batch(self):
+        batch = AsyncBatch(self.client, max_size=10, window=0.5, retries=2)
+        self.assertIs(batch._client, self.client)
+        self.assertEqual(batch._max_size, 10)
+        self.assertEqual(batch._window, 0.5)
+        self.assertEqual(batch._kwargs, {"retries": 2})
+        self.assertEqual(repr(batch), "<AsyncBatch (0 queued)>")
+        self.assertEqual(len(batch), 0)
+
+
+    async def test_queries_are_queued_until_flush(self):
+        batch = AsyncBatch(self.client, retries=3)
+        f1 = batch.execute("M1")
+        f2 = batch.execute("M2", variables={"a": 1})
+        self.assertIsInstance(f1, asyncio.Future)
+        await asyncio.sleep(0)
+        self.assertFalse(f1.done())
+        self.assertEqual(self.calls, [])
+        await batch.flush()
+        self.assertEqual(self.calls, [([("M1", None), ("M2", {"a": 1})], {"retries": 3})])
+        self.assertEqual(await f1, {"data": "M1"})
+        self.assertEqual(await f2, {"data": "M2"})
+        self.assertEqual(len(batch), 0)
+
+
+    async def test_empty_flush_sends_nothing(self):
+        await AsyncBatch(self.client).flush()
+        self.assertEqual(self.calls, [])
+
+
+    async def test_context_manager_flushes(self):
+        async with AsyncBatch(self.client) as batch:
+            future = batch.execute("M1")
+        self.assertEqual(future.result(), {"data": "M1"})
+
+
+    async def test_batch_sends_at_max_size(self):
+        async with AsyncBatch(self.client, max_size=2) as batch:
+            f1 = batch.execute("M1")
+            f2 = batch.execute("M2")
+            f3 = batch.execute("M3")
+            self.assertEqual(await f1, {"data": "M1"})
+            self.assertEqual(await f2, {"data": "M2"})
+            self.assertFalse(f3.done())
+            self.assertEqual(len(self.calls), 1)
+        self.assertEqual(f3.result(), {"data": "M3"})
+
+
+    async def test_context_manager_waits_for_full_batches(self):
+        async with AsyncBatch(self.client, max_size=1) as batch:
+            future = batch.execute("M1")
+            self.assertFalse(future.done())
+        self.assertEqual(future.result(), {"data": "M1"})
+        self.assertEqual(batch._tasks, set())
+
+
+    async def test_batch_sends_after_window(self):
+        batch = AsyncBatch(self.client, window=0.01)
+        f1 = batch.execute("M1")
+        f2 = batch.execute("M2")
+        results = await asyncio.wait_for(asyncio.gather(f1, f2), 1)
+        self.assertEqual(results, [{"data": "M1"}, {"data": "M2"}])
+        self.assertEqual(self.calls, [([("M1", None), ("M2", None)], {})])
+        self.assertIsNone(batch._timer)
+
+
+    async def test_flush_cancels_window_timer(self):
+        batch = AsyncBatch(self.client, window=10)
+        batch.execute("M1")
+        timer = batch._timer
+        await batch.flush()
+        self.assertIsNone(batch._timer)
+        self.assertTrue(timer.cancelled())
+
+
+    async def test_errors_go_to_every_future(self):
+        async def execute_batch(ops, **kwargs):
+            raise ValueError("bad")
+        self.client.execute_batch = execute_batch
+        batch = AsyncBatch(self.client)
+        f1, f2 = batch.execute("M1"), batch.execute("M2")
+        await batch.flush()
+        with self.assertRaises(ValueError):
+            await f1
+        with self.assertRaises(ValueError):
+            await f2
+
+
+    async def test_cancelled_futures_are_skipped(self):
+        batch = AsyncBatch(self.client)
+        f1, f2 = batch.execute("M1"), batch.execute("M2")
+        f1.cancel()
+        await batch.flush()
+        self.assertEqual(await f2, {"data": "M2"})
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from kirjava.cache import *
+
+class CacheTests:
+
+    def make_cache(self, **kwargs):
+        raise NotImplementedError
+
+
+    def test_can_create_cache(self):
+        cache = self.make_cache(ttl=10, max_entries=5, max_bytes=100)
+        self.assertEqual(cache._ttl, 10)
+        self.assertEqual(cache._max_entries, 5)
+        self.assertEqual(cache._max_bytes, 100)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(repr(cache), f"<{cache.__class__.__name__} (0 entries)>")
+    
+
+    def test_can_store_and_get_results(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", b"123")
+        cache.set("b", b"45")
+        self.assertEqual(cache.get("a"), b"123")
+        self.assertEqual(cache.get("b"), b"45")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 5)
+        self.assertEqual(cache.stats, {
+            "hits": 2, "misses": 1, "evictions": 0, "entries": 2, "bytes": 5
+        })
+    
+
+    def test_can_overwrite_results(self):
+        cache = self.make_cache()
+        cache.set("a", b"123")
+        cache.set("a", b"4")
+        self.assertEqual(cache.get("a"), b"4")
+        self.assertEqual(cache.size, 1)
+    
+
+    @patch("time.time")
+    def test_results_expire(self, mock_time):
+        cache = self.make_cache(ttl=10)
+        mock_time.return_value = 100
+        cache.set("a", b"123")
+        mock_time.return_value = 109
+        self.assertEqual(cache.get("a"), b"123")
+        mock_time.return_value = 111
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+    
+
+    @patch("time.time")
+    def test_least_recently_used_evicted_by_count(self, mock_time):
+        cache = self.make_cache(max_entries=2)
+        mock_time.return_value = 1
+        cache.set("a", b"1")
+        mock_time.return_value = 2
+        cache.set("b", b"2")
+        mock_time.return_value = 3
+        cache.get("a")
+        mock_time.return_value = 4
+        cache.set("c", b"3")
+        self.assertEqual(cache.get("a"), b"1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"3")
+        self.assertEqual(cache.evictions, 1)
+    
+
+    @patch("time.time")
+    def test_least_recently_used_evicted_by_size(self, mock_time):
+        cache = self.make_cache(max_bytes=5)
+        for i, key in enumerate(["a", "b", "c"]):
+            mock_time.return_value = i
+            cache.set(key, b"12")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), b"12")
+        self.assertEqual(cache.size, 4)
+        mock_time.return_value = 10
+        cache.set("d", b"123456")
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.size, 4)
+    
+
+    def test_can_clear_cache(self):
+        cache = self.make_cache()
+        cache.set("a", b"1")
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 0)
+
+
+
+class CacheBaseTests(TestCase):
+
+    def test_base_cache_has_no_storage(self):
+        with self.assertRaises(NotImplementedError):
+            Cache().clear()
+
+
+
+class MemoryCacheTests(CacheTests, TestCase):
+
+    def make_cache(self, **kwargs):
+        return MemoryCache(**kwargs)
+
+
+
+class DiskCacheTests(CacheTests, TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.db")
+        self.caches = []
+    
+
+    def tearDown(self):
+        for cache in self.caches: cache.close()
+        self.directory.cleanup()
+
+
+    def make_cache(self, **kwargs):
+        cache = DiskCache(self.path, **kwargs)
+        self.caches.append(cache)
+        return cache
+    
+
+    def test_results_persist(self):
+        cache = self.make_cache()
+        cache.set("a", b"123")
+        cache.close()
+        self.assertEqual(self.make_cache().get("a"), b"123")
+
+
+    def test_totals_are_kept_as_results_change(self):
+        cache = self.make_cache()
+        cache.set("a", b"123")
+        cache.set("b", b"45")
+        cache.set("a", b"6789")
+        cache.get("b")
+        self.assertEqual((len(cache), cache.size), (2, 6))
+        cache.close()
+        cache = self.make_cache()
+        self.assertEqual((len(cache), cache.size), (2, 6))
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+    def test_totals_are_counted_for_existing_databases(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE entries (key TEXT PRIMARY KEY, value BLOB, "
+            "expires REAL, used REAL)"
+        )
+        db.execute("INSERT INTO entries VALUES ('a', x'010203', NULL, 0)")
+        db.commit()
+        db.close()
+        cache = self.make_cache()
+        self.assertEqual((len(cache), cache.size), (1, 3))
+        self.assertEqual(cache.get("a"), b"\x01\x02\x03")
+
+
+    def test_getting_results_does_not_write(self):
+        cache = self.make_cache()
+        cache.set("a", b"123")
+        changes = cache._db.total_changes
+        for _ in range(10): cache.get("a")
+        self.assertEqual(cache._db.total_changes, changes)
+
+
+    def test_when_results_were_used_is_written_on_close(self):
+        with patch("time.time", return_value=1):
+            cache = self.make_cache()
+            cache.set("a", b"123")
+        with patch("time.time", return_value=2):
+            cache.get("a")
+        cache.close()
+        db = sqlite3.connect(self.path)
+        try:
+            self.assertEqual(db.execute("SELECT used FROM entries").fetchall(), [(2,)])
+        finally:
+            db.close()
+
+
+    def test_entries_are_indexed_by_when_they_were_used(self):
+        cache = self.make_cache()
+        plan = cache._db.execute(
+            "EXPLAIN QUERY PLAN SELECT key FROM entries ORDER BY used LIMIT 1"
+        ).fetchall()
+        self.assertIn("entries_used", plan[0][-1])
@@ -1,8 +1,21 @@
 import json
 import io
-from unittest import TestCase
-from unittest.mock import Mock, patch, MagicMock, PropertyMock
-from kirjava import Client
+import gzip
+import time
+import asyncio
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from unittest import TestCase, IsolatedAsyncioTestCase, skipUnless
+from unittest.mock import Mock, patch, MagicMock, PropertyMock, AsyncMock
+from kirjava import Client, AsyncClient, MemoryCache, JsonCodec, OrjsonCodec, RetryPolicy, RetryBudget, RetryError, RateLimiter, ConcurrencyLimiter
+from kirjava.codec import orjson
+from kirjava.client import create_form_data, create_url_parameters, get_connection, get_next_cursor, step
+from kirjava.batching import AsyncBatch
+from kirjava.streaming import AsyncJsonStream
+from kirjava.multipart import MultipartEncoder
+from kirjava.transports import RequestsTransport
+from kirjava.prepared import PreparedOperation, AsyncPreparedOperation
+from kirjava.utilities import get_query_hash
 
 class ClientCreationTests(TestCase):
 
@@ -12,6 +25,161 @@ class ClientCreationTests(TestCase):
         self.assertEqual(client._headers, {
             "Accept": "application/json", "Content-Type": "application/json"
         })
+        self.assertEqual(list(client._history), [])
+        self.assertIsNone(client._history.maxlen)
+        self.assertTrue(client._history_results)
+        self.assertFalse(client._stream_uploads)
+        self.assertIsNone(client._cache)
+        self.assertFalse(client._persisted_queries)
+        self.assertEqual(client._persisted_hashes, set())
+        self.assertIsInstance(client._codec, JsonCodec)
+    
+
+    def test_can_create_client_with_history_options(self):
+        client = Client("http://url", history_size=10, history_results=False)
+        self.assertEqual(client._history.maxlen, 10)
+        self.assertFalse(client._history_results)
+
+
+
+    @patch("kirjava.client.get_default_codec")
+    def test_client_uses_default_codec(self, mock_codec):
+        client = Client("http://url")
+        self.assertIs(client._codec, mock_codec.return_value)
+    
+
+    def test_can_create_client_with_codec(self):
+        codec = JsonCodec()
+        client = Client("http://url", codec=codec)
+        self.assertIs(client._codec, codec)
+        self.assertIs(client.codec, codec)
+
+
+
+class ClientSessionTests(TestCase):
+
+    def test_session_pools_connections(self):
+        client = Client("http://url", pool_connections=3, pool_maxsize=50, pool_block=True)
+        adapter = client.session.get_adapter("https://url")
+        self.assertIs(adapter, client.session.get_adapter("http://url"))
+        self.assertEqual(adapter._pool_connections, 3)
+        self.assertEqual(adapter._pool_maxsize, 50)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(client.session.headers["Connection"], "keep-alive")
+    
+
+    def test_keep_alive_can_be_turned_off(self):
+        client = Client("http://url", keep_alive=False)
+        self.assertEqual(client.session.headers["Connection"], "close")
+    
+
+    @patch("kirjava.client.get_accept_encoding")
+    def test_session_accepts_compressed_responses(self, mock_get):
+        mock_get.return_value = "gzip, deflate, br"
+        client = Client("http://url")
+        mock_get.assert_called_with(True)
+        self.assertEqual(client.session.headers["Accept-Encoding"], "gzip, deflate, br")
+    
+
+    def test_response_compression_can_be_turned_off(self):
+        client = Client("http://url", compression=False)
+        self.assertEqual(client.session.headers["Accept-Encoding"], "identity")
+    
+
+    def test_custom_adapter(self):
+        adapter = Mock()
+        client = Client("http://url", adapter=adapter)
+        self.assertIs(client.session.get_adapter("https://url"), adapter)
+    
+
+    def test_session_can_be_shared(self):
+        client1 = Client("http://url1")
+        client2 = Client("http://url2", session=client1.session)
+        self.assertIs(client2.session, client1.session)
+        with patch.object(client1.session, "close") as mock_close:
+            client2.close()
+            self.assertFalse(mock_close.called)
+            with client1: pass
+            mock_close.assert_called_with()
+    
+
+    def test_requests_transport_by_default(self):
+        client = Client("http://url")
+        self.assertIsInstance(client.transport, RequestsTransport)
+        self.assertIs(client.session, client.transport.session)
+        session = Mock()
+        client.session = session
+        self.assertIs(client.transport.session, session)
+    
+
+    @patch("kirjava.client.HTTP2Transport")
+    def test_http2_transport(self, mock_transport):
+        client = Client("http://url", http2=True, pool_maxsize=5, keep_alive=False, compression=False)
+        mock_transport.assert_called_with(max_connections=5, keep_alive=False, compression=False)
+        self.assertIs(client.transport, mock_transport.return_value)
+        client.close()
+        mock_transport.return_value.close.assert_called_with()
+    
+
+    def test_http2_cannot_be_used_with_session(self):
+        with self.assertRaises(ValueError):
+            Client("http://url", http2=True, session=Mock())
+    
+
+    def test_transport_can_be_given(self):
+        transport = Mock()
+        transport.request.return_value = Mock(status_code=200, content=b'{"data": 1}')
+        with Client("http://url", transport=transport) as client:
+            self.assertIs(client.transport, transport)
+            self.assertEqual(client.execute("{ me }"), {"data": 1})
+        self.assertEqual(transport.request.call_args[0], ("POST", "http://url"))
+        self.assertFalse(transport.close.called)
+
+
+
+class ClientRequestCompressionTests(TestCase):
+
+    def test_no_compression_without_threshold(self):
+        client = Client("http://url")
+        body = "x" * 10000
+        self.assertEqual(client.compress_request(body, {"h": "v"}), (body, {"h": "v"}))
+    
+
+    def test_small_bodies_not_compressed(self):
+        client = Client("http://url", compression_threshold=100)
+        body = "x" * 99
+        self.assertEqual(client.compress_request(body, {"h": "v"}), (body, {"h": "v"}))
+    
+
+    def test_large_bodies_compressed(self):
+        client = Client("http://url", compression_threshold=100)
+        headers = {"h": "v"}
+        body, new_headers = client.compress_request("x" * 100, headers)
+        self.assertEqual(gzip.decompress(body), b"x" * 100)
+        self.assertEqual(new_headers, {"h": "v", "Content-Encoding": "gzip"})
+        self.assertEqual(headers, {"h": "v"})
+    
+
+    def test_uploads_not_compressed(self):
+        client = Client("http://url", compression_threshold=1)
+        operation = {"operations": "x" * 100}
+        self.assertEqual(
+            client.compress_request(operation, {}, {"0": ("f", b"", None)}),
+            (operation, {})
+        )
+        self.assertEqual(client.compress_request(operation, {}), (operation, {}))
+    
+
+    def test_compressed_body_sent(self):
+        client = Client("http://url", compression_threshold=10)
+        client.session = Mock()
+        client.session.request.return_value = Mock(status_code=200, content=b'{"data": 1}')
+        self.assertEqual(client.execute("{ me }", variables={"a": "b" * 100}), {"data": 1})
+        kwargs = client.session.request.call_args[1]
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(kwargs["data"])), {
+            "variables": {"a": "b" * 100}, "query": "{ me }"
+        })
 
 
 
@@ -48,6 +216,326 @@ class ClientHistoryTests(TestCase):
 
 
 
+class ClientCacheTests(TestCase):
+
+    def test_can_get_client_cache(self):
+        client = Client("http://url", cache=MemoryCache())
+        self.assertIs(client._cache, client.cache)
+    
+
+    def test_no_cache_key_without_cache(self):
+        client = Client("http://url")
+        self.assertIsNone(client.get_cache_key("{ me }"))
+    
+
+    def test_can_get_cache_key(self):
+        client = Client("http://url", cache=MemoryCache())
+        key = client.get_cache_key("{ me }", {"a": 1, "b": 2})
+        self.assertEqual(len(key), 64)
+        self.assertEqual(key, client.get_cache_key(" { me }\n", {"b": 2, "a": 1}))
+        self.assertEqual(key, client.get_cache_key("# Me\n{\n  me,\n}", {"a": 1, "b": 2}))
+        self.assertNotEqual(key, client.get_cache_key("{ me }", {"a": 2, "b": 2}))
+        self.assertNotEqual(key, client.get_cache_key("{ you }", {"a": 1, "b": 2}))
+        client.headers["Authorization"] = "123"
+        self.assertNotEqual(key, client.get_cache_key("{ me }", {"a": 1, "b": 2}))
+    
+
+    def test_mutations_and_uploads_are_not_cached(self):
+        client = Client("http://url", cache=MemoryCache())
+        self.assertIsNone(client.get_cache_key("mutation { go }"))
+        self.assertIsNone(client.get_cache_key("subscription { go }"))
+        self.assertIsNone(client.get_cache_key("{ me }", {"a": io.BytesIO()}))
+    
+
+    def test_invalid_queries_are_not_cached(self):
+        client = Client("http://url", cache=MemoryCache())
+        self.assertIsNone(client.get_cache_key("{ me"))
+    
+
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_results_are_cached(self, mock_request):
+        client = Client("http://url", cache=MemoryCache())
+        mock_request.return_value.content = b'{"data": 1}'
+        mock_request.return_value.content = b'{"data": 1}'
+        self.assertEqual(client.execute("{ me }", variables={"a": 1}), {"data": 1})
+        self.assertEqual(client.execute("{ me }", variables={"a": 1}), {"data": 1})
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual((client.cache.hits, client.cache.misses), (1, 1))
+        self.assertEqual(len(client.history), 2)
+        client.execute("{ me }", variables={"a": 2})
+        self.assertEqual(mock_request.call_count, 2)
+    
+
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_errors_are_not_cached(self, mock_request):
+        client = Client("http://url", cache=MemoryCache())
+        mock_request.return_value.content = b'{"errors": []}'
+        client.execute("{ me }")
+        client.execute("{ me }")
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(len(client.cache), 0)
+    
+
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_mutations_bypass_cache(self, mock_request):
+        client = Client("http://url", cache=MemoryCache())
+        mock_request.return_value.content = b'{"data": 1}'
+        client.execute("mutation { go }")
+        client.execute("mutation { go }")
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(client.cache.stats["misses"], 0)
+
+
+
+class ClientSingleFlightTests(TestCase):
+
+    def test_no_flight_key_by_default(self):
+        self.assertIsNone(Client("http://url").get_flight_key("{ me }"))
+    
+
+    def test_flight_keys(self):
+        client = Client("http://url", single_flight=True)
+        key = client.get_flight_key("{ me }", {"a": 1})
+        self.assertEqual(key, client.get_flight_key("{ me }", {"a": 1}))
+        self.assertNotEqual(key, client.get_flight_key("{ me }", {"a": 2}))
+        self.assertIsNone(client.get_flight_key("mutation { go }"))
+        self.assertIsNone(client.get_flight_key("{ me }", {"a": io.BytesIO()}))
+    
+
+    def test_identical_queries_share_request(self):
+        client = Client("http://url", codec=JsonCodec(), single_flight=True)
+        release = threading.Event()
+        def send(*args, **kwargs):
+            release.wait(5)
+            return None, Mock(content=b'{"data": {"a": [1]}}'), {"data": {"a": [1]}}
+        client.send = Mock(side_effect=send)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(client.execute, "{ a }") for _ in range(5)]
+            time.sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+        self.assertEqual(client.send.call_count, 1)
+        self.assertEqual(results, [{"data": {"a": [1]}}] * 5)
+        self.assertEqual(len({id(result) for result in results}), 5)
+        self.assertEqual(len(client.history), 5)
+        self.assertEqual(client._flights, {})
+    
+
+    def test_different_queries_do_not_share_request(self):
+        client = Client("http://url", codec=JsonCodec(), single_flight=True)
+        client.send = Mock(return_value=(None, Mock(content=b'{}'), {}))
+        client.execute("{ a }")
+        client.execute("{ a }")
+        client.execute("mutation { a }")
+        self.assertEqual(client.send.call_count, 3)
+    
+
+    def test_errors_are_shared(self):
+        client = Client("http://url", single_flight=True)
+        flight, leading = client.join_flight("KEY")
+        self.assertTrue(leading)
+        self.assertEqual(client.join_flight("KEY"), (flight, False))
+        client.land_flight("KEY", error=ValueError("X"))
+        with self.assertRaises(ValueError):
+            flight.result()
+        self.assertEqual(client._flights, {})
+    
+
+    def test_followers_stop_waiting_after_their_timeout(self):
+        client = Client("http://url", codec=JsonCodec(), single_flight=True)
+        release = threading.Event()
+        def send(*args, **kwargs):
+            release.wait(5)
+            return None, Mock(content=b'{"data": 1}'), {"data": 1}
+        client.send = Mock(side_effect=send)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(client.execute, "{ a }")
+            time.sleep(0.05)
+            with self.assertRaises(TimeoutError):
+                client.execute("{ a }", timeout=0.05)
+            release.set()
+            self.assertEqual(leader.result(), {"data": 1})
+        self.assertEqual(client.send.call_count, 1)
+        self.assertEqual(client._flights, {})
+    
+
+    def test_flight_timeout(self):
+        client = Client("http://url")
+        self.assertIsNone(client.get_flight_timeout(None))
+        self.assertEqual(client.get_flight_timeout(5), 5)
+        self.assertEqual(client.get_flight_timeout((1, 2)), 3)
+        self.assertIsNone(client.get_flight_timeout((1, None)))
+        client = Client("http://url", timeout=4)
+        self.assertEqual(client.get_flight_timeout(None), 4)
+        self.assertEqual(client.get_flight_timeout(2), 2)
+        client = Client("http://url", retry_policy=RetryPolicy(deadline=3))
+        self.assertAlmostEqual(client.get_flight_timeout(None), 3, places=2)
+        self.assertEqual(client.get_flight_timeout(1), 1)
+    
+
+    def test_failed_leader_lands_flight(self):
+        client = Client("http://url", single_flight=True)
+        client.send = Mock(side_effect=ConnectionError)
+        with self.assertRaises(ConnectionError):
+            client.execute("{ a }")
+        self.assertEqual(client._flights, {})
+
+
+
+class ClientInstrumentationTests(TestCase):
+
+    def setUp(self):
+        self.hook = Mock()
+        self.events = []
+        self.hook.after_response.side_effect = self.events.append
+        self.hook.on_error.side_effect = self.events.append
+
+
+    def make_client(self, **kwargs):
+        client = Client("http://url", codec=JsonCodec(), hooks=[self.hook], **kwargs)
+        client.session = Mock()
+        client.session.request.return_value = Mock(status_code=200, content=b'{"data": 1}')
+        return client
+
+
+    def test_no_hooks_by_default(self):
+        client = Client("http://url")
+        self.assertEqual(client.hooks, [])
+        self.assertIsNone(client.metrics)
+        self.assertIsNone(client.instrument("{ me }", "POST").__enter__())
+    
+
+    def test_hooks_get_request_details(self):
+        client = self.make_client()
+        client.execute("query GetUser { me }", variables={"a": 1})
+        event = self.events[0]
+        self.hook.before_request.assert_called_with(event)
+        self.assertEqual(event.operation_name, "GetUser")
+        self.assertEqual(event.operation_type, "query")
+        self.assertEqual(event.method, "POST")
+        self.assertEqual(event.status, 200)
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.request_bytes, len('{"variables": {"a": 1}, "query": "query GetUser { me }"}'))
+        self.assertEqual(event.response_bytes, 11)
+        self.assertEqual(set(event.timings), {"encode", "network", "decode"})
+        self.assertGreaterEqual(event.duration, sum(event.timings.values()))
+    
+
+    def test_compressed_sizes_recorded(self):
+        client = self.make_client(compression_threshold=10)
+        client.session.request.return_value = Mock(
+            status_code=200, content=b'{"data": 1}', headers={"Content-Length": "5"}
+        )
+        client.execute("{ me }", variables={"a": "b" * 100})
+        event = self.events[0]
+        self.assertEqual(event.request_bytes, 143)
+        self.assertLess(event.request_wire_bytes, 100)
+        self.assertEqual(event.response_bytes, 11)
+        self.assertEqual(event.response_wire_bytes, 5)
+    
+
+    def test_file_packing_is_timed(self):
+        client = self.make_client()
+        f = io.BytesIO(b"abc")
+        f.name = "f.txt"
+        client.execute("mutation { go }", variables={"f": f})
+        self.assertEqual(set(self.events[0].timings), {"encode", "pack", "network", "decode"})
+        self.assertEqual(self.events[0].operation_type, "mutation")
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_retries_are_reported(self, mock_wait):
+        client = self.make_client(retry_policy=RetryPolicy(retries=2, statuses=[503]))
+        retries = []
+        self.hook.on_retry.side_effect = lambda event: retries.append((event.attempts, event.status, event.error))
+        client.session.request.side_effect = [
+            ConnectionError(), Mock(status_code=503, headers={}, content=b""),
+            Mock(status_code=200, content=b'{"data": 1}')
+        ]
+        client.execute("{ me }")
+        self.assertEqual(retries[0][0:2], (1, None))
+        self.assertIsInstance(retries[0][2], ConnectionError)
+        self.assertEqual(retries[1], (2, 503, None))
+        self.assertEqual(self.events[0].retries, 2)
+        self.assertIsNone(self.events[0].error)
+        self.assertIn("wait", self.events[0].timings)
+    
+
+    def test_errors_are_reported(self):
+        client = self.make_client()
+        client.session.request.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            client.execute("{ me }")
+        self.hook.on_error.assert_called_with(self.events[0])
+        self.assertIsInstance(self.events[0].error, ValueError)
+        self.assertFalse(self.hook.after_response.called)
+    
+
+    def test_cache_hits_are_reported(self):
+        client = self.make_client(cache=MemoryCache())
+        client.execute("{ me }")
+        client.execute("{ me }")
+        self.assertFalse(self.events[0].cached)
+        self.assertTrue(self.events[1].cached)
+        self.assertEqual(client.session.request.call_count, 1)
+    
+
+    def test_batches_are_reported(self):
+        client = self.make_client()
+        client.session.request.return_value.content = b'[{"data": 1}]'
+        client.execute_batch([("{ me }", None)])
+        self.assertEqual(self.events[0].operation_name, "batch")
+        self.assertIsNone(self.events[0].operation_type)
+    
+
+    def test_client_can_keep_metrics(self):
+        client = self.make_client(metrics=True)
+        client.execute("query A { me }")
+        client.execute("query A { me }")
+        client.execute("query B { me }")
+        self.assertIn(client.metrics, client.hooks)
+        snapshot = client.metrics.snapshot()
+        self.assertEqual(snapshot["requests"], 3)
+        self.assertEqual(snapshot["operations"]["A"]["count"], 2)
+        self.assertEqual(snapshot["operations"]["B"]["count"], 1)
+
+
+
+class ClientRecordingTests(TestCase):
+
+    def test_can_record_query(self):
+        client = Client("http://url")
+        client.record("M1", {"a": 1}, {"data": 1})
+        client.record("M2", None, {"data": 2})
+        self.assertEqual(client.history, (
+            ({"query": "M2", "variables": {}}, {"data": 2}),
+            ({"query": "M1", "variables": {"a": 1}}, {"data": 1}),
+        ))
+    
+
+    def test_history_size_is_bounded(self):
+        client = Client("http://url", history_size=2)
+        for i in range(5):
+            client.record(f"M{i}", None, {"data": i})
+        self.assertEqual(client.history, (
+            ({"query": "M4", "variables": {}}, {"data": 4}),
+            ({"query": "M3", "variables": {}}, {"data": 3}),
+        ))
+    
+
+    def test_history_can_be_turned_off(self):
+        client = Client("http://url", history_size=0)
+        client.record("M1", {"a": 1}, {"data": 1})
+        self.assertEqual(client.history, ())
+    
+
+    def test_history_can_store_queries_only(self):
+        client = Client("http://url", history_results=False)
+        client.record("M1", {"a": 1}, {"data": 1})
+        self.assertEqual(client.history, (({"query": "M1"}, None),))
+
+
+
 class ClientExecutionTests(TestCase):
 
     def setUp(self):
@@ -64,6 +552,7 @@ class ClientExecutionTests(TestCase):
         self.mock_map.return_value = {"0": ["MAP"]}
         self.mock_pack.return_value = {"0": ["packed"]}
         self.mock_files.return_value = (None, None)
+        self.mock_request.return_value.content = b'{"data": "RESULT"}'
     
 
     def tearDown(self):
@@ -75,7 +564,7 @@ class ClientExecutionTests(TestCase):
 
 
     def test_can_send_query(self):
-        client = Client("http://url")
+        client = Client("http://url", codec=JsonCodec())
         client.session = Mock()
         result = client.execute("MESSAGE")
         self.mock_files.assert_called_with(None)
@@ -83,15 +572,33 @@ class ClientExecutionTests(TestCase):
             operation='{"variables": null, "query": "MESSAGE"}',
             headers=client._headers, method="POST", retries=0, retry_statuses=None
         )
-        self.assertEqual(result, self.mock_request.return_value.json.return_value)
-        self.assertEqual(client._history, [(
+        self.assertEqual(result, {"data": "RESULT"})
+        self.assertEqual(list(client._history), [(
             {"query": "MESSAGE", "variables": {}},
-            self.mock_request.return_value.json.return_value
+            {"data": "RESULT"}
         )])
     
 
+    @skipUnless(orjson, "orjson is not installed")
+    def test_can_send_integer_keys_with_orjson(self):
+        client = Client("http://url", codec=OrjsonCodec())
+        self.mock_files.return_value = ({"ids": {1: "a"}}, None)
+        client.execute("MESSAGE", variables={"ids": {1: "a"}})
+        operation = self.mock_request.call_args[1]["operation"]
+        self.assertEqual(json.loads(operation)["variables"], {"ids": {"1": "a"}})
+    
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_can_send_large_integers_with_orjson(self):
+        client = Client("http://url", codec=OrjsonCodec())
+        self.mock_files.return_value = ({"id": 2 ** 70}, None)
+        client.execute("MESSAGE", variables={"id": 2 ** 70})
+        operation = self.mock_request.call_args[1]["operation"]
+        self.assertEqual(json.loads(operation)["variables"], {"id": 2 ** 70})
+    
+
     def test_can_send_query_with_retries(self):
-        client = Client("http://url")
+        client = Client("http://url", codec=JsonCodec())
         client.session = Mock()
         result = client.execute("MESSAGE", retries=3, retry_statuses=[1, 2])
         self.mock_files.assert_called_with(None)
@@ -99,26 +606,26 @@ class ClientExecutionTests(TestCase):
             operation='{"variables": null, "query": "MESSAGE"}',
             headers=client._headers, method="POST", retries=3, retry_statuses=[1, 2]
         )
-        self.assertEqual(result, self.mock_request.return_value.json.return_value)
-        self.assertEqual(client._history, [(
+        self.assertEqual(result, {"data": "RESULT"})
+        self.assertEqual(list(client._history), [(
             {"query": "MESSAGE", "variables": {}},
-            self.mock_request.return_value.json.return_value
+            {"data": "RESULT"}
         )])
 
 
     def test_can_send_query_with_different_verb(self):
-        client = Client("http://url")
+        client = Client("http://url", codec=JsonCodec())
         client.session = Mock()
         result = client.execute("MESSAGE", method="GET")
         self.mock_request.assert_called_with(
             operation='{"variables": null, "query": "MESSAGE"}',
             headers=client._headers, method="GET", retries=0, retry_statuses=None
         )
-        self.assertEqual(result, self.mock_request.return_value.json.return_value)
+        self.assertEqual(result, {"data": "RESULT"})
 
 
     def test_can_send_query_with_variables(self):
-        client = Client("http://url")
+        client = Client("http://url", codec=JsonCodec())
         client.session = Mock()
         self.mock_files.return_value = ({"S": "T"}, None)
         result = client.execute("MESSAGE", variables={"S": "T"})
@@ -127,16 +634,16 @@ class ClientExecutionTests(TestCase):
             operation='{"variables": {"S": "T"}, "query": "MESSAGE"}',
             headers=client._headers, method="POST", retries=0, retry_statuses=None
         )
-        self.assertEqual(result, self.mock_request.return_value.json.return_value)
-        self.assertEqual(client._history, [(
+        self.assertEqual(result, {"data": "RESULT"})
+        self.assertEqual(list(client._history), [(
             {"query": "MESSAGE", "variables": {"S": "T"}},
-            self.mock_request.return_value.json.return_value
+            {"data": "RESULT"}
         )])
     
 
     @patch("mimetypes.MimeTypes")
     def test_can_send_query_with_files(self, mock_mime):
-        client = Client("http://url")
+        client = Client("http://url", codec=JsonCodec())
         client.session = Mock()
         self.mock_files.return_value = ({"S": "T"}, {"file1": None, "file2": None})
         file1, file2 = Mock(), Mock()
@@ -154,20 +661,61 @@ class ClientExecutionTests(TestCase):
             },
             headers={'Accept': "application/json"},
         )
-        self.assertEqual(result, self.mock_request.return_value.json.return_value)
-        self.assertEqual(client._history, [(
+        self.assertEqual(result, {"data": "RESULT"})
+        self.assertEqual(list(client._history), [(
             {"query": "MESSAGE", "variables": {"S": "T"}},
-            self.mock_request.return_value.json.return_value
+            {"data": "RESULT"}
         )])
     
 
+    @patch("kirjava.client.MultipartEncoder")
+    def test_files_can_be_read_ahead_from_threads(self, mock_encoder):
+        client = Client("http://url", upload_workers=8, codec=JsonCodec())
+        client.session = Mock()
+        file1, file2 = Mock(), Mock()
+        self.mock_files.return_value = ({"S": [None, None]}, {"S.0": file1, "S.1": file2})
+        mock_encoder.return_value.content_type = "multipart/form-data; boundary=X"
+        client.execute("MESSAGE", variables={"S": [file1, file2]})
+        self.mock_pack.assert_called_with({"S.0": file1, "S.1": file2}, stream=True)
+        mock_encoder.assert_called_with({
+            "operations": '{"variables": {"S": [null, null]}, "query": "MESSAGE"}',
+            "map": '{"0": ["MAP"]}'
+        }, {"0": ["packed"]}, workers=8)
+        self.assertIs(
+            self.mock_request.call_args[1]["operation"], mock_encoder.return_value
+        )
+    
+
+    @patch("kirjava.client.MultipartEncoder")
+    def test_can_send_query_with_streamed_files(self, mock_encoder):
+        client = Client("http://url", stream_uploads=True, codec=JsonCodec())
+        file1 = Mock()
+        self.mock_files.return_value = ({"S": None}, {"file1": file1})
+        mock_encoder.return_value.content_type = "multipart/form-data; boundary=X"
+        client.execute("MESSAGE", variables={"S": file1})
+        self.mock_pack.assert_called_with({"file1": file1}, stream=True)
+        mock_encoder.assert_called_with({
+            "operations": '{"variables": {"S": null}, "query": "MESSAGE"}',
+            "map": '{"0": ["MAP"]}'
+        }, {"0": ["packed"]}, workers=None)
+        self.mock_request.assert_called_with(
+            method="POST", retries=0, retry_statuses=None,
+            operation=mock_encoder.return_value, headers={
+                "Accept": "application/json",
+                "Content-Type": "multipart/form-data; boundary=X"
+            }
+        )
+    
+
     def test_can_handle_non_json_response(self):
-        client = Client("http://url")
+        client = Client("http://url", codec=JsonCodec())
         client.session = Mock()
-        self.mock_request.return_value.json.side_effect = json.decoder.JSONDecodeError("", "", 0)
+        self.mock_request.return_value.content = b"<html>"
         with self.assertRaises(ValueError) as e:
             client.execute("MESSAGE")
-        self.mock_error.assert_called_with(self.mock_request.return_value)
+        self.mock_error.assert_called_with(
+            self.mock_request.return_value, b"<html>"
+        )
         self.assertEqual(
             str(e.exception),
             str(self.mock_error.return_value)
@@ -175,98 +723,1433 @@ class ClientExecutionTests(TestCase):
 
 
 
-class ClientRetryTests(TestCase):
+class ClientCodecTests(TestCase):
 
-    def test_simple_request_without_retries(self):
-        client = Client("http://url")
-        client.session = Mock()
-        client.session.request.return_value.status_code = 500
-        resp = client.request_with_retries(
-            operation="operation", headers="headers", method="method", files="files"
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_codec_used_to_encode_and_decode(self, mock_request):
+        codec = Mock(loads=Mock(return_value={"data": 1}), dumps=Mock(return_value=b"OP"))
+        client = Client("http://url", codec=codec)
+        mock_request.return_value.content = b"BODY"
+        self.assertEqual(client.execute("{ me }", variables={"a": 1}), {"data": 1})
+        codec.dumps.assert_called_with({"variables": {"a": 1}, "query": "{ me }"})
+        codec.loads.assert_called_with(b"BODY")
+        self.assertEqual(mock_request.call_args[1]["operation"], b"OP")
+    
+
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_codec_errors_give_response_error_message(self, mock_request):
+        codec = Mock(loads=Mock(side_effect=ValueError), dumps=Mock(return_value=b"OP"))
+        client = Client("http://url", codec=codec)
+        mock_request.return_value.content = b"<html>"
+        mock_request.return_value.headers = {"Content-type": "text/html"}
+        with self.assertRaises(ValueError) as e:
+            client.execute("{ me }")
+        self.assertEqual(
+            str(e.exception), "Server did not return JSON, it returned text/html:\n<html>"
         )
-        self.assertEqual(resp, client.session.request.return_value)
-        client.session.request.assert_called_with(
-            "method", "http://url", data="operation", headers="headers", files="files"
+
+
+
+class ClientBatchExecutionTests(TestCase):
+
+    def setUp(self):
+        self.patch1 = patch("kirjava.client.Client.request_with_retries")
+        self.mock_request = self.patch1.start()
+    
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_can_send_batch(self):
+        client = Client("http://url", codec=JsonCodec())
+        self.mock_request.return_value.content = b'[{"data": 1}, {"data": 2}]'
+        results = client.execute_batch([("M1", None), ("M2", {"a": 1})], retries=2)
+        self.mock_request.assert_called_with(
+            operation='[{"variables": null, "query": "M1"}, {"variables": {"a": 1}, "query": "M2"}]',
+            headers=client._headers, method="POST", retries=2, retry_statuses=None
         )
+        self.assertEqual(results, [{"data": 1}, {"data": 2}])
+        self.assertEqual(list(client._history), [
+            ({"query": "M2", "variables": {"a": 1}}, {"data": 2}),
+            ({"query": "M1", "variables": {}}, {"data": 1}),
+        ])
     
 
-    def test_zero_retry_allows_failure(self):
+    def test_batch_cannot_contain_files(self):
+        client = Client("http://url", codec=JsonCodec())
+        with self.assertRaises(ValueError):
+            client.execute_batch([("M1", {"file": io.BytesIO()})])
+        self.assertFalse(self.mock_request.called)
+    
+
+    def test_batch_needs_result_for_each_operation(self):
+        client = Client("http://url", codec=JsonCodec())
+        self.mock_request.return_value.content = b'{"errors": ["no batching"]}'
+        with self.assertRaises(ValueError):
+            client.execute_batch([("M1", None), ("M2", None)])
+        self.mock_request.return_value.content = b'[{"data": 1}]'
+        with self.assertRaises(ValueError):
+            client.execute_batch([("M1", None), ("M2", None)])
+        self.assertEqual(list(client._history), [])
+    
+
+    @patch("kirjava.client.create_response_error_message")
+    def test_can_handle_non_json_batch_response(self, mock_error):
+        client = Client("http://url", codec=JsonCodec())
+        self.mock_request.return_value.content = b"<html>"
+        with self.assertRaises(ValueError) as e:
+            client.execute_batch([("M1", None)])
+        self.assertEqual(str(e.exception), str(mock_error.return_value))
+    
+
+    def test_can_create_batch(self):
+        client = Client("http://url", codec=JsonCodec())
+        batch = client.batch(max_size=5, window=0.1, retries=1)
+        self.assertIs(batch._client, client)
+        self.assertEqual(batch._max_size, 5)
+        self.assertEqual(batch._window, 0.1)
+        self.assertEqual(batch._kwargs, {"retries": 1})
+
+
+
+class ClientStreamingTests(TestCase):
+
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_can_stream_results(self, mock_request):
+        client = Client("http://url", codec=JsonCodec())
+        response = mock_request.return_value
+        response.iter_content.return_value = [b'{"data": {"users": {"edges": [1, ', b'2]}}}']
+        stream = client.execute_stream(
+            "{ users }", "data.users.edges", variables={"a": 1}, retries=2, chunk_size=10
+        )
+        self.assertEqual(list(stream), [1, 2])
+        mock_request.assert_called_with(
+            operation='{"variables": {"a": 1}, "query": "{ users }"}',
+            headers=client._headers, method="POST", retries=2,
+            retry_statuses=None, stream=True
+        )
+        response.iter_content.assert_called_with(10)
+        response.close.assert_called_with()
+        self.assertEqual(client.history, ())
+    
+
+    @patch("kirjava.client.Client.request_with_retries")
+    @patch("kirjava.client.pack_files")
+    def test_can_stream_results_with_files(self, mock_pack, mock_request):
         client = Client("http://url")
-        client.session = Mock()
-        client.session.request.side_effect = Exception()
-        with self.assertRaises(Exception):
-            client.request_with_retries(
-                operation="operation", headers="headers", method="method", files="files"
-            )
-        self.assertEqual(client.session.request.call_count, 1)
+        mock_request.return_value.iter_content.return_value = [b'{"data": [1]}']
+        stream = client.execute_stream("{ users }", "data", variables={"f": io.BytesIO()})
+        self.assertEqual(list(stream), [1])
+        self.assertEqual(mock_request.call_args[1]["files"], mock_pack.return_value)
     
 
-    @patch("time.sleep")
-    def test_can_retry(self, mock_sleep):
+    @patch("kirjava.client.Client.request_with_retries")
+    def test_unread_stream_releases_response(self, mock_request):
         client = Client("http://url")
-        client.session = Mock()
-        client.session.request.side_effect = [Exception, Exception, Exception, "RESP"]
-        resp = client.request_with_retries(
-            operation="operation", headers="headers", method="method", files="files", retries=5
-        )
-        self.assertEqual(resp, "RESP")
-        mock_sleep.assert_any_call(2)
-        mock_sleep.assert_any_call(4)
-        mock_sleep.assert_any_call(8)
-        self.assertEqual(client.session.request.call_count, 4)
+        with client.execute_stream("{ users }", "data"):
+            pass
+        mock_request.return_value.close.assert_called_once_with()
+
+
+
+class ClientPreparationTests(TestCase):
+
+    def test_can_prepare_operation(self):
+        client = Client("http://url")
+        operation = client.prepare("{ me }", method="GET")
+        self.assertIsInstance(operation, PreparedOperation)
+        self.assertIs(operation.client, client)
+        self.assertEqual(operation.method, "GET")
+        self.assertTrue(operation.direct)
+    
+
+    def test_operations_go_through_execute_if_needed(self):
+        self.assertFalse(Client("http://url", cache=MemoryCache()).prepare("{ me }").direct)
+        self.assertFalse(Client("http://url", single_flight=True).prepare("{ me }").direct)
+        self.assertFalse(Client("http://url", persisted_queries=True).prepare("{ me }").direct)
     
 
-    @patch("time.sleep")
-    def test_can_retry_to_limit(self, mock_sleep):
+    @patch("kirjava.client.aiohttp")
+    def test_async_client_prepares_async_operation(self, mock_aiohttp):
+        operation = AsyncClient("http://url").prepare("{ me }")
+        self.assertIsInstance(operation, AsyncPreparedOperation)
+
+
+
+class ClientPaginationTests(TestCase):
+
+    def make_pages(self, *pages):
+        results = []
+        for i, nodes in enumerate(pages):
+            results.append({"data": {"users": {
+                "edges": [{"node": node} for node in nodes],
+                "pageInfo": {"hasNextPage": i < len(pages) - 1, "endCursor": f"C{i}"}
+            }}})
+        return results
+
+
+    def test_can_paginate(self):
         client = Client("http://url")
-        client.session = Mock()
-        client.session.request.side_effect = [Exception, Exception, Exception, "RESP"]
-        with self.assertRaises(Exception):
-            client.request_with_retries(
-                operation="operation", headers="headers", method="method", files="files", retries=2
-            )
-        mock_sleep.assert_any_call(2)
-        mock_sleep.assert_any_call(4)
-        self.assertEqual(client.session.request.call_count, 3)
+        client.execute = Mock(side_effect=self.make_pages([1, 2], [3], [4, 5]))
+        nodes = list(client.paginate("QUERY", "data.users", variables={"a": 1}, retries=2))
+        self.assertEqual(nodes, [1, 2, 3, 4, 5])
+        self.assertEqual(client.execute.call_args_list, [
+            (("QUERY",), {"variables": {"a": 1}, "retries": 2}),
+            (("QUERY",), {"variables": {"a": 1, "after": "C0"}, "retries": 2}),
+            (("QUERY",), {"variables": {"a": 1, "after": "C1"}, "retries": 2}),
+        ])
     
 
-    def test_simple_request_without_retries(self):
+    def test_can_set_page_size(self):
         client = Client("http://url")
-        client.session = Mock()
-        resp = client.request_with_retries(
-            operation="operation", headers="headers", method="method", files="files"
-        )
-        self.assertEqual(resp, client.session.request.return_value)
-        client.session.request.assert_called_with(
-            "method", "http://url", data="operation", headers="headers", files="files"
-        )
+        client.execute = Mock(side_effect=self.make_pages([1], [2]))
+        self.assertEqual(list(client.paginate("QUERY", "data.users", page_size=1)), [1, 2])
+        client.execute.assert_called_with("QUERY", variables={"first": 1, "after": "C0"})
     
 
-    def test_can_fail_on_status_code(self):
+    def test_pages_fetched_lazily(self):
         client = Client("http://url")
-        client.session = Mock()
-        client.session.request.return_value.status_code = 500
-        with self.assertRaises(Exception):
-            client.request_with_retries(
-                operation="operation", headers="headers", method="method", files="files", retry_statuses=[500]
-            )
-        client.session.request.assert_called_with(
-            "method", "http://url", data="operation", headers="headers", files="files"
-        )
+        client.execute = Mock(side_effect=self.make_pages([1, 2], [3]))
+        nodes = client.paginate("QUERY", "data.users")
+        self.assertEqual(next(nodes), 1)
+        self.assertEqual(next(nodes), 2)
+        self.assertEqual(client.execute.call_count, 1)
     
 
-    @patch("time.sleep")
-    def test_can_retry_on_status_code(self, mock_sleep):
+    def test_can_prefetch_pages(self):
         client = Client("http://url")
-        client.session = Mock()
-        client.session.request.return_value.status_code = 500
-        with self.assertRaises(Exception):
-            client.request_with_retries(
-                operation="operation", headers="headers", method="method", files="files", retry_statuses=[500], retries=5
-            )
-        mock_sleep.assert_any_call(2)
-        mock_sleep.assert_any_call(4)
-        mock_sleep.assert_any_call(8)
-        mock_sleep.assert_any_call(16)
-        mock_sleep.assert_any_call(32)
-        self.assertEqual(client.session.request.call_count, 6)
\ No newline at end of file
+        client.execute = Mock(side_effect=self.make_pages([1, 2], [3], [4]))
+        nodes = client.paginate("QUERY", "data.users", prefetch=True)
+        self.assertEqual(next(nodes), 1)
+        time.sleep(0.05)
+        self.assertEqual(client.execute.call_count, 2)
+        self.assertEqual(list(nodes), [2, 3, 4])
+        self.assertEqual(client.execute.call_count, 3)
+    
+
+    def test_missing_connection(self):
+        client = Client("http://url")
+        client.execute = Mock(return_value={"errors": ["bad"], "data": None})
+        with self.assertRaises(ValueError):
+            list(client.paginate("QUERY", "data.users"))
+
+
+
+class ConnectionTests(TestCase):
+
+    def test_can_get_connection(self):
+        self.assertEqual(get_connection({"data": {"a": {"b": {"edges": []}}}}, "data.a.b"), {"edges": []})
+    
+
+    def test_missing_connection(self):
+        for result in [{"data": None, "errors": [1]}, {"data": {"a": []}}, {"data": {"a": {"b": None}}}]:
+            with self.assertRaises(ValueError):
+                get_connection(result, "data.a.b")
+    
+
+    def test_can_get_next_cursor(self):
+        self.assertEqual(get_next_cursor({"pageInfo": {"hasNextPage": True, "endCursor": "X"}}), "X")
+        self.assertIsNone(get_next_cursor({"pageInfo": {"hasNextPage": False, "endCursor": "X"}}))
+        self.assertIsNone(get_next_cursor({"edges": []}))
+
+
+
+class ClientSendingTests(TestCase):
+
+    def setUp(self):
+        self.patch1 = patch("kirjava.client.Client.request_with_retries")
+        self.mock_request = self.patch1.start()
+        self.mock_request.return_value.content = b'{"data": 1}'
+    
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_can_send_with_extensions(self):
+        client = Client("http://url", codec=JsonCodec())
+        variables, response, result = client.send(
+            "MESSAGE", {"a": 1}, extensions={"e": 2}, retries=1
+        )
+        self.mock_request.assert_called_with(
+            operation='{"variables": {"a": 1}, "query": "MESSAGE", "extensions": {"e": 2}}',
+            headers=client._headers, method="POST", retries=1, retry_statuses=None
+        )
+        self.assertEqual(variables, {"a": 1})
+        self.assertIs(response, self.mock_request.return_value)
+        self.assertEqual(result, {"data": 1})
+    
+
+    def test_can_send_minified_query(self):
+        client = Client("http://url", codec=JsonCodec(), minify=True)
+        client.send("query  Me {\n  me # comment\n}", None)
+        self.assertEqual(
+            self.mock_request.call_args[1]["operation"],
+            '{"variables": null, "query": "query Me{me}"}'
+        )
+        client.send("{ me", None)
+        self.assertEqual(
+            self.mock_request.call_args[1]["operation"],
+            '{"variables": null, "query": "{ me"}'
+        )
+    
+
+    def test_can_send_without_query(self):
+        client = Client("http://url", codec=JsonCodec())
+        client.send(None, None, extensions={"e": 2})
+        self.mock_request.assert_called_with(
+            operation='{"variables": null, "extensions": {"e": 2}}',
+            headers=client._headers, method="POST", retries=0, retry_statuses=None
+        )
+    
+
+    def test_bytes_like_files_are_streamed_without_copying(self):
+        client = Client("http://url", codec=JsonCodec())
+        data, f = bytearray(b"abc"), io.BytesIO(b"def")
+        f.name = "f.txt"
+        client.send("MESSAGE", {"a": data, "b": f})
+        kwargs = self.mock_request.call_args[1]
+        operation = kwargs["operation"]
+        self.assertIsInstance(operation, MultipartEncoder)
+        self.assertNotIn("files", kwargs)
+        self.assertEqual(kwargs["headers"]["Content-Type"], operation.content_type)
+        self.assertTrue(any(
+            isinstance(part, memoryview) and part.obj is data
+            for part, _, _ in operation._parts
+        ))
+        body = operation.read()
+        self.assertIn(b"\r\n\r\nabc\r\n", body)
+        self.assertIn(b"\r\n\r\ndef\r\n", body)
+    
+
+    def test_get_with_extensions_uses_url_parameters(self):
+        client = Client("http://url", codec=JsonCodec())
+        client.send(None, {"a": 1}, method="GET", extensions={"e": 2})
+        self.mock_request.assert_called_with(
+            operation=None, headers=client._headers, method="GET", retries=0,
+            retry_statuses=None, params={"variables": '{"a": 1}', "extensions": '{"e": 2}'}
+        )
+
+
+
+class ClientPersistedQueryTests(TestCase):
+
+    def setUp(self):
+        self.patch1 = patch("kirjava.client.Client.send")
+        self.mock_send = self.patch1.start()
+        self.hash = "b7e4ef0c41abe27fe98d162502c81bdd0611cd1b7555f1d6cf8d12b822111ba5"
+        self.extensions = {"persistedQuery": {"version": 1, "sha256Hash": self.hash}}
+        self.not_found = {"errors": [{"message": "PersistedQueryNotFound"}]}
+    
+
+    def tearDown(self):
+        self.patch1.stop()
+
+
+    def test_new_query_is_sent_in_full_with_hash(self):
+        client = Client("http://url", persisted_queries=True)
+        self.mock_send.return_value = (None, "RESP", {"data": 1})
+        self.assertEqual(client.execute("{ me }"), {"data": 1})
+        self.mock_send.assert_called_once_with(
+            "{ me }", None, "POST", 0, None, self.extensions, None
+        )
+        self.assertEqual(client._persisted_hashes, {self.hash})
+    
+
+    def test_minified_query_is_hashed(self):
+        client = Client("http://url", persisted_queries=True, minify=True)
+        self.mock_send.return_value = (None, "RESP", {"data": 1})
+        client.execute("# Me\n{\n  me\n}")
+        self.mock_send.assert_called_once_with(
+            "{me}", None, "POST", 0, None, {"persistedQuery": {
+                "version": 1, "sha256Hash": get_query_hash("{me}")
+            }}, None
+        )
+    
+
+    def test_known_query_is_sent_as_hash(self):
+        client = Client("http://url", persisted_queries=True)
+        client._persisted_hashes.add(self.hash)
+        self.mock_send.return_value = ({"a": 1}, "RESP", {"data": 1})
+        self.assertEqual(client.execute("{ me }", variables={"a": 1}, method="GET"), {"data": 1})
+        self.mock_send.assert_called_once_with(
+            None, {"a": 1}, "GET", 0, None, self.extensions, None
+        )
+    
+
+    def test_falls_back_to_full_query_if_server_forgot(self):
+        client = Client("http://url", persisted_queries=True)
+        client._persisted_hashes.add(self.hash)
+        self.mock_send.side_effect = [
+            (None, "RESP", self.not_found), (None, "RESP", {"data": 1})
+        ]
+        self.assertEqual(client.execute("{ me }", method="GET", retries=2), {"data": 1})
+        self.mock_send.assert_called_with("{ me }", None, "POST", 2, None, self.extensions, None)
+        self.assertEqual(client._persisted_hashes, {self.hash})
+        self.assertEqual(client.history[0][1], {"data": 1})
+    
+
+    def test_persisted_queries_turned_off_if_server_does_not_support_them(self):
+        client = Client("http://url", persisted_queries=True)
+        self.mock_send.side_effect = [(None, "RESP", {"errors": [
+            {"message": "x", "extensions": {"code": "PERSISTED_QUERY_NOT_SUPPORTED"}}
+        ]}), (None, "RESP", {"data": 1}), (None, "RESP", {"data": 2})]
+        self.assertEqual(client.execute("{ me }", method="GET"), {"data": 1})
+        self.mock_send.assert_called_with("{ me }", None, "GET", 0, None, timeout=None)
+        self.assertEqual(client._persisted_hashes, set())
+        self.assertFalse(client._persisted_queries)
+        self.assertEqual(client.execute("{ me }"), {"data": 2})
+        self.mock_send.assert_called_with("{ me }", None, "POST", 0, None, timeout=None)
+        self.assertEqual(self.mock_send.call_count, 3)
+    
+
+    def test_uploads_are_not_persisted(self):
+        client = Client("http://url", persisted_queries=True)
+        self.mock_send.return_value = (None, "RESP", {"data": 1})
+        f = io.BytesIO()
+        client.execute("{ me }", variables={"f": f})
+        self.mock_send.assert_called_once_with("{ me }", {"f": f}, "POST", 0, None, timeout=None)
+
+
+
+class ClientManyExecutionTests(TestCase):
+
+    def test_can_execute_many(self):
+        client = Client("http://url")
+        client.execute = Mock(side_effect=lambda m, variables: {"data": [m, variables]})
+        results = client.execute_many([("M1", None), ("M2", {"a": 1}), ("M3", None)])
+        self.assertEqual(results, [
+            {"data": ["M1", None]}, {"data": ["M2", {"a": 1}]}, {"data": ["M3", None]}
+        ])
+    
+
+    def test_results_are_in_input_order(self):
+        client = Client("http://url")
+        def execute(message, variables):
+            time.sleep(variables["wait"])
+            return message
+        client.execute = execute
+        results = client.execute_many(
+            [("M1", {"wait": 0.05}), ("M2", {"wait": 0}), ("M3", {"wait": 0.02})],
+            max_workers=3
+        )
+        self.assertEqual(results, ["M1", "M2", "M3"])
+    
+
+    def test_errors_are_collected(self):
+        client = Client("http://url")
+        error = ValueError("bad")
+        client.execute = Mock(side_effect=[{"data": 1}, error, {"data": 3}])
+        results = client.execute_many(
+            [("M1", None), ("M2", None), ("M3", None)], max_workers=1
+        )
+        self.assertEqual(results, [{"data": 1}, error, {"data": 3}])
+    
+
+    def test_can_pass_execute_arguments(self):
+        client = Client("http://url")
+        client.execute = Mock()
+        client.execute_many([("M1", None)], retries=3, method="GET")
+        client.execute.assert_called_with("M1", variables=None, retries=3, method="GET")
+    
+
+    def test_can_limit_operations_in_flight(self):
+        client = Client("http://url")
+        lock, counts = threading.Lock(), {"now": 0, "max": 0}
+        def execute(message, variables):
+            with lock:
+                counts["now"] += 1
+                counts["max"] = max(counts["max"], counts["now"])
+            time.sleep(0.01)
+            with lock: counts["now"] -= 1
+        client.execute = execute
+        client.execute_many([("M", None)] * 20, max_workers=10, max_in_flight=3)
+        self.assertLessEqual(counts["max"], 3)
+    
+
+    def test_can_handle_no_operations(self):
+        client = Client("http://url")
+        self.assertEqual(client.execute_many([]), [])
+
+
+
+class ClientRetryTests(TestCase):
+
+    def test_simple_request_without_retries(self):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.return_value.status_code = 500
+        resp = client.request_with_retries(
+            operation="operation", headers="headers", method="method", files="files"
+        )
+        self.assertEqual(resp, client.session.request.return_value)
+        client.session.request.assert_called_with(
+            "method", "http://url", data="operation", headers="headers", files="files"
+        )
+    
+
+    def test_zero_retry_allows_failure(self):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.side_effect = Exception()
+        with self.assertRaises(Exception):
+            client.request_with_retries(
+                operation="operation", headers="headers", method="method", files="files"
+            )
+        self.assertEqual(client.session.request.call_count, 1)
+    
+
+    @patch("random.uniform", side_effect=lambda low, high: high)
+    @patch("kirjava.client.Client.wait")
+    def test_can_retry(self, mock_sleep, mock_uniform):
+        client = Client("http://url")
+        client.session = Mock()
+        response = Mock(status_code=200)
+        client.session.request.side_effect = [ConnectionError, ConnectionError, ConnectionError, response]
+        resp = client.request_with_retries(
+            operation="operation", headers="headers", method="method", files="files", retries=5
+        )
+        self.assertIs(resp, response)
+        mock_sleep.assert_any_call(2, 0)
+        mock_sleep.assert_any_call(4, 0)
+        mock_sleep.assert_any_call(8, 0)
+        self.assertEqual(client.session.request.call_count, 4)
+    
+
+    @patch("random.uniform", side_effect=lambda low, high: high)
+    @patch("kirjava.client.Client.wait")
+    def test_can_retry_to_limit(self, mock_sleep, mock_uniform):
+        client = Client("http://url")
+        client.session = Mock()
+        response = Mock(status_code=200)
+        client.session.request.side_effect = [ConnectionError, ConnectionError, ConnectionError, response]
+        with self.assertRaises(Exception):
+            client.request_with_retries(
+                operation="operation", headers="headers", method="method", files="files", retries=2
+            )
+        mock_sleep.assert_any_call(2, 0)
+        mock_sleep.assert_any_call(4, 0)
+        self.assertEqual(client.session.request.call_count, 3)
+    
+
+    def test_simple_request_without_retries(self):
+        client = Client("http://url")
+        client.session = Mock()
+        resp = client.request_with_retries(
+            operation="operation", headers="headers", method="method", files="files"
+        )
+        self.assertEqual(resp, client.session.request.return_value)
+        client.session.request.assert_called_with(
+            "method", "http://url", data="operation", headers="headers", files="files"
+        )
+    
+
+    @patch("random.uniform", side_effect=lambda low, high: high)
+    @patch("kirjava.client.Client.wait")
+    def test_streamed_body_is_rewound_on_retry(self, mock_sleep, mock_uniform):
+        client = Client("http://url")
+        client.session = Mock()
+        response = Mock(status_code=200)
+        client.session.request.side_effect = [ConnectionError, response]
+        body = MultipartEncoder({"a": "b"}, {})
+        body.read()
+        resp = client.request_with_retries(operation=body, headers="headers", retries=1)
+        self.assertIs(resp, response)
+        self.assertEqual(body.tell(), 0)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_retried_responses_are_closed(self, mock_sleep):
+        client = Client("http://url")
+        client.session = Mock()
+        failed, response = Mock(status_code=503), Mock(status_code=200)
+        client.session.request.side_effect = [failed, response]
+        resp = client.request_with_retries(
+            operation="operation", headers="headers", retries=1,
+            retry_statuses=[503], stream=True
+        )
+        self.assertIs(resp, response)
+        failed.close.assert_called_with()
+        self.assertFalse(response.close.called)
+    
+
+    def test_streamed_responses_are_not_checked_for_error_codes(self):
+        client = Client("http://url", retry_policy=RetryPolicy(retries=1, error_codes=["X"]))
+        client.session = Mock()
+        response = Mock(status_code=200)
+        type(response).content = PropertyMock(side_effect=AssertionError)
+        client.session.request.return_value = response
+        resp = client.request_with_retries(operation="operation", headers="headers", stream=True)
+        self.assertIs(resp, response)
+        self.assertEqual(client.session.request.call_count, 1)
+    
+
+    def test_can_fail_on_status_code(self):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.return_value.status_code = 500
+        with self.assertRaises(Exception):
+            client.request_with_retries(
+                operation="operation", headers="headers", method="method", files="files", retry_statuses=[500]
+            )
+        client.session.request.assert_called_with(
+            "method", "http://url", data="operation", headers="headers", files="files"
+        )
+    
+
+    @patch("random.uniform", side_effect=lambda low, high: high)
+    @patch("kirjava.client.Client.wait")
+    def test_can_retry_on_status_code(self, mock_sleep, mock_uniform):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.return_value.status_code = 500
+        with self.assertRaises(Exception):
+            client.request_with_retries(
+                operation="operation", headers="headers", method="method", files="files", retry_statuses=[500], retries=5
+            )
+        mock_sleep.assert_any_call(2, 0)
+        mock_sleep.assert_any_call(4, 0)
+        mock_sleep.assert_any_call(8, 0)
+        mock_sleep.assert_any_call(16, 0)
+        mock_sleep.assert_any_call(32, 0)
+        self.assertEqual(client.session.request.call_count, 6)
+
+
+    def test_other_exceptions_are_not_retried(self):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.side_effect = [ValueError, Mock(status_code=200)]
+        with self.assertRaises(ValueError):
+            client.request_with_retries(operation="operation", headers="headers", retries=3)
+        self.assertEqual(client.session.request.call_count, 1)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_status_retries_running_out_raises_retry_error(self, mock_sleep):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.return_value.status_code = 502
+        with self.assertRaises(RetryError) as ctx:
+            client.request_with_retries(
+                operation="operation", headers="headers", retry_statuses=[502], retries=1
+            )
+        self.assertIs(ctx.exception.response, client.session.request.return_value)
+        self.assertEqual(str(ctx.exception), "Status code 502")
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_retry_after_header_is_obeyed(self, mock_sleep):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.side_effect = [
+            Mock(status_code=429, headers={"Retry-After": "7"}), Mock(status_code=200)
+        ]
+        client.request_with_retries(
+            operation="operation", headers="headers", retry_statuses=[429], retries=1
+        )
+        mock_sleep.assert_called_with(7, 0)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_client_retry_policy_is_used(self, mock_sleep):
+        client = Client("http://url", retry_policy=RetryPolicy(retries=2))
+        client.session = Mock()
+        client.session.request.side_effect = [ConnectionError, ConnectionError, Mock(status_code=200)]
+        self.assertEqual(client.retry_policy.retries, 2)
+        client.request_with_retries(operation="operation", headers="headers")
+        self.assertEqual(client.session.request.call_count, 3)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_can_retry_on_graphql_error_code(self, mock_sleep):
+        client = Client("http://url", codec=JsonCodec(), retry_policy=RetryPolicy(
+            retries=1, error_codes=["UNAVAILABLE"]
+        ))
+        client.session = Mock()
+        failed = Mock(status_code=200, content=b'{"errors": [{"extensions": {"code": "UNAVAILABLE"}}]}')
+        succeeded = Mock(status_code=200, content=b'{"data": 1}')
+        client.session.request.side_effect = [failed, succeeded]
+        resp = client.request_with_retries(operation="operation", headers="headers")
+        self.assertIs(resp, succeeded)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_graphql_error_code_retries_running_out_returns_response(self, mock_sleep):
+        client = Client("http://url", codec=JsonCodec(), retry_policy=RetryPolicy(
+            retries=1, error_codes=["UNAVAILABLE"]
+        ))
+        client.session = Mock()
+        client.session.request.return_value.status_code = 200
+        client.session.request.return_value.content = b'{"errors": [{"extensions": {"code": "UNAVAILABLE"}}]}'
+        resp = client.request_with_retries(operation="operation", headers="headers")
+        self.assertIs(resp, client.session.request.return_value)
+        self.assertEqual(client.session.request.call_count, 2)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_empty_budget_stops_retries(self, mock_sleep):
+        budget = RetryBudget(capacity=1, refill_rate=0)
+        client = Client("http://url", retry_policy=RetryPolicy(retries=5, budget=budget))
+        client.session = Mock()
+        client.session.request.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            client.request_with_retries(operation="operation", headers="headers")
+        self.assertEqual(client.session.request.call_count, 2)
+
+
+    def test_client_timeout_is_sent(self):
+        client = Client("http://url", timeout=(1, 5))
+        client.session = Mock()
+        self.assertEqual(client.timeout, (1, 5))
+        client.request_with_retries(operation="operation", headers="headers")
+        client.session.request.assert_called_with(
+            "POST", "http://url", data="operation", headers="headers", files=None,
+            timeout=(1, 5)
+        )
+    
+
+    def test_request_timeout_overrides_client_timeout(self):
+        client = Client("http://url", timeout=10)
+        client.session = Mock()
+        client.request_with_retries(operation="operation", headers="headers", timeout=2)
+        self.assertEqual(client.session.request.call_args[1]["timeout"], 2)
+    
+
+    def test_timeout_is_limited_by_deadline(self):
+        client = Client("http://url", timeout=(1, 60), retry_policy=RetryPolicy(deadline=5))
+        client.session = Mock()
+        client.request_with_retries(operation="operation", headers="headers")
+        connect, read = client.session.request.call_args[1]["timeout"]
+        self.assertEqual(connect, 1)
+        self.assertLessEqual(read, 5)
+        self.assertGreater(read, 4)
+    
+
+    def test_cancellation_stops_retry_wait(self):
+        client = Client("http://url", retry_policy=RetryPolicy(retries=3, backoff=30))
+        client.session = Mock()
+        client.session.request.side_effect = ConnectionError
+        threading.Timer(0.05, client.cancel).start()
+        start = time.monotonic()
+        with self.assertRaises(CancelledError):
+            client.request_with_retries(operation="operation", headers="headers")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(client.session.request.call_count, 1)
+    
+
+    def test_cancellation_during_attempt_closes_response(self):
+        client = Client("http://url")
+        client.session = Mock()
+        client.session.request.side_effect = lambda *args, **kwargs: (
+            client.cancel() or client.session.response
+        )
+        with self.assertRaises(CancelledError):
+            client.request_with_retries(operation="operation", headers="headers")
+        client.session.response.close.assert_called_with()
+    
+
+    def test_cancellation_does_not_affect_later_requests(self):
+        client = Client("http://url")
+        client.session = Mock()
+        client.cancel()
+        resp = client.request_with_retries(operation="operation", headers="headers")
+        self.assertIs(resp, client.session.request.return_value)
+    
+
+    def test_timeout_is_passed_through_execute(self):
+        client = Client("http://url", codec=JsonCodec())
+        client.session = Mock()
+        client.session.request.return_value.status_code = 200
+        client.session.request.return_value.content = b'{"data": 1}'
+        client.execute("{ me }", timeout=3)
+        self.assertEqual(client.session.request.call_args[1]["timeout"], 3)
+
+
+    def test_rate_limits_are_waited_for(self):
+        client = Client("http://url", rate_limiter=Mock(reserve=Mock(return_value=0.5)), cost_limiter=Mock(reserve=Mock(return_value=2)))
+        client.session = Mock()
+        client.wait = Mock()
+        client.request_with_retries(operation="operation", headers="headers")
+        client.wait.assert_called_once_with(2, 0)
+    
+
+    def test_concurrency_limit_is_held_during_request(self):
+        limiter = ConcurrencyLimiter(1)
+        client = Client("http://url", concurrency_limiter=limiter)
+        client.session = Mock()
+        client.session.request.side_effect = lambda *args, **kwargs: Mock(
+            status_code=200, active=limiter.active
+        )
+        resp = client.request_with_retries(operation="operation", headers="headers")
+        self.assertEqual(resp.active, 1)
+        self.assertEqual(limiter.active, 0)
+    
+
+    def test_concurrency_limit_is_released_on_error(self):
+        limiter = ConcurrencyLimiter(1)
+        client = Client("http://url", concurrency_limiter=limiter)
+        client.session = Mock()
+        client.session.request.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            client.request_with_retries(operation="operation", headers="headers")
+        self.assertEqual(limiter.active, 0)
+    
+
+    @patch("kirjava.client.Client.wait")
+    def test_too_many_requests_pauses_limiters(self, mock_wait):
+        rate, cost = RateLimiter(10), RateLimiter(100)
+        client = Client("http://url", rate_limiter=rate, cost_limiter=cost)
+        client.session = Mock()
+        client.session.request.return_value = Mock(status_code=429, headers={"Retry-After": "4"})
+        client.request_with_retries(operation="operation", headers="headers")
+        self.assertLess(rate.tokens, -39)
+        self.assertLess(cost.tokens, -399)
+    
+
+    def test_cost_limiter_is_synced_from_responses(self):
+        cost = Mock(reserve=Mock(return_value=0))
+        client = Client("http://url", codec=JsonCodec(), cost_limiter=cost)
+        client.session = Mock()
+        client.session.request.return_value = Mock(
+            status_code=200, content=b'{"data": 1, "extensions": {"cost": {}}}'
+        )
+        client.execute("{ me }")
+        cost.sync.assert_called_with({"data": 1, "extensions": {"cost": {}}})
+        client.session.request.return_value.content = b'[{"data": 1}, {"data": 2}]'
+        client.execute_batch([("{ a }", None), ("{ b }", None)])
+        cost.sync.assert_called_with({"data": 2})
+
+
+
+class AsyncClientCreationTests(TestCase):
+
+    @patch("kirjava.client.aiohttp")
+    def test_can_create_async_client(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        self.assertEqual(client._url, "http://url")
+        self.assertEqual(client._headers, {
+            "Accept": "application/json", "Content-Type": "application/json"
+        })
+        self.assertEqual(client._connections, 100)
+        self.assertIsNone(client.session)
+        self.assertEqual(repr(client), "<AsyncClient (URL: http://url)>")
+    
+
+    @patch("kirjava.client.aiohttp")
+    def test_can_create_async_client_with_connection_limit(self, mock_aiohttp):
+        client = AsyncClient("http://url", connections=5)
+        self.assertEqual(client._connections, 5)
+    
+
+    @patch("kirjava.client.aiohttp")
+    def test_can_pass_client_options_to_async_client(self, mock_aiohttp):
+        client = AsyncClient("http://url", history_size=3)
+        self.assertEqual(client._history.maxlen, 3)
+    
+
+    @patch("kirjava.client.aiohttp", None)
+    def test_async_client_needs_aiohttp(self):
+        with patch.dict("sys.modules", {"aiohttp": None}):
+            with self.assertRaises(ImportError):
+                AsyncClient("http://url")
+    
+
+    @patch("kirjava.client.aiohttp", None)
+    def test_aiohttp_imported_when_needed(self):
+        aiohttp = Mock()
+        with patch.dict("sys.modules", {"aiohttp": aiohttp}):
+            AsyncClient("http://url")
+        from kirjava import client
+        self.assertIs(client.aiohttp, aiohttp)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientExecutionTests(IsolatedAsyncioTestCase):
+
+    async def test_can_send_query(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        response = Mock(read=AsyncMock(return_value=b'{"data": 1}'))
+        client.request_with_retries = AsyncMock(return_value=response)
+        result = await client.execute("MESSAGE", variables={"S": "T"}, retries=2)
+        client.request_with_retries.assert_awaited_with(
+            operation='{"variables": {"S": "T"}, "query": "MESSAGE"}',
+            headers=client._headers, method="POST", retries=2,
+            retry_statuses=None
+        )
+        self.assertEqual(result, {"data": 1})
+        self.assertEqual(list(client._history), [(
+            {"query": "MESSAGE", "variables": {"S": "T"}}, {"data": 1}
+        )])
+    
+
+    @patch("kirjava.client.pack_files")
+    async def test_can_send_query_with_files(self, mock_pack, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        mock_pack.return_value = {"0": ("f.txt", b"abc", "text/plain")}
+        response = Mock(read=AsyncMock(return_value=b'{"data": 1}'))
+        client.request_with_retries = AsyncMock(return_value=response)
+        f = io.BytesIO()
+        await client.execute("MESSAGE", variables={"file": f})
+        client.request_with_retries.assert_awaited_with(
+            operation={
+                "operations": '{"variables": {"file": null}, "query": "MESSAGE"}',
+                "map": '{"0": ["variables.file"]}'
+            }, headers={"Accept": "application/json"}, method="POST", retries=0,
+            retry_statuses=None, files={"0": ("f.txt", b"abc", "text/plain")}
+        )
+    
+
+    async def test_can_handle_non_json_response(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        response = Mock(
+            read=AsyncMock(return_value=b"nope"), headers={"Content-type": "text"}
+        )
+        client.request_with_retries = AsyncMock(return_value=response)
+        with self.assertRaises(ValueError) as e:
+            await client.execute("MESSAGE")
+        self.assertEqual(
+            str(e.exception), "Server did not return JSON, it returned text:\nnope"
+        )
+    
+
+    async def test_results_are_cached(self, mock_aiohttp):
+        client = AsyncClient("http://url", cache=MemoryCache())
+        response = Mock(read=AsyncMock(return_value=b'{"data": 1}'))
+        client.request_with_retries = AsyncMock(return_value=response)
+        self.assertEqual(await client.execute("{ me }"), {"data": 1})
+        self.assertEqual(await client.execute("{ me }"), {"data": 1})
+        self.assertEqual(client.request_with_retries.await_count, 1)
+        self.assertEqual(client.cache.hits, 1)
+    
+
+    async def test_can_close_client(self, mock_aiohttp):
+        async with AsyncClient("http://url", codec=JsonCodec()) as client:
+            session = client.session = AsyncMock()
+        session.close.assert_awaited_with()
+        self.assertIsNone(client.session)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientSessionTests(IsolatedAsyncioTestCase):
+
+    async def test_connector_options(self, mock_aiohttp):
+        client = AsyncClient("http://url", connections=20, connections_per_host=5, keep_alive=False)
+        client.session = None
+        mock_aiohttp.ClientSession.return_value.request = AsyncMock(
+            return_value=Mock(status=200, read=AsyncMock())
+        )
+        await client.request_with_retries("operation", "headers")
+        mock_aiohttp.TCPConnector.assert_called_with(
+            limit=20, limit_per_host=5, force_close=True
+        )
+    
+
+    async def test_shared_session_is_not_closed(self, mock_aiohttp):
+        session = Mock(close=AsyncMock())
+        async with AsyncClient("http://url", session=session) as client:
+            self.assertIs(client.session, session)
+        self.assertFalse(session.close.called)
+        self.assertIs(client.session, session)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientRetryTests(IsolatedAsyncioTestCase):
+
+    def make_client(self, *responses):
+        client = AsyncClient("http://url")
+        client.session = Mock(request=AsyncMock(side_effect=responses))
+        return client
+
+
+    async def test_creates_pooled_session_on_first_request(self, mock_aiohttp):
+        client = AsyncClient("http://url", connections=7)
+        response = Mock(status=200, read=AsyncMock())
+        mock_aiohttp.ClientSession.return_value.request = AsyncMock(return_value=response)
+        resp = await client.request_with_retries("operation", {"h": "v"})
+        mock_aiohttp.TCPConnector.assert_called_with(
+            limit=7, limit_per_host=0, force_close=False
+        )
+        mock_aiohttp.ClientSession.assert_called_with(
+            connector=mock_aiohttp.TCPConnector.return_value, headers=None
+        )
+        self.assertIs(resp, response)
+        response.read.assert_awaited_with()
+    
+
+    async def test_session_can_refuse_compressed_responses(self, mock_aiohttp):
+        client = AsyncClient("http://url", compression=False)
+        response = Mock(status=200, read=AsyncMock())
+        mock_aiohttp.ClientSession.return_value.request = AsyncMock(return_value=response)
+        await client.request_with_retries("operation", {"h": "v"})
+        mock_aiohttp.ClientSession.assert_called_with(
+            connector=mock_aiohttp.TCPConnector.return_value,
+            headers={"Accept-Encoding": "identity"}
+        )
+    
+
+    async def test_large_bodies_compressed(self, mock_aiohttp):
+        client = AsyncClient("http://url", compression_threshold=10)
+        response = Mock(status=200, read=AsyncMock())
+        mock_aiohttp.ClientSession.return_value.request = AsyncMock(return_value=response)
+        await client.request_with_retries("x" * 20, {"h": "v"})
+        args, kwargs = mock_aiohttp.ClientSession.return_value.request.call_args
+        self.assertEqual(gzip.decompress(kwargs["data"]), b"x" * 20)
+        self.assertEqual(kwargs["headers"], {"h": "v", "Content-Encoding": "gzip"})
+    
+
+    async def test_simple_request_without_retries(self, mock_aiohttp):
+        response = Mock(status=500, read=AsyncMock())
+        client = self.make_client(response)
+        resp = await client.request_with_retries(
+            operation="operation", headers="headers", method="method"
+        )
+        self.assertIs(resp, response)
+        client.session.request.assert_called_with(
+            "method", "http://url", data="operation", headers="headers"
+        )
+    
+
+    @patch("random.uniform", side_effect=lambda low, high: high)
+    @patch("asyncio.sleep")
+    async def test_can_retry(self, mock_sleep, mock_uniform, mock_aiohttp):
+        response = Mock(status=200, read=AsyncMock())
+        client = self.make_client(ConnectionError(), ConnectionError(), response)
+        resp = await client.request_with_retries(
+            operation="operation", headers="headers", retries=5
+        )
+        self.assertIs(resp, response)
+        mock_sleep.assert_any_await(2)
+        mock_sleep.assert_any_await(4)
+        self.assertEqual(client.session.request.call_count, 3)
+    
+
+    @patch("asyncio.sleep")
+    async def test_can_retry_on_status_code(self, mock_sleep, mock_aiohttp):
+        response = Mock(status=500, read=AsyncMock())
+        client = self.make_client(response, response, response)
+        with self.assertRaises(Exception):
+            await client.request_with_retries(
+                operation="operation", headers="headers", retries=2, retry_statuses=[500]
+            )
+        self.assertEqual(client.session.request.call_count, 3)
+
+
+    @patch("asyncio.sleep")
+    async def test_retried_responses_are_closed(self, mock_sleep, mock_aiohttp):
+        failed = Mock(status=500, read=AsyncMock())
+        response = Mock(status=200, read=AsyncMock())
+        client = self.make_client(failed, response)
+        resp = await client.request_with_retries(
+            operation="operation", headers="headers", retries=1, retry_statuses=[500]
+        )
+        self.assertIs(resp, response)
+        failed.close.assert_called_once_with()
+        response.close.assert_not_called()
+
+
+    async def test_streamed_body_is_sent_with_length(self, mock_aiohttp):
+        response = Mock(status=200, read=AsyncMock())
+        client = self.make_client(ConnectionError(), response)
+        body = MultipartEncoder({"a": "b"}, {})
+        body.read()
+        with patch("asyncio.sleep"):
+            await client.request_with_retries(operation=body, headers={"h": "v"}, retries=1)
+        self.assertEqual(body.tell(), 0)
+        client.session.request.assert_called_with(
+            "POST", "http://url", data=body,
+            headers={"h": "v", "Content-Length": str(len(body))}
+        )
+    
+
+    @patch("kirjava.client.create_form_data")
+    async def test_sends_new_form_for_each_attempt(self, mock_form, mock_aiohttp):
+        response = Mock(status=200, read=AsyncMock())
+        client = self.make_client(ConnectionError(), response)
+        with patch("asyncio.sleep"):
+            await client.request_with_retries(
+                operation={"operations": "x"}, headers="headers", files={"0": 1}, retries=1
+            )
+        self.assertEqual(mock_form.call_count, 2)
+        mock_form.assert_called_with({"operations": "x"}, {"0": 1})
+        client.session.request.assert_called_with(
+            "POST", "http://url", data=mock_form.return_value, headers="headers"
+        )
+
+
+    @patch("asyncio.sleep")
+    async def test_retry_after_header_is_obeyed(self, mock_sleep, mock_aiohttp):
+        response = Mock(status=200, read=AsyncMock())
+        limited = Mock(status=503, headers={"Retry-After": "3"}, read=AsyncMock())
+        client = self.make_client(limited, response)
+        resp = await client.request_with_retries(
+            operation="operation", headers="headers", retries=1, retry_statuses=[503]
+        )
+        self.assertIs(resp, response)
+        mock_sleep.assert_awaited_with(3)
+    
+
+    async def test_other_exceptions_are_not_retried(self, mock_aiohttp):
+        client = self.make_client(ValueError(), Mock(status=200, read=AsyncMock()))
+        with self.assertRaises(ValueError):
+            await client.request_with_retries(operation="operation", headers="headers", retries=2)
+        self.assertEqual(client.session.request.call_count, 1)
+
+
+    async def test_timeout_is_sent_as_client_timeout(self, mock_aiohttp):
+        client = self.make_client(Mock(status=200, read=AsyncMock()))
+        client._timeout = (2, 8)
+        await client.request_with_retries(operation="operation", headers="headers")
+        mock_aiohttp.ClientTimeout.assert_called_with(sock_connect=2, sock_read=8)
+        client.session.request.assert_called_with(
+            "POST", "http://url", data="operation", headers="headers",
+            timeout=mock_aiohttp.ClientTimeout.return_value
+        )
+    
+
+    async def test_cancellation_stops_requests(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        started = asyncio.Event()
+        async def request(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+        client.session = Mock(request=request)
+        task = asyncio.ensure_future(client.request_with_retries("operation", "headers"))
+        await started.wait()
+        client.cancel()
+        with self.assertRaises(CancelledError):
+            await task
+        self.assertEqual(client._in_flight, set())
+    
+
+    async def test_cancelling_caller_is_not_converted(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        started = asyncio.Event()
+        async def request(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+        client.session = Mock(request=request)
+        task = asyncio.ensure_future(client.request_with_retries("operation", "headers"))
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+
+    async def test_limits_are_applied(self, mock_aiohttp):
+        limiter = ConcurrencyLimiter(1)
+        response = Mock(status=200, read=AsyncMock())
+        async def request(*args, **kwargs):
+            response.active = limiter.active
+            return response
+        client = AsyncClient("http://url", concurrency_limiter=limiter, rate_limiter=Mock(reserve=Mock(return_value=3)))
+        client.session = Mock(request=request)
+        with patch("asyncio.sleep") as mock_sleep:
+            await client.request_with_retries("operation", "headers")
+        mock_sleep.assert_awaited_with(3)
+        self.assertEqual(response.active, 1)
+        self.assertEqual(limiter.active, 0)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientSingleFlightTests(IsolatedAsyncioTestCase):
+
+    async def test_identical_queries_share_request(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec(), single_flight=True)
+        async def send(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            response = Mock(read=AsyncMock(return_value=b'{"data": [1]}'))
+            return None, response, {"data": [1]}
+        client.send = Mock(side_effect=send)
+        results = await asyncio.gather(*[client.execute("{ a }") for _ in range(4)])
+        self.assertEqual(client.send.call_count, 1)
+        self.assertEqual(results, [{"data": [1]}] * 4)
+        self.assertEqual(len({id(result) for result in results}), 4)
+        self.assertEqual(client._flights, {})
+    
+
+    async def test_errors_are_shared(self, mock_aiohttp):
+        client = AsyncClient("http://url", single_flight=True)
+        async def send(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            raise ConnectionError
+        client.send = Mock(side_effect=send)
+        results = await asyncio.gather(
+            *[client.execute("{ a }") for _ in range(3)], return_exceptions=True
+        )
+        self.assertEqual(client.send.call_count, 1)
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+        self.assertEqual(client._flights, {})
+    
+
+    async def test_followers_stop_waiting_after_their_timeout(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec(), single_flight=True)
+        async def send(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            response = Mock(read=AsyncMock(return_value=b'{"data": 1}'))
+            return None, response, {"data": 1}
+        client.send = Mock(side_effect=send)
+        results = await asyncio.gather(
+            client.execute("{ a }"), client.execute("{ a }", timeout=0.01),
+            return_exceptions=True
+        )
+        self.assertEqual(results[0], {"data": 1})
+        self.assertIsInstance(results[1], TimeoutError)
+        self.assertEqual(client.send.call_count, 1)
+        self.assertEqual(client._flights, {})
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientInstrumentationTests(IsolatedAsyncioTestCase):
+
+    async def test_concurrent_requests_get_own_events(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec(), metrics=True)
+        async def request(*args, data=None, **kwargs):
+            await asyncio.sleep(0.01)
+            return Mock(status=200, read=AsyncMock(return_value=b'{"data": 1}'))
+        client.session = Mock(request=request)
+        await asyncio.gather(
+            client.execute("query A { a }"), client.execute("query B { b }"),
+            client.execute("query A { a }")
+        )
+        snapshot = client.metrics.snapshot()
+        self.assertEqual(snapshot["requests"], 3)
+        self.assertEqual(snapshot["bytes_received"], 33)
+        self.assertEqual(snapshot["operations"]["A"]["count"], 2)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientManyExecutionTests(IsolatedAsyncioTestCase):
+
+    async def test_can_execute_many(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        error = ValueError("bad")
+        async def execute(message, variables, **kwargs):
+            if message == "M2": raise error
+            return {"data": [message, variables, kwargs]}
+        client.execute = execute
+        results = await client.execute_many(
+            [("M1", None), ("M2", None), ("M3", {"a": 1})], retries=2
+        )
+        self.assertEqual(results, [
+            {"data": ["M1", None, {"retries": 2}]}, error,
+            {"data": ["M3", {"a": 1}, {"retries": 2}]}
+        ])
+    
+
+    async def test_can_limit_operations_in_flight(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        counts = {"now": 0, "max": 0}
+        async def execute(message, variables):
+            counts["now"] += 1
+            counts["max"] = max(counts["max"], counts["now"])
+            await asyncio.sleep(0)
+            counts["now"] -= 1
+        client.execute = execute
+        await client.execute_many([("M", None)] * 20, max_in_flight=4)
+        self.assertEqual(counts["max"], 4)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientBatchExecutionTests(IsolatedAsyncioTestCase):
+
+    async def test_can_send_batch(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        response = Mock(read=AsyncMock(return_value=b'[{"data": 1}, {"data": 2}]'))
+        client.request_with_retries = AsyncMock(return_value=response)
+        results = await client.execute_batch([("M1", None), ("M2", {"a": 1})])
+        client.request_with_retries.assert_awaited_with(
+            operation='[{"variables": null, "query": "M1"}, {"variables": {"a": 1}, "query": "M2"}]',
+            headers=client._headers, method="POST", retries=0, retry_statuses=None
+        )
+        self.assertEqual(results, [{"data": 1}, {"data": 2}])
+        self.assertEqual(len(client._history), 2)
+    
+
+    async def test_can_send_queued_batch(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        response = Mock(read=AsyncMock(return_value=b'[{"data": 1}, {"data": 2}]'))
+        client.request_with_retries = AsyncMock(return_value=response)
+        async with client.batch(max_size=5, window=0.1, retries=1) as batch:
+            self.assertIsInstance(batch, AsyncBatch)
+            self.assertEqual(batch._max_size, 5)
+            self.assertEqual(batch._window, 0.1)
+            first, second = batch.execute("M1"), batch.execute("M2")
+        self.assertEqual((first.result(), second.result()), ({"data": 1}, {"data": 2}))
+        self.assertEqual(client.request_with_retries.call_args[1]["retries"], 1)
+    
+
+    async def test_can_stream_results(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        async def iter_chunked(size):
+            for chunk in [b'{"data": {"users": [1, ', b'2]}}']: yield chunk
+        response = Mock(content=Mock(iter_chunked=Mock(side_effect=iter_chunked)))
+        client.request_with_retries = AsyncMock(return_value=response)
+        stream = await client.execute_stream(
+            "{ users }", "data.users", variables={"a": 1}, retries=2, chunk_size=10
+        )
+        self.assertIsInstance(stream, AsyncJsonStream)
+        self.assertEqual([item async for item in stream], [1, 2])
+        client.request_with_retries.assert_awaited_with(
+            operation='{"variables": {"a": 1}, "query": "{ users }"}',
+            headers=client._headers, method="POST", retries=2,
+            retry_statuses=None, stream=True
+        )
+        response.content.iter_chunked.assert_called_with(10)
+        response.release.assert_called_once_with()
+        self.assertEqual(client.history, ())
+    
+
+    async def test_unread_stream_releases_response(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        response = MagicMock()
+        client.request_with_retries = AsyncMock(return_value=response)
+        async with await client.execute_stream("{ users }", "data"):
+            pass
+        response.release.assert_called_once_with()
+    
+
+    async def test_streamed_response_body_is_not_read(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        response = Mock(status=200, read=AsyncMock())
+        client.session = Mock(request=AsyncMock(return_value=response))
+        resp = await client.request_with_retries("operation", {}, stream=True, timeout=5)
+        self.assertIs(resp, response)
+        self.assertFalse(response.read.called)
+        kwargs = client.session.request.call_args[1]
+        self.assertNotIn("stream", kwargs)
+        self.assertIn("timeout", kwargs)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientPersistedQueryTests(IsolatedAsyncioTestCase):
+
+    async def test_can_send_persisted_queries(self, mock_aiohttp):
+        client = AsyncClient("http://url", persisted_queries=True, codec=JsonCodec())
+        responses = [
+            Mock(read=AsyncMock(return_value=b'{"data": 1}')),
+            Mock(read=AsyncMock(return_value=b'{"errors": [{"message": "PersistedQueryNotFound"}]}')),
+            Mock(read=AsyncMock(return_value=b'{"data": 2}')),
+        ]
+        client.request_with_retries = AsyncMock(side_effect=responses)
+        self.assertEqual(await client.execute("{ me }", method="GET"), {"data": 1})
+        self.assertEqual(await client.execute("{ me }", method="GET"), {"data": 2})
+        calls = client.request_with_retries.call_args_list
+        self.assertEqual(calls[0][1]["method"], "POST")
+        self.assertIn('"query": "{ me }"', calls[0][1]["operation"])
+        self.assertEqual(calls[1][1]["method"], "GET")
+        self.assertIsNone(calls[1][1]["operation"])
+        self.assertIn("extensions", calls[1][1]["params"])
+        self.assertNotIn("query", calls[1][1]["params"])
+        self.assertEqual(calls[2][1]["method"], "POST")
+        self.assertIn('"query": "{ me }"', calls[2][1]["operation"])
+        self.assertEqual(len(client._persisted_hashes), 1)
+
+
+    async def test_persisted_queries_turned_off_if_server_does_not_support_them(self, mock_aiohttp):
+        client = AsyncClient("http://url", persisted_queries=True, codec=JsonCodec())
+        responses = [
+            Mock(read=AsyncMock(return_value=b'{"errors": [{"message": "PersistedQueryNotSupported"}]}')),
+            Mock(read=AsyncMock(return_value=b'{"data": 1}')),
+        ]
+        client.request_with_retries = AsyncMock(side_effect=responses)
+        self.assertEqual(await client.execute("{ me }"), {"data": 1})
+        self.assertNotIn("extensions", client.request_with_retries.call_args[1]["operation"])
+        self.assertFalse(client._persisted_queries)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncClientPaginationTests(IsolatedAsyncioTestCase):
+
+    def make_pages(self, *pages):
+        return ClientPaginationTests.make_pages(None, *pages)
+
+
+    async def test_can_paginate(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        client.execute = AsyncMock(side_effect=self.make_pages([1, 2], [3]))
+        nodes = [node async for node in client.paginate("QUERY", "data.users", page_size=2)]
+        self.assertEqual(nodes, [1, 2, 3])
+        client.execute.assert_awaited_with("QUERY", variables={"first": 2, "after": "C0"})
+    
+
+    async def test_can_prefetch_pages(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        client.execute = AsyncMock(side_effect=self.make_pages([1, 2], [3], [4]))
+        nodes = client.paginate("QUERY", "data.users", prefetch=True)
+        self.assertEqual(await nodes.__anext__(), 1)
+        await asyncio.sleep(0)
+        self.assertEqual(client.execute.await_count, 2)
+        self.assertEqual([node async for node in nodes], [2, 3, 4])
+
+
+
+class PlanTests(IsolatedAsyncioTestCase):
+
+    def plan(self, client):
+        content = yield step(client.read_content, "response")
+        return content.upper()
+
+
+    async def test_plans_call_the_running_clients_methods(self):
+        self.assertEqual(step(len, "ab", x=1), (len, ("ab",), {"x": 1}))
+        client = Client("http://url")
+        client.read_content = Mock(return_value="abc")
+        self.assertEqual(client.run_plan(self.plan(client)), "ABC")
+        with patch("kirjava.client.aiohttp"):
+            client = AsyncClient("http://url")
+        client.read_content = AsyncMock(return_value="abc")
+        self.assertEqual(await client.run_plan(self.plan(client)), "ABC")
+        client.read_content.assert_awaited_with("response")
+    
+
+    def test_errors_are_thrown_into_plans(self):
+        def plan(client):
+            try:
+                yield step(client.read_content, "response")
+            except ValueError:
+                return "handled"
+        client = Client("http://url")
+        client.read_content = Mock(side_effect=ValueError)
+        self.assertEqual(client.run_plan(plan(client)), "handled")
+
+
+
+class UrlParameterTests(TestCase):
+
+    def test_can_create_url_parameters(self):
+        self.assertEqual(create_url_parameters("Q", {"a": 1}, {"e": 2}), {
+            "query": "Q", "variables": '{"a": 1}', "extensions": '{"e": 2}'
+        })
+    
+
+    def test_can_create_url_parameters_without_query(self):
+        self.assertEqual(create_url_parameters(None, None, {"e": 2}), {
+            "extensions": '{"e": 2}'
+        })
+
+
+
+class FormDataTests(TestCase):
+
+    @patch("kirjava.client.aiohttp")
+    def test_can_create_form_data(self, mock_aiohttp):
+        data = create_form_data(
+            {"operations": "OP", "map": b"MAP"},
+            {"0": ("f.txt", b"abc", "text/plain")}
+        )
+        self.assertIs(data, mock_aiohttp.FormData.return_value)
+        data.add_field.assert_any_call("operations", "OP")
+        data.add_field.assert_any_call("map", "MAP")
+        data.add_field.assert_any_call(
+            "0", b"abc", filename="f.txt", content_type="text/plain"
+        )
\ No newline at end of file
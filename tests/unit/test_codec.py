@@ -0,0 +1,84 @@
+from unittest import TestCase
+from unittest.mock import patch, Mock
+from kirjava.codec import *
+
+class JsonCodecTests(TestCase):
+
+    def test_can_encode(self):
+        codec = JsonCodec()
+        self.assertEqual(codec.dumps({"a": [1, None]}), '{"a": [1, null]}')
+        self.assertEqual(repr(codec), "<JsonCodec>")
+    
+
+    def test_can_decode_bytes(self):
+        self.assertEqual(JsonCodec().loads(b'{"a": "\xc3\xa9"}'), {"a": "\xe9"})
+    
+
+    def test_invalid_json_is_value_error(self):
+        with self.assertRaises(ValueError):
+            JsonCodec().loads(b"<html>")
+
+
+
+class OrjsonCodecTests(TestCase):
+
+    @patch("kirjava.codec.orjson")
+    def test_can_encode_and_decode(self, mock_orjson):
+        codec = OrjsonCodec()
+        self.assertIs(codec.dumps({"a": 1}), mock_orjson.dumps.return_value)
+        mock_orjson.dumps.assert_called_with(
+            {"a": 1}, option=mock_orjson.OPT_NON_STR_KEYS
+        )
+        self.assertIs(codec.loads(b"{}"), mock_orjson.loads.return_value)
+        mock_orjson.loads.assert_called_with(b"{}")
+        self.assertEqual(codec.name, "orjson")
+    
+
+    @patch("kirjava.codec.orjson")
+    def test_falls_back_to_standard_library(self, mock_orjson):
+        mock_orjson.dumps.side_effect = TypeError
+        self.assertEqual(OrjsonCodec().dumps({"a": 2 ** 70}), b'{"a": 1180591620717411303424}')
+    
+
+    @patch("kirjava.codec.orjson", None)
+    def test_needs_orjson(self):
+        with self.assertRaises(ImportError):
+            OrjsonCodec()
+
+
+
+class UjsonCodecTests(TestCase):
+
+    @patch("kirjava.codec.ujson")
+    def test_can_encode_and_decode(self, mock_ujson):
+        codec = UjsonCodec()
+        self.assertIs(codec.dumps({"a": 1}), mock_ujson.dumps.return_value)
+        mock_ujson.dumps.assert_called_with({"a": 1}, ensure_ascii=False)
+        self.assertIs(codec.loads(b"{}"), mock_ujson.loads.return_value)
+        mock_ujson.loads.assert_called_with(b"{}")
+    
+
+    @patch("kirjava.codec.ujson", None)
+    def test_needs_ujson(self):
+        with self.assertRaises(ImportError):
+            UjsonCodec()
+
+
+
+class DefaultCodecTests(TestCase):
+
+    @patch("kirjava.codec.orjson", Mock())
+    def test_orjson_preferred(self):
+        self.assertIsInstance(get_default_codec(), OrjsonCodec)
+    
+
+    @patch("kirjava.codec.orjson", None)
+    @patch("kirjava.codec.ujson", Mock())
+    def test_ujson_next(self):
+        self.assertIsInstance(get_default_codec(), UjsonCodec)
+    
+
+    @patch("kirjava.codec.orjson", None)
+    @patch("kirjava.codec.ujson", None)
+    def test_standard_library_fallback(self):
+        self.assertIsInstance(get_default_codec(), JsonCodec)
@@ -0,0 +1,51 @@
+import gzip
+from unittest import TestCase
+from kirjava.compression import *
+
+class AcceptEncodingTests(TestCase):
+
+    def test_can_get_supported_encodings(self):
+        encodings = get_accept_encoding().split(", ")
+        self.assertEqual(encodings[:2], ["gzip", "deflate"])
+        self.assertTrue(set(encodings) <= {"gzip", "deflate", "br", "zstd"})
+    
+
+    def test_can_refuse_compression(self):
+        self.assertEqual(get_accept_encoding(False), "identity")
+
+
+
+class CompressionTests(TestCase):
+
+    def test_small_body_not_compressed(self):
+        self.assertEqual(compress("abc", 4), ("abc", False))
+        self.assertEqual(compress(b"abc", 4), (b"abc", False))
+    
+
+    def test_threshold_is_in_bytes(self):
+        self.assertEqual(compress("éé", 4)[1], True)
+    
+
+    def test_large_string_compressed(self):
+        body, compressed = compress('{"a": "' + "x" * 1000 + '"}', 100)
+        self.assertTrue(compressed)
+        self.assertLess(len(body), 100)
+        self.assertEqual(gzip.decompress(body), b'{"a": "' + b"x" * 1000 + b'"}')
+    
+
+    def test_large_bytes_compressed(self):
+        body, compressed = compress(b"x" * 1000, 1000)
+        self.assertTrue(compressed)
+        self.assertEqual(gzip.decompress(body), b"x" * 1000)
+
+
+
+class WireSizeTests(TestCase):
+
+    def test_can_use_content_length(self):
+        self.assertEqual(get_wire_size({"Content-Length": "12"}, b"x" * 100), 12)
+    
+
+    def test_falls_back_to_decoded_length(self):
+        self.assertEqual(get_wire_size({}, b"x" * 100), 100)
+        self.assertEqual(get_wire_size({"Content-Length": "x"}, b"x" * 100), 100)
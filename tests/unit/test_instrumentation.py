@@ -0,0 +1,228 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from kirjava.instrumentation import *
+from kirjava.multipart import MultipartEncoder
+
+class RequestEventTests(TestCase):
+
+    def test_can_create_event(self):
+        event = RequestEvent("http://url", "POST", "GetUser", "query")
+        self.assertEqual(event.url, "http://url")
+        self.assertEqual(event.method, "POST")
+        self.assertEqual(event.operation_name, "GetUser")
+        self.assertEqual(event.operation_type, "query")
+        self.assertEqual(event.timings, {})
+        self.assertEqual((event.request_bytes, event.response_bytes), (0, 0))
+        self.assertEqual((event.attempts, event.retries), (0, 0))
+        self.assertIsNone(event.error)
+        self.assertFalse(event.cached)
+        self.assertEqual(repr(event), "<RequestEvent (GetUser)>")
+        self.assertEqual(repr(RequestEvent("u", "GET", None, None)), "<RequestEvent (anonymous)>")
+    
+
+    def test_retries_are_attempts_after_the_first(self):
+        event = RequestEvent("http://url", "POST", None, "query")
+        event.attempts = 3
+        self.assertEqual(event.retries, 2)
+    
+
+    @patch("time.perf_counter")
+    def test_can_time_phases(self, mock_counter):
+        event = RequestEvent("http://url", "POST", None, "query")
+        mock_counter.return_value = 12
+        self.assertEqual(event.time("encode", 10), 12)
+        event.time("encode", 11.5)
+        self.assertEqual(event.timings, {"encode": 2.5})
+
+
+
+class InstrumentTests(TestCase):
+
+    def test_hooks_called_on_success(self):
+        hooks = [Mock(), Mock()]
+        event = RequestEvent("http://url", "POST", None, "query")
+        with Instrument(hooks, event) as current:
+            self.assertIs(current, event)
+            self.assertIs(current_event.get(), event)
+            for hook in hooks: hook.before_request.assert_called_with(event)
+        self.assertIsNone(current_event.get())
+        for hook in hooks:
+            hook.after_response.assert_called_with(event)
+            self.assertFalse(hook.on_error.called)
+        self.assertGreaterEqual(event.duration, 0)
+    
+
+    def test_hooks_called_on_error(self):
+        hook = Mock()
+        event = RequestEvent("http://url", "POST", None, "query")
+        with self.assertRaises(ValueError):
+            with Instrument([hook], event):
+                raise ValueError("X")
+        hook.on_error.assert_called_with(event)
+        self.assertFalse(hook.after_response.called)
+        self.assertIsInstance(event.error, ValueError)
+        self.assertIsNone(current_event.get())
+    
+
+    def test_base_hooks_do_nothing(self):
+        hooks = Hooks()
+        event = RequestEvent("http://url", "POST", None, "query")
+        for method in ("before_request", "after_response", "on_retry", "on_error"):
+            self.assertIsNone(getattr(hooks, method)(event))
+
+
+
+class HistogramTests(TestCase):
+
+    def test_empty_histogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.count, 0)
+        self.assertIsNone(histogram.percentile(50))
+        self.assertEqual(histogram.snapshot()["mean"], None)
+        self.assertEqual(repr(histogram), "<Histogram (0 values)>")
+    
+
+    def test_values_are_bucketed(self):
+        histogram = Histogram(buckets=(1, 2, 5))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.add(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16)
+        self.assertEqual((histogram.min, histogram.max), (0.5, 10))
+    
+
+    def test_percentiles_are_estimated(self):
+        histogram = Histogram(buckets=(1, 2, 3, 4))
+        for value in (0.5, 1.5, 1.5, 2.5, 3.5):
+            histogram.add(value)
+        self.assertEqual(histogram.percentile(0), 0.5)
+        self.assertEqual(histogram.percentile(50), 1.75)
+        self.assertEqual(histogram.percentile(100), 3.5)
+        self.assertLessEqual(histogram.percentile(99), 3.5)
+    
+
+    def test_snapshot(self):
+        histogram = Histogram(buckets=(1, 2))
+        histogram.add(1.5)
+        self.assertEqual(histogram.snapshot(), {
+            "count": 1, "sum": 1.5, "min": 1.5, "max": 1.5, "mean": 1.5,
+            "p50": 1.5, "p90": 1.5, "p99": 1.5
+        })
+
+
+
+class MetricsTests(TestCase):
+
+    def make_event(self, name, duration, **kwargs):
+        event = RequestEvent("http://url", "POST", name, "query")
+        event.duration = duration
+        for key, value in kwargs.items(): setattr(event, key, value)
+        return event
+
+
+    def test_metrics_record_requests(self):
+        metrics = Metrics()
+        metrics.after_response(self.make_event("A", 0.1, request_bytes=10, response_bytes=100, attempts=3))
+        metrics.after_response(self.make_event("A", 0.3, cached=True))
+        metrics.on_error(self.make_event(None, 2, error=ValueError()))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["requests"], 3)
+        self.assertEqual(snapshot["errors"], 1)
+        self.assertEqual(snapshot["retries"], 2)
+        self.assertEqual(snapshot["cached"], 1)
+        self.assertEqual(snapshot["bytes_sent"], 10)
+        self.assertEqual(snapshot["bytes_received"], 100)
+        self.assertEqual(set(snapshot["operations"]), {"A", "anonymous"})
+        self.assertEqual(snapshot["operations"]["A"]["count"], 2)
+        self.assertAlmostEqual(snapshot["operations"]["A"]["mean"], 0.2)
+        self.assertEqual(repr(metrics), "<Metrics (3 requests)>")
+    
+
+    def test_metrics_record_compression(self):
+        metrics = Metrics()
+        self.assertIsNone(metrics.snapshot()["response_compression_ratio"])
+        metrics.after_response(self.make_event(
+            "A", 0.1, request_bytes=10, request_wire_bytes=10,
+            response_bytes=1000, response_wire_bytes=100
+        ))
+        metrics.after_response(self.make_event(
+            "A", 0.1, request_bytes=10, request_wire_bytes=10,
+            response_bytes=1000, response_wire_bytes=400
+        ))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["wire_bytes_sent"], 20)
+        self.assertEqual(snapshot["wire_bytes_received"], 500)
+        self.assertEqual(snapshot["request_compression_ratio"], 1)
+        self.assertEqual(snapshot["response_compression_ratio"], 4)
+
+
+
+@patch("kirjava.instrumentation.trace")
+class OpenTelemetryHooksTests(TestCase):
+
+    def test_needs_opentelemetry(self, mock_trace):
+        with patch("kirjava.instrumentation.trace", None):
+            with self.assertRaises(ImportError):
+                OpenTelemetryHooks()
+    
+
+    def test_uses_global_tracer_by_default(self, mock_trace):
+        hooks = OpenTelemetryHooks()
+        mock_trace.get_tracer.assert_called_with("kirjava")
+        self.assertIs(hooks.tracer, mock_trace.get_tracer.return_value)
+    
+
+    def test_span_for_successful_request(self, mock_trace):
+        tracer = Mock()
+        hooks = OpenTelemetryHooks(tracer)
+        event = RequestEvent("http://url", "POST", "GetUser", "query")
+        hooks.before_request(event)
+        tracer.start_span.assert_called_with(
+            "query GetUser", kind=mock_trace.SpanKind.CLIENT, attributes={
+                "graphql.operation.name": "GetUser", "graphql.operation.type": "query",
+                "http.request.method": "POST", "url.full": "http://url"
+            }
+        )
+        event.attempts, event.status, event.timings = 2, 500, {"network": 0.5}
+        hooks.on_retry(event)
+        event.span.add_event.assert_called_with("retry", {
+            "attempt": 2, "error": "", "http.response.status_code": 500
+        })
+        event.status = 200
+        hooks.after_response(event)
+        event.span.set_attributes.assert_called_with({
+            "kirjava.network_seconds": 0.5, "kirjava.retries": 1,
+            "kirjava.cached": False, "http.request.body.size": 0,
+            "http.response.body.size": 0, "http.response.status_code": 200
+        })
+        event.span.end.assert_called_with()
+    
+
+    def test_span_for_failed_request(self, mock_trace):
+        hooks = OpenTelemetryHooks(Mock())
+        event = RequestEvent("http://url", "POST", None, None)
+        hooks.before_request(event)
+        self.assertEqual(hooks.tracer.start_span.call_args[0][0], "graphql")
+        event.error = ValueError()
+        hooks.on_error(event)
+        event.span.record_exception.assert_called_with(event.error)
+        event.span.set_status.assert_called_with(
+            mock_trace.Status.return_value
+        )
+        mock_trace.Status.assert_called_with(mock_trace.StatusCode.ERROR)
+        event.span.end.assert_called_with()
+
+
+
+class BodySizeTests(TestCase):
+
+    def test_body_sizes(self):
+        self.assertEqual(get_body_size("abé"), 4)
+        self.assertEqual(get_body_size(b"abc"), 3)
+        self.assertEqual(get_body_size(None), 0)
+        self.assertEqual(get_body_size(
+            {"operations": "abc", "map": b"de"}, {"0": ("f", b"12345", None)}
+        ), 10)
+        encoder = MultipartEncoder({"a": "b"}, {})
+        self.assertEqual(get_body_size(encoder), len(encoder))
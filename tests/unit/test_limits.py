@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import patch
+from kirjava.limits import RateLimiter, ConcurrencyLimiter, get_cost_extension
+
+class RateLimiterCreationTests(TestCase):
+
+    def test_can_create_rate_limiter(self):
+        limiter = RateLimiter(5)
+        self.assertEqual(limiter.rate, 5)
+        self.assertEqual(limiter.capacity, 5)
+        self.assertEqual(limiter.cost, 1)
+        self.assertEqual(limiter.tokens, 5)
+        self.assertEqual(repr(limiter), "<RateLimiter (5/s)>")
+    
+
+    def test_slow_limiter_has_capacity_of_one(self):
+        self.assertEqual(RateLimiter(0.5).capacity, 1)
+    
+
+    def test_can_create_rate_limiter_with_capacity_and_cost(self):
+        limiter = RateLimiter(5, capacity=100, cost=10)
+        self.assertEqual(limiter.capacity, 100)
+        self.assertEqual(limiter.cost, 10)
+
+
+
+@patch("time.monotonic")
+class RateLimiterReservationTests(TestCase):
+
+    def test_reservations_within_capacity_do_not_wait(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(2)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+    
+
+    def test_reservations_beyond_capacity_queue_up(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(2)
+        limiter.reserve(), limiter.reserve()
+        self.assertEqual(limiter.reserve(), 0.5)
+        self.assertEqual(limiter.reserve(), 1)
+        self.assertEqual(limiter.tokens, -2)
+    
+
+    def test_tokens_refill_over_time(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(2)
+        limiter.reserve(2)
+        mock_monotonic.return_value = 100.5
+        self.assertEqual(limiter.reserve(), 0)
+        mock_monotonic.return_value = 1000
+        self.assertEqual(limiter.tokens, 2)
+    
+
+    def test_reservations_use_cost(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(10, capacity=100, cost=60)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 2)
+        self.assertEqual(limiter.reserve(5), 2.5)
+    
+
+    def test_pausing(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(2)
+        limiter.pause(3)
+        self.assertEqual(limiter.reserve(), 3.5)
+    
+
+    @patch("time.sleep")
+    def test_acquire_sleeps(self, mock_sleep, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(1)
+        limiter.acquire()
+        self.assertFalse(mock_sleep.called)
+        limiter.acquire()
+        mock_sleep.assert_called_with(1)
+
+
+
+class RateLimiterAsyncTests(IsolatedAsyncioTestCase):
+
+    @patch("asyncio.sleep")
+    async def test_async_acquire_sleeps(self, mock_sleep):
+        limiter = RateLimiter(1)
+        limiter._tokens = -1
+        with patch("time.monotonic", return_value=limiter._updated):
+            await limiter.acquire_async()
+        mock_sleep.assert_awaited_with(2)
+
+
+
+class RateLimiterSyncTests(TestCase):
+
+    def test_sync_with_throttle_status(self):
+        limiter = RateLimiter(10)
+        limiter.sync({"data": 1, "extensions": {"cost": {
+            "requestedQueryCost": 42, "actualQueryCost": 40,
+            "throttleStatus": {
+                "maximumAvailable": 1000, "currentlyAvailable": 5, "restoreRate": 50
+            }
+        }}})
+        self.assertEqual(limiter.rate, 50)
+        self.assertEqual(limiter.capacity, 1000)
+        self.assertEqual(limiter.cost, 42)
+        self.assertLess(limiter.tokens, 6)
+    
+
+    def test_sync_never_raises_tokens(self):
+        limiter = RateLimiter(10)
+        limiter.reserve(15)
+        limiter.sync({"extensions": {"cost": {"throttleStatus": {"currentlyAvailable": 500}}}})
+        self.assertLess(limiter.tokens, 0)
+    
+
+    def test_sync_without_cost_does_nothing(self):
+        limiter = RateLimiter(10)
+        limiter.sync({"data": 1})
+        limiter.sync({"extensions": {"cost": None}})
+        limiter.sync(None)
+        self.assertEqual((limiter.rate, limiter.capacity, limiter.cost), (10, 10, 1))
+    
+
+    def test_get_cost_extension(self):
+        self.assertEqual(get_cost_extension({"extensions": {"cost": {"a": 1}}}), {"a": 1})
+        self.assertIsNone(get_cost_extension({"extensions": {"cost": 5}}))
+        self.assertIsNone(get_cost_extension({"extensions": []}))
+        self.assertIsNone(get_cost_extension([]))
+
+
+
+class ConcurrencyLimiterTests(TestCase):
+
+    def test_can_create_limiter(self):
+        limiter = ConcurrencyLimiter(3)
+        self.assertEqual(limiter.limit, 3)
+        self.assertEqual(limiter.active, 0)
+        self.assertEqual(repr(limiter), "<ConcurrencyLimiter (0/3 in use)>")
+    
+
+    def test_acquire_and_release(self):
+        limiter = ConcurrencyLimiter(2)
+        limiter.acquire()
+        with limiter:
+            self.assertEqual(limiter.active, 2)
+        self.assertEqual(limiter.active, 1)
+        limiter.release()
+        self.assertEqual(limiter.active, 0)
+    
+
+    def test_threads_are_limited(self):
+        limiter = ConcurrencyLimiter(2)
+        peak, lock = [0], threading.Lock()
+        def work():
+            with limiter:
+                with lock: peak[0] = max(peak[0], limiter.active)
+                time.sleep(0.01)
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(limiter.active, 0)
+
+
+
+class ConcurrencyLimiterAsyncTests(IsolatedAsyncioTestCase):
+
+    async def test_coroutines_are_limited(self):
+        limiter = ConcurrencyLimiter(3)
+        peak = [0]
+        async def work():
+            async with limiter:
+                peak[0] = max(peak[0], limiter.active)
+                await asyncio.sleep(0.01)
+        await asyncio.gather(*[work() for _ in range(12)])
+        self.assertEqual(peak[0], 3)
+        self.assertEqual(limiter.active, 0)
+    
+
+    async def test_threads_and_coroutines_share_limit(self):
+        limiter = ConcurrencyLimiter(1)
+        limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        threading.Thread(target=limiter.release).start()
+        await asyncio.wait_for(waiter, 1)
+        self.assertEqual(limiter.active, 1)
+    
+
+    async def test_cancelled_waiter_passes_on_wake(self):
+        limiter = ConcurrencyLimiter(1)
+        await limiter.acquire_async()
+        first = asyncio.ensure_future(limiter.acquire_async())
+        second = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        limiter.release()
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+        self.assertTrue(first.cancelled())
+        self.assertEqual(limiter.active, 1)
@@ -0,0 +1,229 @@
+import io
+import mmap
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import Mock
+from kirjava.multipart import *
+
+class MultipartEncoderCreationTests(TestCase):
+
+    def test_can_create_encoder(self):
+        encoder = MultipartEncoder({"a": "b"}, {}, boundary="XXX")
+        self.assertEqual(encoder._boundary, "XXX")
+        self.assertEqual(encoder.content_type, "multipart/form-data; boundary=XXX")
+        self.assertEqual(len(encoder), len(encoder.read()))
+        self.assertEqual(repr(encoder), f"<MultipartEncoder ({len(encoder)} bytes)>")
+    
+
+    def test_boundary_is_random_by_default(self):
+        encoder1 = MultipartEncoder({}, {})
+        encoder2 = MultipartEncoder({}, {})
+        self.assertNotEqual(encoder1._boundary, encoder2._boundary)
+
+
+
+class MultipartEncodingTests(TestCase):
+
+    def test_can_encode_fields_and_files(self):
+        f1 = io.BytesIO(b"12345")
+        f2 = io.TextIOWrapper(io.BytesIO(b"text"))
+        encoder = MultipartEncoder({"operations": "OP", "map": b"MAP"}, {
+            "0": ("a.bin", f1, "application/octet-stream"),
+            "1": ('b".txt', f2, None),
+            "2": ("c.txt", b"bytes", "text/plain"),
+        }, boundary="XXX")
+        body = (
+            b'--XXX\r\nContent-Disposition: form-data; name="operations"\r\n\r\nOP\r\n'
+            b'--XXX\r\nContent-Disposition: form-data; name="map"\r\n\r\nMAP\r\n'
+            b'--XXX\r\nContent-Disposition: form-data; name="0"; filename="a.bin"\r\n'
+            b'Content-Type: application/octet-stream\r\n\r\n12345\r\n'
+            b'--XXX\r\nContent-Disposition: form-data; name="1"; filename="b%22.txt"\r\n'
+            b'\r\ntext\r\n'
+            b'--XXX\r\nContent-Disposition: form-data; name="2"; filename="c.txt"\r\n'
+            b'Content-Type: text/plain\r\n\r\nbytes\r\n'
+            b'--XXX--\r\n'
+        )
+        self.assertEqual(len(encoder), len(body))
+        self.assertEqual(encoder.read(), body)
+        self.assertEqual(encoder.read(), b"")
+        self.assertEqual(encoder.tell(), len(body))
+    
+
+    def test_reads_files_in_chunks(self):
+        f = Mock(wraps=io.BytesIO(b"x" * 1000))
+        del f.buffer
+        encoder = MultipartEncoder({}, {"0": ("a", f, None)}, boundary="XXX")
+        chunks = list(iter(lambda: encoder.read(100), b""))
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), len(encoder))
+        self.assertTrue(all(c[0][0] <= 100 for c in f.read.call_args_list))
+    
+
+    def test_starts_files_from_current_position(self):
+        f = io.BytesIO(b"abcdef")
+        f.seek(2)
+        encoder = MultipartEncoder({}, {"0": ("a", f, None)}, boundary="XXX")
+        self.assertIn(b"\r\n\r\ncdef\r\n", encoder.read())
+    
+
+    def test_text_files_start_from_current_position(self):
+        f = io.TextIOWrapper(io.BytesIO(("é" + "x" * 10000).encode()))
+        f.read(3)
+        encoder = MultipartEncoder({}, {"0": ("a", f, None)}, boundary="XXX")
+        body = encoder.read()
+        self.assertEqual(len(body), len(encoder))
+        self.assertIn(b"\r\n\r\n" + b"x" * 9998 + b"\r\n", body)
+    
+
+    def test_empty_files_are_allowed(self):
+        encoder = MultipartEncoder({}, {"0": ("a", io.BytesIO(), None)}, boundary="XXX")
+        body = encoder.read()
+        self.assertEqual(len(body), len(encoder))
+        self.assertIn(b"\r\n\r\n\r\n--XXX--", body)
+    
+
+    def test_file_shorter_than_expected(self):
+        f = io.BytesIO(b"abcdef")
+        encoder = MultipartEncoder({}, {"0": ("a", f, None)}, boundary="XXX")
+        f.truncate(2)
+        with self.assertRaises(IOError):
+            encoder.read()
+    
+
+    def test_can_encode_bytes_like_files(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b"mapped")
+            f.flush()
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            encoder = MultipartEncoder({}, {
+                "0": ("a", memoryview(b"view"), None),
+                "1": ("b", bytearray(b"array"), None),
+                "2": ("c", mapped, None),
+            }, boundary="XXX")
+            self.assertIsInstance(encoder._parts[1][0], memoryview)
+            body = encoder.read()
+            self.assertEqual(len(body), len(encoder))
+            self.assertIn(b"\r\n\r\nview\r\n", body)
+            self.assertIn(b"\r\n\r\narray\r\n", body)
+            self.assertIn(b"\r\n\r\nmapped\r\n", body)
+            encoder.seek(0)
+            self.assertEqual(encoder.read(), body)
+            del encoder
+            mapped.close()
+    
+
+    def test_can_read_into_buffer(self):
+        encoder = MultipartEncoder({"a": "b"}, {}, boundary="XXX")
+        buffer = bytearray(10)
+        self.assertEqual(encoder.readinto(buffer), 10)
+        self.assertEqual(bytes(buffer), b"--XXX\r\nCon")
+
+
+
+class MultipartSeekingTests(TestCase):
+
+    def test_can_restart_from_beginning(self):
+        f = io.BytesIO(b"abcdef")
+        f.seek(1)
+        encoder = MultipartEncoder({"a": "b"}, {"0": ("a", f, None)})
+        body = encoder.read()
+        self.assertEqual(encoder.seek(0), 0)
+        self.assertEqual(encoder.tell(), 0)
+        self.assertEqual(encoder.read(), body)
+    
+
+    def test_cannot_seek_elsewhere(self):
+        encoder = MultipartEncoder({"a": "b"}, {})
+        with self.assertRaises(io.UnsupportedOperation):
+            encoder.seek(3)
+        with self.assertRaises(io.UnsupportedOperation):
+            encoder.seek(0, io.SEEK_END)
+
+
+
+class MultipartReadAheadTests(TestCase):
+
+    def make_files(self, *contents):
+        return {
+            str(index): (f"{index}.txt", io.BytesIO(content), "text/plain")
+            for index, content in enumerate(contents)
+        }
+
+
+    def test_body_is_unchanged_by_reading_ahead(self):
+        contents = [b"abcdefghij", b"", b"klm", b"nopqrstuvwxyz"]
+        files = self.make_files(*contents)
+        files["4"] = ("4.bin", b"bytes", None)
+        body = MultipartEncoder({"a": "b"}, files, boundary="XXX").read()
+        files = self.make_files(*contents)
+        files["4"] = ("4.bin", b"bytes", None)
+        encoder = MultipartEncoder(
+            {"a": "b"}, files, boundary="XXX", workers=2, read_ahead=4
+        )
+        self.assertEqual(b"".join(iter(lambda: encoder.read(3), b"")), body)
+        self.assertIsNone(encoder._executor)
+    
+
+    def test_next_files_are_read_ahead(self):
+        files = self.make_files(b"x" * 10, b"y" * 10, b"z" * 10)
+        encoder = MultipartEncoder({}, files, workers=2, read_ahead=4)
+        encoder.read(5)
+        for future in encoder._heads.values(): future.result()
+        self.assertEqual([f.tell() for _, f, _ in files.values()], [4, 4, 0])
+        self.assertIn(b"\r\n\r\nyyyyyyyyyy\r\n", encoder.read())
+    
+
+    def test_files_are_read_from_threads(self):
+        class SlowFile(io.BytesIO):
+            def read(self, size=-1):
+                time.sleep(0.05)
+                return io.BytesIO.read(self, size)
+        files = {
+            str(index): (f"{index}.txt", SlowFile(b"x" * 10), None)
+            for index in range(4)
+        }
+        encoder = MultipartEncoder({}, files, workers=4)
+        started = time.perf_counter()
+        encoder.read()
+        self.assertLess(time.perf_counter() - started, 0.15)
+    
+
+    def test_can_restart_while_reading_ahead(self):
+        files = self.make_files(b"abcdef", b"ghijkl", b"mnopqr")
+        encoder = MultipartEncoder({}, files, workers=1, read_ahead=2)
+        start = encoder.read(100)
+        self.assertEqual(encoder.seek(0), 0)
+        body = encoder.read()
+        self.assertTrue(body.startswith(start))
+        for content in (b"abcdef", b"ghijkl", b"mnopqr"):
+            self.assertIn(b"\r\n\r\n" + content + b"\r\n", body)
+    
+
+    def test_closing_stops_reading_ahead(self):
+        encoder = MultipartEncoder(
+            {}, self.make_files(b"abc", b"def"), workers=2
+        )
+        encoder.read(10)
+        encoder.close()
+        self.assertEqual(encoder._heads, {})
+        self.assertIsNone(encoder._executor)
+        self.assertTrue(encoder.closed)
+
+
+
+class FileSizeTests(TestCase):
+
+    def test_can_get_size_of_real_file(self):
+        with open(__file__, "rb") as f:
+            f.seek(10)
+            self.assertEqual(get_file_size(f), os.path.getsize(__file__) - 10)
+            self.assertEqual(f.tell(), 10)
+    
+
+    def test_can_get_size_of_in_memory_file(self):
+        f = io.BytesIO(b"abcdef")
+        f.seek(2)
+        self.assertEqual(get_file_size(f), 4)
+        self.assertEqual(f.tell(), 2)
@@ -0,0 +1,106 @@
+from unittest import TestCase
+from kirjava.parser import *
+
+class TokenizingTests(TestCase):
+
+    def test_can_tokenize_document(self):
+        self.assertEqual(list(tokenize('query Q($a: [Int!] = 1.5e3) { ...F, b(s: "x \\" y") }')), [
+            ("name", "query"), ("name", "Q"), ("punctuator", "("),
+            ("punctuator", "$"), ("name", "a"), ("punctuator", ":"),
+            ("punctuator", "["), ("name", "Int"), ("punctuator", "!"),
+            ("punctuator", "]"), ("punctuator", "="), ("number", "1.5e3"),
+            ("punctuator", ")"), ("punctuator", "{"), ("punctuator", "..."),
+            ("name", "F"), ("name", "b"), ("punctuator", "("), ("name", "s"),
+            ("punctuator", ":"), ("string", '"x \\" y"'), ("punctuator", ")"),
+            ("punctuator", "}")
+        ])
+    
+
+    def test_ignores_comments_commas_and_whitespace(self):
+        self.assertEqual(list(tokenize("\ufeff# comment\n a,\tb\r\n")), [
+            ("name", "a"), ("name", "b")
+        ])
+    
+
+    def test_block_strings_are_one_token(self):
+        self.assertEqual(list(tokenize('"""a\n # b \\""" c"""')), [
+            ("block", '"""a\n # b \\""" c"""')
+        ])
+    
+
+    def test_unterminated_string(self):
+        with self.assertRaises(GraphQLSyntaxError) as e:
+            list(tokenize('{\n  a(b: "c) }'))
+        self.assertEqual(str(e.exception), "Unterminated string at line 2, column 8")
+    
+
+    def test_unexpected_character(self):
+        with self.assertRaises(GraphQLSyntaxError) as e:
+            list(tokenize("{ a % }"))
+        self.assertEqual(str(e.exception), "Unexpected character '%' at line 1, column 5")
+
+
+
+class ParsingTests(TestCase):
+
+    def test_anonymous_query(self):
+        document = parse("{ me }")
+        self.assertEqual(document.operations, [("query", None)])
+        self.assertEqual(document.operation_type, "query")
+        self.assertIsNone(document.operation_name)
+        self.assertEqual(document.minified, "{me}")
+        self.assertEqual(document.source, "{ me }")
+        self.assertEqual(repr(document), "<Document (1 operations)>")
+    
+
+    def test_named_operations(self):
+        document = parse("""
+        query GetUser($id: ID!) @cached { user(id: $id) { ...Fields } }
+        fragment Fields on User { name, email }
+        mutation Go { go }
+        """)
+        self.assertEqual(document.operations, [("query", "GetUser"), ("mutation", "Go")])
+        self.assertEqual(document.operation_type, "mutation")
+        self.assertEqual(document.operation_name, "GetUser")
+    
+
+    def test_unnamed_operations(self):
+        self.assertEqual(parse("query { me }").operations, [("query", None)])
+        self.assertEqual(parse("query($a: Int) { me }").operations, [("query", None)])
+        self.assertEqual(parse("subscription @live { me }").operations, [("subscription", None)])
+    
+
+    def test_minifying(self):
+        self.assertEqual(
+            parse('query  Q ( $a : Int = -1 ) {\n  a(b: $a, c: "x  y") { d e }\n  ...on T { f }  # end\n}').minified,
+            'query Q($a:Int=-1){a(b:$a c:"x  y"){d e}...on T{f}}'
+        )
+    
+
+    def test_parses_are_cached(self):
+        self.assertIs(parse("{ cached }"), parse("{ cached }"))
+    
+
+    def test_invalid_documents(self):
+        for source, message in [
+            ("message", "Expected an operation or fragment, found 'message'"),
+            ("{ me", "Unexpected end of document"),
+            ("{ me }}", "Unexpected '}'"),
+            ("{ me(a: 1] }", "Unexpected ']'"),
+            ("{ me } me", "Expected an operation or fragment, found 'me'"),
+            (" # nothing", "The document is empty")
+        ]:
+            with self.assertRaises(GraphQLSyntaxError) as e:
+                parse(source)
+            self.assertEqual(str(e.exception), message)
+    
+
+    def test_syntax_errors_are_value_errors(self):
+        self.assertTrue(issubclass(GraphQLSyntaxError, ValueError))
+
+
+
+class MinifyTests(TestCase):
+
+    def test_can_minify(self):
+        self.assertEqual(minify("query Q {\n  a, b\n}"), "query Q{a b}")
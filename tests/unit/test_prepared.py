@@ -0,0 +1,130 @@
+import io
+import json
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import Mock, AsyncMock, patch
+from kirjava import Client, AsyncClient, JsonCodec, OrjsonCodec
+from kirjava.prepared import *
+
+class PreparedOperationCreationTests(TestCase):
+
+    def test_can_create_prepared_operation(self):
+        client = Client("http://url", codec=JsonCodec())
+        operation = PreparedOperation(client, "query GetUser { me }")
+        self.assertIs(operation.client, client)
+        self.assertEqual(operation.message, "query GetUser { me }")
+        self.assertEqual(operation.method, "POST")
+        self.assertTrue(operation.direct)
+        self.assertEqual(operation.operation_name, "GetUser")
+        self.assertEqual(operation.prefix, b'{"query": "query GetUser { me }", "variables": ')
+        self.assertEqual(repr(operation), "<PreparedOperation (GetUser)>")
+    
+
+    def test_query_is_minified_if_client_minifies(self):
+        client = Client("http://url", minify=True)
+        operation = PreparedOperation(client, "{\n  me\n}")
+        self.assertEqual(operation.message, "{me}")
+        self.assertEqual(repr(operation), "<PreparedOperation (anonymous)>")
+
+
+
+class PreparedOperationEncodingTests(TestCase):
+
+    def test_can_encode_with_json(self):
+        operation = PreparedOperation(Client("http://url", codec=JsonCodec()), '{ a(s: "\\"") }')
+        body = operation.encode({"x": [1, "é"]})
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body), {"query": '{ a(s: "\\"") }', "variables": {"x": [1, "é"]}})
+        self.assertEqual(json.loads(operation.encode(None)), {"query": '{ a(s: "\\"") }', "variables": None})
+    
+
+    @patch("kirjava.codec.orjson")
+    def test_can_encode_with_orjson(self, mock_orjson):
+        mock_orjson.dumps.side_effect = lambda obj, option: json.dumps(
+            obj, separators=(",", ":")
+        ).encode()
+        operation = PreparedOperation(Client("http://url", codec=OrjsonCodec()), "{ me }")
+        self.assertEqual(
+            json.loads(operation.encode({"x": 1})), {"query": "{ me }", "variables": {"x": 1}}
+        )
+
+
+
+@patch("kirjava.client.Client.request_with_retries")
+class PreparedOperationCallingTests(TestCase):
+
+    def test_only_variables_are_encoded(self, mock_request):
+        client = Client("http://url", codec=JsonCodec())
+        mock_request.return_value.content = b'{"data": 1}'
+        operation = PreparedOperation(client, "{ me }", method="GET")
+        self.assertEqual(operation({"a": 1}, retries=2, timeout=5), {"data": 1})
+        mock_request.assert_called_with(
+            operation=b'{"query": "{ me }", "variables": {"a": 1}}',
+            headers=client.headers, method="GET", retries=2,
+            retry_statuses=None, timeout=5
+        )
+        self.assertIs(mock_request.call_args[1]["headers"], client.headers)
+        self.assertEqual(client.history[0], ({"query": "{ me }", "variables": {"a": 1}}, {"data": 1}))
+    
+
+    def test_non_json_response(self, mock_request):
+        client = Client("http://url", codec=JsonCodec())
+        mock_request.return_value.content = b"<html>"
+        mock_request.return_value.headers = {"Content-type": "text/html"}
+        with self.assertRaises(ValueError):
+            PreparedOperation(client, "{ me }")()
+    
+
+    def test_requests_are_instrumented(self, mock_request):
+        hook = Mock()
+        client = Client("http://url", codec=JsonCodec(), hooks=[hook])
+        mock_request.return_value.content = b'{"data": 1}'
+        PreparedOperation(client, "query Me { me }")({"a": 1})
+        event = hook.after_response.call_args[0][0]
+        self.assertEqual(event.operation_name, "Me")
+        self.assertEqual(set(event.timings), {"encode", "decode"})
+    
+
+    @patch("kirjava.client.Client.execute")
+    def test_files_are_sent_with_execute(self, mock_execute, mock_request):
+        client = Client("http://url")
+        f = io.BytesIO()
+        operation = PreparedOperation(client, "mutation { go }")
+        self.assertIs(operation({"f": f}, timeout=3), mock_execute.return_value)
+        mock_execute.assert_called_with("mutation { go }", "POST", {"f": f}, 0, None, 3)
+        self.assertFalse(mock_request.called)
+    
+
+    @patch("kirjava.client.Client.execute")
+    def test_indirect_operations_are_sent_with_execute(self, mock_execute, mock_request):
+        operation = PreparedOperation(Client("http://url"), "{ me }", direct=False)
+        self.assertIs(operation({"a": 1}), mock_execute.return_value)
+        mock_execute.assert_called_with("{ me }", "POST", {"a": 1}, 0, None, None)
+        self.assertFalse(mock_request.called)
+
+
+
+@patch("kirjava.client.aiohttp")
+class AsyncPreparedOperationTests(IsolatedAsyncioTestCase):
+
+    async def test_only_variables_are_encoded(self, mock_aiohttp):
+        client = AsyncClient("http://url", codec=JsonCodec())
+        response = Mock(read=AsyncMock(return_value=b'{"data": 1}'))
+        client.request_with_retries = AsyncMock(return_value=response)
+        operation = AsyncPreparedOperation(client, "query Me { me }")
+        self.assertEqual(repr(operation), "<AsyncPreparedOperation (Me)>")
+        self.assertEqual(await operation({"a": 1}), {"data": 1})
+        client.request_with_retries.assert_awaited_with(
+            operation=b'{"query": "query Me { me }", "variables": {"a": 1}}',
+            headers=client.headers, method="POST", retries=0,
+            retry_statuses=None, timeout=None
+        )
+        self.assertEqual(len(client.history), 1)
+    
+
+    async def test_files_are_sent_with_execute(self, mock_aiohttp):
+        client = AsyncClient("http://url")
+        client.execute = AsyncMock(return_value={"data": 2})
+        f = io.BytesIO()
+        operation = AsyncPreparedOperation(client, "mutation { go }")
+        self.assertEqual(await operation({"f": [f]}), {"data": 2})
+        client.execute.assert_awaited_with("mutation { go }", "POST", {"f": [f]}, 0, None, None)
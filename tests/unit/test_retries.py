@@ -0,0 +1,227 @@
+import time
+import requests
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from kirjava.retries import RetryPolicy, RetryBudget, RetryError, bound_timeout, parse_retry_after, get_retryable_exceptions, RETRYABLE_EXCEPTIONS
+
+class RetryBudgetTests(TestCase):
+
+    def test_can_create_budget(self):
+        budget = RetryBudget(capacity=5, refill_rate=2)
+        self.assertEqual(budget.tokens, 5)
+        self.assertEqual(repr(budget), "<RetryBudget (5.0/5 tokens)>")
+    
+
+    def test_spending_uses_tokens(self):
+        budget = RetryBudget(capacity=2, refill_rate=0)
+        self.assertTrue(budget.spend())
+        self.assertTrue(budget.spend())
+        self.assertFalse(budget.spend())
+    
+
+    @patch("time.monotonic")
+    def test_tokens_refill_up_to_capacity(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        budget = RetryBudget(capacity=3, refill_rate=0.5)
+        for _ in range(3): budget.spend()
+        mock_monotonic.return_value = 102
+        self.assertEqual(budget.tokens, 1)
+        mock_monotonic.return_value = 200
+        self.assertEqual(budget.tokens, 3)
+
+
+
+class RetryPolicyCreationTests(TestCase):
+
+    def test_default_policy(self):
+        policy = RetryPolicy()
+        self.assertEqual(policy.retries, 0)
+        self.assertEqual(policy.statuses, set())
+        self.assertEqual(policy.error_codes, set())
+        self.assertIsNone(policy.deadline)
+        self.assertIsNone(policy.budget)
+        self.assertEqual(repr(policy), "<RetryPolicy (0 retries)>")
+    
+
+    def test_replace_returns_same_policy_without_changes(self):
+        policy = RetryPolicy(retries=3)
+        self.assertIs(policy.replace(0, None), policy)
+    
+
+    def test_replace_creates_copy(self):
+        budget = RetryBudget()
+        policy = RetryPolicy(retries=3, statuses=[500], budget=budget)
+        copy = policy.replace(5, [502])
+        self.assertEqual(copy.retries, 5)
+        self.assertEqual(copy.statuses, {502})
+        self.assertIs(copy.budget, budget)
+        self.assertEqual(policy.retries, 3)
+        self.assertEqual(policy.statuses, {500})
+
+
+
+class ShouldRetryTests(TestCase):
+
+    def test_connection_errors_are_retried(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.should_retry(requests.ConnectionError()))
+        self.assertTrue(policy.should_retry(requests.Timeout()))
+        self.assertTrue(policy.should_retry(ConnectionResetError()))
+    
+
+    def test_aiohttp_errors_are_retried(self):
+        class ServerDisconnectedError(Exception): pass
+        aiohttp = Mock(ClientConnectionError=ServerDisconnectedError)
+        with patch.dict("sys.modules", {"aiohttp": aiohttp}):
+            self.assertTrue(RetryPolicy().should_retry(ServerDisconnectedError()))
+    
+
+    def test_custom_exceptions(self):
+        policy = RetryPolicy(exceptions=(ValueError,))
+        self.assertTrue(policy.should_retry(ValueError()))
+        self.assertFalse(policy.should_retry(requests.ConnectionError()))
+    
+
+    def test_other_errors_are_not_retried(self):
+        self.assertFalse(RetryPolicy().should_retry(ValueError()))
+    
+
+    def test_statuses_are_retried(self):
+        policy = RetryPolicy(statuses=[500, 503])
+        self.assertTrue(policy.should_retry(status=503))
+        self.assertFalse(policy.should_retry(status=200))
+    
+
+    def test_error_codes_are_retried(self):
+        policy = RetryPolicy(error_codes=["UNAVAILABLE"])
+        self.assertTrue(policy.should_retry(status=200, result={"errors": [
+            {"message": "A"}, {"extensions": {"code": "UNAVAILABLE"}}
+        ]}))
+        self.assertFalse(policy.should_retry(status=200, result={"errors": [
+            {"extensions": {"code": "BAD_USER_INPUT"}}
+        ]}))
+        self.assertFalse(policy.should_retry(status=200, result={"data": 1}))
+        self.assertFalse(policy.should_retry(status=200, result=None))
+
+
+
+class DelayTests(TestCase):
+
+    @patch("random.uniform")
+    def test_delay_uses_full_jitter(self, mock_uniform):
+        policy = RetryPolicy(backoff=0.5)
+        self.assertIs(policy.get_delay(3), mock_uniform.return_value)
+        mock_uniform.assert_called_with(0, 4)
+    
+
+    @patch("random.uniform")
+    def test_delay_is_capped(self, mock_uniform):
+        policy = RetryPolicy(max_backoff=10)
+        policy.get_delay(8)
+        mock_uniform.assert_called_with(0, 10)
+    
+
+    def test_retry_after_is_used_for_429_and_503(self):
+        policy = RetryPolicy()
+        self.assertEqual(policy.get_delay(1, 429, {"Retry-After": "12"}), 12)
+        self.assertEqual(policy.get_delay(1, 503, {"Retry-After": "1.5"}), 1.5)
+        self.assertLessEqual(policy.get_delay(1, 500, {"Retry-After": "12"}), 2)
+    
+
+    def test_retry_after_can_be_ignored(self):
+        policy = RetryPolicy(retry_after=False)
+        self.assertLessEqual(policy.get_delay(1, 429, {"Retry-After": "12"}), 2)
+
+
+
+class AllowsTests(TestCase):
+
+    def test_retries_limit_attempts(self):
+        policy = RetryPolicy(retries=2)
+        self.assertTrue(policy.allows(2, time.monotonic(), 0))
+        self.assertFalse(policy.allows(3, time.monotonic(), 0))
+    
+
+    def test_deadline_limits_attempts(self):
+        policy = RetryPolicy(retries=5, deadline=10)
+        started = time.monotonic()
+        self.assertTrue(policy.allows(1, started, 5))
+        self.assertFalse(policy.allows(1, started, 11))
+        self.assertFalse(policy.allows(1, started - 8, 3))
+    
+
+    def test_budget_limits_attempts(self):
+        policy = RetryPolicy(retries=5, budget=RetryBudget(capacity=1, refill_rate=0))
+        self.assertTrue(policy.allows(1, time.monotonic(), 0))
+        self.assertFalse(policy.allows(2, time.monotonic(), 0))
+
+
+
+class TimeoutTests(TestCase):
+
+    def test_timeout_unchanged_without_deadline(self):
+        self.assertEqual(RetryPolicy().get_timeout((1, 2), time.monotonic()), (1, 2))
+        self.assertIsNone(RetryPolicy().get_timeout(None, time.monotonic()))
+    
+
+    def test_timeout_limited_by_deadline(self):
+        policy = RetryPolicy(deadline=10)
+        started = time.monotonic() - 7
+        self.assertAlmostEqual(policy.get_timeout(None, started), 3, delta=0.5)
+        self.assertAlmostEqual(policy.get_timeout(30, started), 3, delta=0.5)
+        self.assertEqual(policy.get_timeout(1, started), 1)
+    
+
+    def test_bounding_timeouts(self):
+        self.assertEqual(bound_timeout(5, None), 5)
+        self.assertEqual(bound_timeout(5, 3), 3)
+        self.assertEqual(bound_timeout(None, 3), 3)
+        self.assertEqual(bound_timeout((1, 10), 3), (1, 3))
+        self.assertEqual(bound_timeout((None, 2), 3), (3, 2))
+        self.assertEqual(bound_timeout(5, -1), 0)
+
+
+
+class RetryAfterParsingTests(TestCase):
+
+    def test_can_parse_seconds(self):
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertEqual(parse_retry_after("-5"), 0)
+    
+
+    def test_can_parse_date(self):
+        date = datetime.now(timezone.utc) + timedelta(seconds=30)
+        self.assertAlmostEqual(parse_retry_after(format_datetime(date, usegmt=True)), 30, delta=2)
+    
+
+    def test_invalid_values(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(""))
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+
+class RetryableExceptionsTests(TestCase):
+
+    def test_libraries_not_imported_are_left_out(self):
+        with patch.dict("sys.modules", {"aiohttp": None, "httpx": None}):
+            self.assertEqual(get_retryable_exceptions(), RETRYABLE_EXCEPTIONS)
+    
+
+    def test_imported_libraries_are_included(self):
+        aiohttp, httpx = Mock(), Mock()
+        with patch.dict("sys.modules", {"aiohttp": aiohttp, "httpx": httpx}):
+            self.assertEqual(get_retryable_exceptions(), RETRYABLE_EXCEPTIONS + (
+                aiohttp.ClientConnectionError, httpx.TransportError
+            ))
+
+
+
+class RetryErrorTests(TestCase):
+
+    def test_retry_error(self):
+        error = RetryError("RESPONSE", 503)
+        self.assertEqual(str(error), "Status code 503")
+        self.assertEqual(error.response, "RESPONSE")
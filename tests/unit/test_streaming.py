@@ -0,0 +1,247 @@
+import json
+import asyncio
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import Mock
+from kirjava.streaming import *
+
+def chunked(document, size):
+    raw = json.dumps(document, ensure_ascii=False).encode()
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+async def async_chunks(chunks):
+    for chunk in chunks:
+        await asyncio.sleep(0)
+        yield chunk
+
+
+
+class JsonStreamCreationTests(TestCase):
+
+    def test_can_create_stream(self):
+        stream = JsonStream([b"{}"], ["data", "users"])
+        self.assertEqual(stream._path, ["data", "users"])
+        self.assertIsNone(stream.errors)
+        self.assertEqual(repr(stream), "<JsonStream (data.users)>")
+        self.assertIs(iter(stream), stream)
+
+
+
+class JsonStreamReadingTests(TestCase):
+
+    def setUp(self):
+        self.document = {
+            "errors": [{"message": "Partial"}],
+            "data": {
+                "other": {"a": [1, "}]\"", {"b": None}], "users": "x"},
+                "users": {"count": 3, "edges": [
+                    {"node": {"id": i, "name": f'N"{i}]}}é\\'}} for i in range(100)
+                ] + [123456, "s", None, True, 1.5e10, []], "after": [1, 2]}
+            }, "extensions": {"x": 1}
+        }
+
+
+    def test_can_stream_items_whatever_the_chunk_size(self):
+        for size in [1, 2, 3, 7, 64, 100000]:
+            stream = JsonStream(chunked(self.document, size), ["data", "users", "edges"])
+            self.assertEqual(list(stream), self.document["data"]["users"]["edges"])
+            self.assertEqual(stream.errors, [{"message": "Partial"}])
+    
+
+    def test_numbers_split_across_chunks(self):
+        document = {"data": {"prices": [1.25, 19.99, 3.5e-7, -2500.0, 10, -3] * 3}}
+        for size in range(1, 41):
+            stream = JsonStream(chunked(document, size), ["data", "prices"])
+            self.assertEqual(list(stream), document["data"]["prices"], size)
+    
+
+    def test_can_stream_top_level_list(self):
+        stream = JsonStream([b'{"data": [1, 2 , 3.5e3,true ] }'], ["data"])
+        self.assertEqual(list(stream), [1, 2, 3500.0, True])
+        self.assertIsNone(stream.errors)
+    
+
+    def test_missing_list_has_no_items(self):
+        self.assertEqual(list(JsonStream([b'{"data": {"users": null}}'], ["data", "users"])), [])
+        self.assertEqual(list(JsonStream([b'{"data": null, "errors": [1]}'], ["data", "users"])), [])
+        self.assertEqual(list(JsonStream([b'{"data": {"users": {}}}'], ["data", "users"])), [])
+    
+
+    def test_can_stream_very_large_item(self):
+        stream = JsonStream(chunked({"data": ["x" * 1000000, 1]}, 100), ["data"])
+        self.assertEqual(list(stream), ["x" * 1000000, 1])
+    
+
+    def test_skipped_values_are_not_kept(self):
+        chunks = chunked({"data": {"skip": ["y" * 1000000], "items": [1]}}, 1000)
+        stream = JsonStream(chunks, ["data", "items"])
+        self.assertEqual(list(stream), [1])
+        self.assertLess(len(stream._buffer), 10000)
+    
+
+    def test_non_object_document(self):
+        with self.assertRaises(ValueError):
+            list(JsonStream([b"[1, 2]"], ["data"]))
+    
+
+    def test_truncated_document(self):
+        for document in [b'{"data": [1, {"a": ', b'{"data": [1, 2', b'{"data": {"s": "abc']:
+            with self.assertRaises(ValueError):
+                list(JsonStream([document], ["data"]))
+    
+
+    def test_invalid_item(self):
+        with self.assertRaises(ValueError):
+            list(JsonStream([b'{"data": [1, }]}'], ["data"]))
+
+
+
+class JsonStreamClosingTests(TestCase):
+
+    def test_on_close_called_at_end(self):
+        on_close = Mock()
+        stream = JsonStream([b'{"data": [1, 2]}'], ["data"], on_close=on_close)
+        next(stream)
+        self.assertFalse(on_close.called)
+        list(stream)
+        on_close.assert_called_with()
+    
+
+    def test_on_close_called_when_closed_early(self):
+        on_close = Mock()
+        stream = JsonStream([b'{"data": [1, 2]}'], ["data"], on_close=on_close)
+        next(stream)
+        stream.close()
+        on_close.assert_called_once_with()
+    
+
+    def test_on_close_called_when_closed_before_reading(self):
+        on_close = Mock()
+        stream = JsonStream([b'{"data": [1, 2]}'], ["data"], on_close=on_close)
+        stream.close()
+        stream.close()
+        on_close.assert_called_once_with()
+        with self.assertRaises(StopIteration):
+            next(stream)
+    
+
+    def test_on_close_only_called_once(self):
+        on_close = Mock()
+        stream = JsonStream([b'{"data": [1, 2]}'], ["data"], on_close=on_close)
+        self.assertEqual(list(stream), [1, 2])
+        stream.close()
+        on_close.assert_called_once_with()
+    
+
+    def test_can_use_as_context_manager(self):
+        on_close = Mock()
+        with JsonStream([b'{"data": [1, 2]}'], ["data"], on_close=on_close) as stream:
+            self.assertEqual(next(stream), 1)
+            self.assertFalse(on_close.called)
+        on_close.assert_called_once_with()
+    
+
+    def test_context_manager_closes_unread_stream(self):
+        on_close = Mock()
+        with JsonStream([b'{"data": [1, 2]}'], ["data"], on_close=on_close):
+            pass
+        on_close.assert_called_once_with()
+
+
+
+class AsyncJsonStreamTests(IsolatedAsyncioTestCase):
+
+    async def read(self, stream):
+        return [item async for item in stream]
+
+
+    def test_can_create_async_stream(self):
+        stream = AsyncJsonStream(async_chunks([b"{}"]), ["data", "users"])
+        self.assertEqual(stream._path, ["data", "users"])
+        self.assertIsNone(stream.errors)
+        self.assertEqual(repr(stream), "<AsyncJsonStream (data.users)>")
+        self.assertIs(stream.__aiter__(), stream)
+        self.assertIsNone(stream._thread)
+
+
+    async def test_can_stream_items_across_chunks(self):
+        document = {"data": {"users": [{"name": f"user{i}"} for i in range(100)]}}
+        on_close = Mock()
+        stream = AsyncJsonStream(
+            async_chunks(chunked(document, 7)), ["data", "users"], on_close=on_close
+        )
+        self.assertEqual(await self.read(stream), document["data"]["users"])
+        on_close.assert_called_once_with()
+        self.assertIsNone(stream.errors)
+        stream._thread.join(1)
+        self.assertFalse(stream._thread.is_alive())
+
+
+    async def test_errors_available_after_reading(self):
+        document = {"data": {"users": [1, 2]}, "errors": [{"message": "bad"}]}
+        stream = AsyncJsonStream(async_chunks(chunked(document, 5)), ["data", "users"])
+        self.assertEqual(await self.read(stream), [1, 2])
+        self.assertEqual(stream.errors, [{"message": "bad"}])
+
+
+    async def test_items_are_handed_back_a_chunk_at_a_time(self):
+        stream = AsyncJsonStream(
+            async_chunks([b'{"data": [1, 2, ', b'3, 4]}']), ["data"]
+        )
+        self.assertEqual(await stream.__anext__(), 1)
+        self.assertEqual(list(stream._items), [2])
+        self.assertEqual(await stream.__anext__(), 2)
+        self.assertEqual(await stream.__anext__(), 3)
+        self.assertEqual(list(stream._items), [4])
+        await stream.close()
+
+
+    async def test_items_before_invalid_json_are_kept(self):
+        stream = AsyncJsonStream(async_chunks([b'{"data": [1, 2, x]}']), ["data"])
+        self.assertEqual(await stream.__anext__(), 1)
+        self.assertEqual(await stream.__anext__(), 2)
+        with self.assertRaises(ValueError):
+            await stream.__anext__()
+        with self.assertRaises(StopAsyncIteration):
+            await stream.__anext__()
+
+
+    async def test_truncated_document(self):
+        stream = AsyncJsonStream(async_chunks([b'{"data": [1, 2']), ["data"])
+        with self.assertRaises(ValueError):
+            await self.read(stream)
+
+
+    async def test_closing_early_stops_thread(self):
+        on_close = Mock()
+        stream = AsyncJsonStream(
+            async_chunks([b'{"data": [1, ', b'2]}']), ["data"], on_close=on_close
+        )
+        self.assertEqual(await stream.__anext__(), 1)
+        await stream.close()
+        on_close.assert_called_once_with()
+        stream._thread.join(1)
+        self.assertFalse(stream._thread.is_alive())
+        with self.assertRaises(StopAsyncIteration):
+            await stream.__anext__()
+
+
+    async def test_closing_before_reading(self):
+        on_close = Mock()
+        stream = AsyncJsonStream(async_chunks([b'{"data": [1]}']), ["data"], on_close=on_close)
+        await stream.close()
+        await stream.close()
+        on_close.assert_called_once_with()
+        self.assertIsNone(stream._thread)
+
+
+    async def test_can_use_as_context_manager(self):
+        on_close = Mock()
+        stream = AsyncJsonStream(
+            async_chunks([b'{"data": [1, ', b'2]}']), ["data"], on_close=on_close
+        )
+        async with stream as items:
+            self.assertIs(items, stream)
+            self.assertEqual(await items.__anext__(), 1)
+            self.assertFalse(on_close.called)
+        on_close.assert_called_once_with()
@@ -0,0 +1,145 @@
+import io
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from kirjava.transports import *
+from kirjava.multipart import MultipartEncoder
+
+class RequestsTransportTests(TestCase):
+
+    def test_creates_session(self):
+        transport = RequestsTransport()
+        self.assertIsNotNone(transport.session.request)
+        self.assertEqual(repr(transport), "<RequestsTransport>")
+    
+
+    def test_requests_go_through_session(self):
+        session = Mock()
+        transport = RequestsTransport(session)
+        response = transport.request("POST", "http://url", data="body", timeout=3)
+        session.request.assert_called_with("POST", "http://url", data="body", timeout=3)
+        self.assertIs(response, session.request.return_value)
+    
+
+    def test_context_manager_closes_session(self):
+        session = Mock()
+        with RequestsTransport(session) as transport: pass
+        session.close.assert_called_with()
+
+
+
+@patch("kirjava.transports.httpx")
+class HTTP2TransportTests(TestCase):
+
+    def test_needs_httpx(self, mock_httpx):
+        with patch("kirjava.transports.httpx", None):
+            with patch.dict("sys.modules", {"httpx": None}):
+                with self.assertRaises(ImportError):
+                    HTTP2Transport()
+    
+
+    def test_creates_http2_client(self, mock_httpx):
+        transport = HTTP2Transport(max_connections=5)
+        mock_httpx.Limits.assert_called_with(max_connections=5, max_keepalive_connections=5)
+        mock_httpx.Client.assert_called_with(
+            http2=True, timeout=None, limits=mock_httpx.Limits.return_value, headers=None
+        )
+        self.assertIs(transport.session, mock_httpx.Client.return_value)
+        self.assertEqual(repr(transport), "<HTTP2Transport>")
+    
+
+    def test_keep_alive_and_compression_can_be_turned_off(self, mock_httpx):
+        HTTP2Transport(keep_alive=False, compression=False)
+        mock_httpx.Limits.assert_called_with(max_connections=10, max_keepalive_connections=0)
+        self.assertEqual(mock_httpx.Client.call_args[1]["headers"], {"Accept-Encoding": "identity"})
+    
+
+    def test_can_use_given_client(self, mock_httpx):
+        session = Mock()
+        transport = HTTP2Transport(session=session)
+        self.assertIs(transport.session, session)
+        self.assertFalse(mock_httpx.Client.called)
+        transport.close()
+        session.close.assert_called_with()
+    
+
+    def test_body_sent_as_content(self, mock_httpx):
+        session = Mock()
+        transport = HTTP2Transport(session=session)
+        response = transport.request(
+            "POST", "http://url", headers={"h": "v"}, data="body", timeout=3
+        )
+        session.build_request.assert_called_with(
+            "POST", "http://url", headers={"h": "v"}, params=None,
+            timeout=mock_httpx.Timeout.return_value, content="body"
+        )
+        mock_httpx.Timeout.assert_called_with(3)
+        session.send.assert_called_with(session.build_request.return_value, stream=False)
+        self.assertIsInstance(response, HTTP2Response)
+        self.assertIs(response.response, session.send.return_value)
+    
+
+    def test_files_sent_as_form(self, mock_httpx):
+        session = Mock()
+        transport = HTTP2Transport(session=session)
+        files = {"0": ("a.txt", b"abc", "text/plain")}
+        transport.request("POST", "http://url", data={"operations": "{}"}, files=files)
+        self.assertEqual(session.build_request.call_args[1]["data"], {"operations": "{}"})
+        self.assertEqual(session.build_request.call_args[1]["files"], files)
+    
+
+    def test_multipart_encoder_streamed(self, mock_httpx):
+        session = Mock()
+        transport = HTTP2Transport(session=session)
+        f = io.BytesIO(b"abc")
+        f.name = "a.txt"
+        encoder = MultipartEncoder({"operations": "{}"}, {"0": ("a.txt", f, None)})
+        transport.request("POST", "http://url", headers={}, data=encoder, stream=True)
+        kwargs = session.build_request.call_args[1]
+        self.assertEqual(kwargs["headers"], {"Content-Length": str(len(encoder))})
+        self.assertEqual(len(b"".join(kwargs["content"])), len(encoder))
+        session.send.assert_called_with(session.build_request.return_value, stream=True)
+    
+
+    def test_get_request_has_no_body(self, mock_httpx):
+        session = Mock()
+        transport = HTTP2Transport(session=session)
+        transport.request("GET", "http://url", params={"query": "{ me }"})
+        kwargs = session.build_request.call_args[1]
+        self.assertEqual(kwargs["params"], {"query": "{ me }"})
+        self.assertNotIn("content", kwargs)
+
+
+
+class HTTP2ResponseTests(TestCase):
+
+    def test_attributes_passed_through(self):
+        response = HTTP2Response(Mock(status_code=200, content=b"abc"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"abc")
+        self.assertEqual(repr(response), "<HTTP2Response [200]>")
+    
+
+    def test_iter_content(self):
+        inner = Mock()
+        response = HTTP2Response(inner)
+        self.assertIs(response.iter_content(10), inner.iter_bytes.return_value)
+        inner.iter_bytes.assert_called_with(10)
+
+
+
+@patch("kirjava.transports.httpx")
+class TimeoutTests(TestCase):
+
+    def test_number(self, mock_httpx):
+        self.assertIs(create_timeout(5), mock_httpx.Timeout.return_value)
+        mock_httpx.Timeout.assert_called_with(5)
+    
+
+    def test_tuple(self, mock_httpx):
+        create_timeout((1, 5))
+        mock_httpx.Timeout.assert_called_with(None, connect=1, read=5)
+    
+
+    def test_none(self, mock_httpx):
+        create_timeout(None)
+        mock_httpx.Timeout.assert_called_with(None)
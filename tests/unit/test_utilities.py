@@ -1,14 +1,24 @@
 import io
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from unittest import TestCase
 from unittest.mock import Mock, patch
 from kirjava.utilities import *
 
 class ExecutionTests(TestCase):
 
+    def setUp(self):
+        close_clients()
+
+
+    def tearDown(self):
+        close_clients()
+
+
     @patch("kirjava.client.Client")
     def test_can_quick_execute(self, mock_client):
         response = execute("http://url", 1, a=2)
-        mock_client.assert_called_with("http://url")
+        mock_client.assert_called_with("http://url", history_size=0)
         mock_client.return_value.execute.assert_called_with(1, a=2)
         self.assertIs(response, mock_client.return_value.execute.return_value)
 
@@ -16,12 +26,173 @@ class ExecutionTests(TestCase):
     @patch("kirjava.client.Client")
     def test_can_quick_execute_with_headers(self, mock_client):
         response = execute("http://url", 1, headers={"x": 4, "y": 5}, a=2)
-        mock_client.assert_called_with("http://url")
+        mock_client.assert_called_with(
+            "http://url", history_size=0, transport=mock_client.return_value.transport
+        )
         mock_client.return_value.headers.update.assert_called_with({"x": 4, "y": 5})
         mock_client.return_value.execute.assert_called_with(1, a=2)
         self.assertIs(response, mock_client.return_value.execute.return_value)
 
 
+    @patch("kirjava.client.Client")
+    def test_clients_are_reused_per_url(self, mock_client):
+        mock_client.side_effect = lambda *args, **kwargs: Mock()
+        execute("http://url1", 1)
+        execute("http://url2", 1)
+        execute("http://url1", 1)
+        self.assertEqual(mock_client.call_count, 2)
+        self.assertIs(get_client("http://url1"), get_client("http://url1"))
+
+
+    def test_cookies_are_not_shared_between_calls(self):
+        cookies = []
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                cookies.append(self.headers.get("Cookie"))
+                self.send_response(200)
+                self.send_header("Set-Cookie", "sid=secret; Path=/")
+                self.send_header("Content-Length", "11")
+                self.end_headers()
+                self.wfile.write(b'{"data": 1}')
+            def log_message(self, *args): pass
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}"
+            execute(url, "{a}", headers={"Authorization": "A"})
+            execute(url, "{a}")
+            execute(url, "{a}", headers={"Authorization": "B"})
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(cookies, [None, None, None])
+
+
+    @patch("kirjava.client.Client")
+    def test_can_opt_out_of_reuse(self, mock_client):
+        response = execute("http://url", 1, reuse_connections=False)
+        execute("http://url", 1, reuse_connections=False)
+        self.assertEqual(mock_client.call_count, 2)
+        mock_client.return_value.close.assert_called_with()
+        self.assertIs(response, mock_client.return_value.execute.return_value)
+    
+
+    @patch("kirjava.utilities.CLIENT_CACHE_SIZE", 2)
+    @patch("kirjava.client.Client")
+    def test_least_recently_used_client_is_closed(self, mock_client):
+        mock_client.side_effect = lambda *args, **kwargs: Mock()
+        client1 = get_client("http://url1")
+        client2 = get_client("http://url2")
+        get_client("http://url1")
+        get_client("http://url3")
+        client2.close.assert_called_with()
+        self.assertFalse(client1.close.called)
+        self.assertIs(get_client("http://url1"), client1)
+    
+
+    @patch("time.monotonic")
+    @patch("kirjava.client.Client")
+    def test_idle_clients_are_closed(self, mock_client, mock_monotonic):
+        mock_client.side_effect = lambda *args, **kwargs: Mock()
+        mock_monotonic.return_value = 1000
+        client1 = get_client("http://url1")
+        mock_monotonic.return_value = 1200
+        client2 = get_client("http://url2")
+        mock_monotonic.return_value = 1400
+        get_client("http://url2")
+        client1.close.assert_called_with()
+        self.assertFalse(client2.close.called)
+        self.assertIsNot(get_client("http://url1"), client1)
+    
+
+    @patch("kirjava.client.Client")
+    def test_can_close_clients(self, mock_client):
+        execute("http://url", 1)
+        close_clients()
+        mock_client.return_value.close.assert_called_with()
+        execute("http://url", 1)
+        self.assertEqual(mock_client.call_count, 2)
+
+
+
+class OperationTypeTests(TestCase):
+
+    def test_can_detect_queries(self):
+        self.assertEqual(get_operation_type("{ me }"), "query")
+        self.assertEqual(get_operation_type("query Me { me }"), "query")
+        self.assertEqual(get_operation_type("{ mutations }"), "query")
+        self.assertEqual(get_operation_type("# mutation {\n{ me }"), "query")
+    
+
+    def test_can_detect_mutations(self):
+        self.assertEqual(get_operation_type("mutation { go }"), "mutation")
+        self.assertEqual(get_operation_type(" mutation Go($a: Int) { go }"), "mutation")
+        self.assertEqual(get_operation_type("fragment F on X { a }\nmutation{ go }"), "mutation")
+    
+
+    def test_can_detect_subscriptions(self):
+        self.assertEqual(get_operation_type("subscription { events }"), "subscription")
+    
+
+    def test_invalid_queries_have_no_type(self):
+        self.assertIsNone(get_operation_type("{ me"))
+
+
+
+class OperationNameTests(TestCase):
+
+    def test_can_get_operation_name(self):
+        self.assertEqual(get_operation_name("query GetUser { me }"), "GetUser")
+        self.assertEqual(get_operation_name("  mutation Go($a: Int) { go }"), "Go")
+        self.assertEqual(get_operation_name("# comment\nsubscription On { x }"), "On")
+    
+
+    def test_anonymous_operations_have_no_name(self):
+        self.assertIsNone(get_operation_name("{ me }"))
+        self.assertIsNone(get_operation_name("query { me }"))
+        self.assertIsNone(get_operation_name("query($a: Int) { me }"))
+        self.assertIsNone(get_operation_name("query Me { me"))
+
+
+
+class QueryHashTests(TestCase):
+
+    def test_can_hash_query(self):
+        self.assertEqual(
+            get_query_hash("{ me }"),
+            "b7e4ef0c41abe27fe98d162502c81bdd0611cd1b7555f1d6cf8d12b822111ba5"
+        )
+
+
+
+class PersistedQueryErrorTests(TestCase):
+
+    def test_can_detect_missing_persisted_query(self):
+        self.assertTrue(is_persisted_query_error({"errors": [
+            {"message": "PersistedQueryNotFound"}
+        ]}))
+        self.assertTrue(is_persisted_query_error({"errors": [
+            {"message": "x"}, {"message": "y", "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}
+        ]}))
+    
+
+    def test_can_detect_unsupported_persisted_query(self):
+        self.assertTrue(is_persisted_query_error({"errors": [
+            {"message": "PersistedQueryNotSupported"}
+        ]}))
+        self.assertTrue(is_persisted_query_error({"errors": [
+            {"extensions": {"code": "PERSISTED_QUERY_NOT_SUPPORTED"}}
+        ]}))
+    
+
+    def test_other_responses_are_not_persisted_query_errors(self):
+        self.assertFalse(is_persisted_query_error({"data": 1}))
+        self.assertFalse(is_persisted_query_error({"errors": [{"message": "bad"}, "x"]}))
+        self.assertFalse(is_persisted_query_error({"errors": None}))
+        self.assertFalse(is_persisted_query_error([]))
+
+
 
 class FilesFromVariablesTests(TestCase):
 
@@ -46,8 +217,114 @@ class FilesFromVariablesTests(TestCase):
         f2 = io.IOBase()
         self.assertEqual(
             get_files_from_variables({1: 2, 3: 4, 5: [f1, f2]}),
-            ({1: 2, 3: 4, 5: [None, None]}, {5: [f1, f2]})
+            ({1: 2, 3: 4, 5: [None, None]}, {"5.0": f1, "5.1": f2})
         )
+    
+
+    def test_can_handle_variables_with_bytes_like_files(self):
+        data, view = b"123", memoryview(b"456")
+        self.assertEqual(
+            get_files_from_variables({1: data, 2: [view], 3: "s"}),
+            ({1: None, 2: [None], 3: "s"}, {1: data, "2.0": view})
+        )
+    
+
+    def test_can_handle_nested_files(self):
+        f1, f2, f3 = io.IOBase(), io.IOBase(), io.IOBase()
+        variables = {"input": {
+            "name": "X", "avatar": f1, "tags": ["a", "b"],
+            "galleries": [{"images": [f2, "url"]}, {"images": []}, {"cover": f3}]
+        }, "other": {"a": [1, 2]}}
+        new_variables, files = get_files_from_variables(variables)
+        self.assertEqual(new_variables, {"input": {
+            "name": "X", "avatar": None, "tags": ["a", "b"],
+            "galleries": [{"images": [None, "url"]}, {"images": []}, {"cover": None}]
+        }, "other": {"a": [1, 2]}})
+        self.assertEqual(files, {
+            "input.avatar": f1, "input.galleries.0.images.0": f2,
+            "input.galleries.2.cover": f3
+        })
+        self.assertIs(variables["input"]["avatar"], f1)
+        self.assertIs(variables["input"]["galleries"][0]["images"][0], f2)
+    
+
+    def test_only_containers_with_files_are_copied(self):
+        f = io.IOBase()
+        variables = {"input": {"file": f, "data": {"a": [1]}}, "big": [{"b": 2}]}
+        new_variables, files = get_files_from_variables(variables)
+        self.assertIsNot(new_variables, variables)
+        self.assertIsNot(new_variables["input"], variables["input"])
+        self.assertIs(new_variables["input"]["data"], variables["input"]["data"])
+        self.assertIs(new_variables["big"], variables["big"])
+    
+
+    def test_variables_without_files_are_not_copied(self):
+        variables = {"input": {"data": [{"a": 1}]}}
+        self.assertIs(get_files_from_variables(variables)[0], variables)
+
+
+
+class GetPersistedQueryErrorTests(TestCase):
+
+    def test_can_tell_errors_apart(self):
+        self.assertEqual(get_persisted_query_error({"errors": [
+            {"message": "PersistedQueryNotFound"}
+        ]}), "PERSISTED_QUERY_NOT_FOUND")
+        self.assertEqual(get_persisted_query_error({"errors": [
+            {"message": "PersistedQueryNotSupported"}
+        ]}), "PERSISTED_QUERY_NOT_SUPPORTED")
+        self.assertEqual(get_persisted_query_error({"errors": [
+            {"message": "x", "extensions": {"code": "PERSISTED_QUERY_NOT_SUPPORTED"}}
+        ]}), "PERSISTED_QUERY_NOT_SUPPORTED")
+        self.assertIsNone(get_persisted_query_error({"errors": [{"message": "x"}]}))
+
+
+
+class IsFileTests(TestCase):
+
+    def test_file_objects_are_files(self):
+        self.assertTrue(is_file(io.BytesIO()))
+    
+
+    def test_bytes_like_objects_are_files(self):
+        self.assertTrue(is_file(b"123"))
+        self.assertTrue(is_file(bytearray(b"123")))
+        self.assertTrue(is_file(memoryview(b"123")))
+    
+
+    def test_other_values_are_not_files(self):
+        for value in ("123", 123, None, [b"1"], {"a": b"1"}):
+            self.assertFalse(is_file(value))
+
+
+
+class HasFilesTests(TestCase):
+
+    def test_can_handle_no_variables(self):
+        self.assertFalse(has_files(None))
+        self.assertFalse(has_files({}))
+    
+
+    def test_can_handle_variables_without_files(self):
+        self.assertFalse(has_files({"a": 1, "b": [1, 2], "c": []}))
+    
+
+    def test_can_detect_files(self):
+        self.assertTrue(has_files({"a": 1, "b": io.IOBase()}))
+    
+
+    def test_can_detect_file_lists(self):
+        self.assertTrue(has_files({"a": 1, "b": [io.IOBase(), io.IOBase()]}))
+    
+
+    def test_can_detect_bytes_like_files(self):
+        self.assertTrue(has_files({"a": bytearray(b"123")}))
+        self.assertTrue(has_files({"a": [memoryview(b"123")]}))
+    
+
+    def test_can_detect_nested_files(self):
+        self.assertTrue(has_files({"a": {"b": [1, {"c": io.IOBase()}]}}))
+        self.assertFalse(has_files({"a": {"b": [1, {"c": "d"}]}}))
 
 
 
@@ -60,7 +337,7 @@ class FilesToMapTests(TestCase):
     
 
     def test_can_convert_multi_files_to_map(self):
-        files = {"image1": "x", "images": ["1", "2"], "image2": "y"}
+        files = {"image1": "x", "images.0": "1", "images.1": "2", "image2": "y"}
         map = files_to_map(files)
         self.assertEqual(map, {
             "0": ["variables.image1"],
@@ -95,7 +372,7 @@ class FilePackingTests(TestCase):
         f2.name = "file2.txt"
         f3.name = "file3.txt"
         f4.name = "file4.txt"
-        files = {"image1": f1, "images": [f2, f3], "image2": f4}
+        files = {"image1": f1, "images.0": f2, "images.1": f3, "image2": f4}
         packed_files = pack_files(files)
         self.assertEqual(packed_files, {
             "0": ("file1.txt", f1.read.return_value, "text/plain"),
@@ -106,6 +383,45 @@ class FilePackingTests(TestCase):
 
 
 
+    def test_can_pack_files_for_streaming(self):
+        f1 = Mock()
+        f1.name = "file1.txt"
+        packed_files = pack_files({"image1": f1}, stream=True)
+        self.assertEqual(packed_files, {"0": ("file1.txt", f1, "text/plain")})
+        self.assertFalse(f1.read.called)
+    
+
+    def test_can_pack_bytes_like_files_without_copying(self):
+        data, array = b"123", bytearray(b"456")
+        view = memoryview(array)
+        packed_files = pack_files({"doc.txt": data, "images.0": array, "images.1": view})
+        self.assertEqual(packed_files, {
+            "0": ("doc.txt", data, "text/plain"),
+            "1": ("images.0", array, None),
+            "2": ("images.1", view, None),
+        })
+        self.assertIs(packed_files["0"][1], data)
+        self.assertIs(packed_files["1"][1], array)
+        self.assertIs(packed_files["2"][1].obj, array)
+    
+
+    def test_files_without_names_are_named_after_path(self):
+        f = io.BytesIO(b"123")
+        packed_files = pack_files({"input.file.txt": f})
+        self.assertEqual(packed_files, {"0": ("input.file.txt", b"123", "text/plain")})
+    
+
+    @patch("mimetypes.guess_type")
+    def test_content_types_are_cached(self, mock_guess):
+        get_content_type.cache_clear()
+        mock_guess.return_value = ("image/png", None)
+        for _ in range(3):
+            self.assertEqual(get_content_type("cached.png"), "image/png")
+        mock_guess.assert_called_once_with("cached.png")
+        get_content_type.cache_clear()
+
+
+
 class ResponseErrorMessageTests(TestCase):
 
     def test_binary_response_error(self):